@@ -1,12 +1,13 @@
 # Description: This file contains the API endpoints for ChatWeb3
 # Path: api/api_endpoints.py
-from fastapi import FastAPI, Request, HTTPException, Security, Depends
+from fastapi import FastAPI, Request, HTTPException, Header, Query, Security, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.security.api_key import APIKeyHeader, APIKey
 from pydantic import BaseModel, Field
 from config.logging_config import get_logger
 from dotenv import load_dotenv
+import json
 import os
 
 from api.routers.well_known import get_ai_plugin, get_host, well_known
@@ -17,8 +18,31 @@ from chatweb3.tools.snowflake_database.tool_custom import (
     CheckTableSummaryTool,
     CheckTableMetadataTool,
     QueryDatabaseTool,
+    QUERY_DATABASE_TOOL_MODE,
 )
-from chatweb3.create_agent import get_snowflake_container
+from chatweb3.tools.executor import run_in_tool_executor
+from chatweb3.engine_registry import engine_registry
+from chatweb3.query_results import (
+    ARROW_MEDIA_TYPES,
+    arrow_table_to_bytes,
+    iter_ndjson,
+    result_stream_to_arrow,
+)
+from chatweb3.create_agent import PROJ_ROOT_DIR, get_snowflake_container
+from chatweb3.sql_validation import query_checker_stats
+from api.services.blockchain_data import (
+    BlockchainDataError,
+    aquery_blockchain_data_from_flipside,
+    astream_blockchain_data_from_flipside,
+)
+from api.services.query_jobs import (
+    JobLimitExceededError,
+    MemoryJobStore,
+    QueryJobManager,
+    SQLiteJobStore,
+    get_result_page,
+)
+from config.config import agent_config
 
 logger = get_logger(__name__)
 
@@ -29,6 +53,23 @@ db = get_snowflake_container()
 
 ai_plugin = get_ai_plugin()
 
+QUERY_JOBS_MAX_JOBS_PER_OWNER = agent_config.get("query_jobs.max_jobs_per_owner") or 0
+QUERY_JOBS_RETENTION_SECONDS = agent_config.get("query_jobs.retention_seconds") or 3600
+QUERY_JOBS_SQLITE_PATH = agent_config.get("query_jobs.sqlite_path")
+QUERY_JOBS_DEFAULT_PAGE_SIZE = agent_config.get("query_jobs.default_page_size") or 100
+QUERY_JOBS_MAX_PAGE_SIZE = agent_config.get("query_jobs.max_page_size") or 1000
+
+query_jobs = QueryJobManager(
+    run_query=lambda query: QueryDatabaseTool(db=db).arun(tool_input=query),
+    store=SQLiteJobStore(
+        os.path.join(PROJ_ROOT_DIR, QUERY_JOBS_SQLITE_PATH),
+        retention_seconds=QUERY_JOBS_RETENTION_SECONDS,
+    )
+    if QUERY_JOBS_SQLITE_PATH
+    else MemoryJobStore(retention_seconds=QUERY_JOBS_RETENTION_SECONDS),
+    max_jobs_per_owner=QUERY_JOBS_MAX_JOBS_PER_OWNER,
+)
+
 app = FastAPI(
     title=ai_plugin["name_for_human"],
     description=ai_plugin["description_for_human"],
@@ -82,7 +123,7 @@ async def get_list_of_available_tables(table_list: str = "", api_key: APIKey = D
     try:
         logger.debug(f"tool_input={table_list} Fetching list of available tables...")
         tool = CheckTableSummaryTool(db=db)
-        result = tool.run(tool_input=table_list)
+        result = await tool.arun(tool_input=table_list)
         logger.debug(
             f"tool_input={table_list} Fetched list of available tables {result=}"
         )
@@ -96,7 +137,7 @@ async def get_list_of_available_tables(table_list: str = "", api_key: APIKey = D
 async def get_detailed_metadata_for_tables(table_names: str, api_key: APIKey = Depends(get_api_key)):
     try:
         tool = CheckTableMetadataTool(db=db)
-        result = tool.run(table_names)
+        result = await tool.arun(table_names)
         logger.debug(f"Fetched metadata for table(s): {table_names}.")
         return {"result": result}
     except Exception as e:
@@ -114,13 +155,130 @@ class SnowflakeQuery(BaseModel):
 async def query_snowflake_sql_database(query: SnowflakeQuery, api_key: APIKey = Depends(get_api_key)):
     try:
         tool = QueryDatabaseTool(db=db)
-        result = tool.run(tool_input=query.query)
+        result = await tool.arun(tool_input=query.query)
         logger.debug(f"Executed query: {query.query}.")
         return {"result": result}
     except Exception as e:
         logger.error(f"Error executing query {query.query}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Endpoint: Query Snowflake SQL Database, streaming every result row as newline-delimited JSON,
+# or returning the whole result as an Apache Arrow IPC stream or a Parquet file
+@app.post("/query_snowflake_sql_database/stream", include_in_schema=False)
+async def stream_query_snowflake_sql_database(
+    query: SnowflakeQuery,
+    page_size: int = Query(
+        QUERY_JOBS_DEFAULT_PAGE_SIZE, ge=1, le=QUERY_JOBS_MAX_PAGE_SIZE
+    ),
+    format: str = Query("ndjson", pattern="^(ndjson|arrow|parquet)$"),
+    api_key: APIKey = Depends(get_api_key),
+):
+    try:
+        input_dict = QueryDatabaseTool(db=db)._process_tool_input(query.query)
+        stream = db.stream_query(
+            input_dict["database"],
+            input_dict["schema"],
+            input_dict["query"],
+            mode=QUERY_DATABASE_TOOL_MODE,
+            page_size=page_size,
+        )
+        # run the query before the response starts, so that its errors still get an error status
+        await run_in_tool_executor(stream.start)
+        if format != "ndjson":
+            table = await run_in_tool_executor(result_stream_to_arrow, stream)
+            content = await run_in_tool_executor(arrow_table_to_bytes, table, format)
+            return Response(content=content, media_type=ARROW_MEDIA_TYPES[format])
+    except Exception as e:
+        logger.error(f"Error executing query {query.query}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(iter_ndjson(stream), media_type="application/x-ndjson")
+
+# Endpoint: Submit a query job, returns the job id right away instead of holding the connection for the whole query run
+# Front-ends sharing the API key send their own X-Session-Id, only the same key and session id can poll the job
+@app.post("/query_jobs", operation_id="submit_query_job", status_code=202)
+async def submit_query_job(
+    query: SnowflakeQuery,
+    session_id: str = Header("", alias="X-Session-Id", max_length=128),
+    api_key: APIKey = Depends(get_api_key),
+):
+    try:
+        job = query_jobs.submit(api_key, query.query, session_id=session_id)
+    except JobLimitExceededError as e:
+        raise HTTPException(status_code=429, detail=e.message)
+    return {"job_id": job.job_id, "status": job.status}
+
+# Endpoint: Poll a query job, returns its status and a page of its result rows once it succeeded
+@app.get("/query_jobs/{job_id}", operation_id="get_query_job")
+async def get_query_job(
+    job_id: str,
+    page_number: int = Query(1, ge=1),
+    page_size: int = Query(
+        QUERY_JOBS_DEFAULT_PAGE_SIZE, ge=1, le=QUERY_JOBS_MAX_PAGE_SIZE
+    ),
+    session_id: str = Header("", alias="X-Session-Id", max_length=128),
+    api_key: APIKey = Depends(get_api_key),
+):
+    job = query_jobs.get(api_key, job_id, session_id=session_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Query job {job_id} not found")
+    return get_result_page(job, page_number, page_size)
+
+class BlockchainDataQuestion(BaseModel):
+    query: str = Field(
+        ...,
+        description="A question about blockchain data in natural language",
+    )
+
+# Endpoint: Answer a question about blockchain data with the agent (not exposed in the plugin OpenAPI schema)
+@app.post("/query_blockchain_data", include_in_schema=False)
+async def query_blockchain_data(question: BlockchainDataQuestion, api_key: APIKey = Depends(get_api_key)):
+    try:
+        answer, thought_process = await aquery_blockchain_data_from_flipside(question.query)
+        return {"answer": answer, "thought_process": thought_process}
+    except BlockchainDataError as e:
+        logger.error(f"Error answering question {question.query}: {e}")
+        raise HTTPException(status_code=400, detail=e.message)
+
+async def iter_server_sent_events(events):
+    async for event in events:
+        yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+# Endpoint: Answer a question about blockchain data with the agent, streaming the LLM tokens and the
+# thought/action/observation steps as Server-Sent Events, the last event being the answer or an error
+@app.post("/query_blockchain_data/stream", include_in_schema=False)
+async def stream_query_blockchain_data(question: BlockchainDataQuestion, api_key: APIKey = Depends(get_api_key)):
+    return StreamingResponse(
+        iter_server_sent_events(astream_blockchain_data_from_flipside(question.query)),
+        media_type="text/event-stream",
+        # keep proxies from buffering the events
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Endpoint: Metadata index statistics (not exposed in the plugin OpenAPI schema)
+@app.get("/metadata_stats", include_in_schema=False)
+async def get_metadata_stats(api_key: APIKey = Depends(get_api_key)):
+    metadata_parser = db.metadata_parser
+    return {
+        "reloader": db.metadata_reloader.stats() if db.metadata_reloader else None,
+        "rendered_metadata_cache": metadata_parser.metadata_cache_stats(),
+        "shards": metadata_parser.shard_stats(),
+    }
+
+# Endpoint: Query result cache statistics (not exposed in the plugin OpenAPI schema)
+@app.get("/query_cache_stats", include_in_schema=False)
+async def get_query_cache_stats(api_key: APIKey = Depends(get_api_key)):
+    return {
+        "query_cache": db.query_cache.stats() if db.query_cache else None,
+        "single_flight": db.single_flight.stats(),
+        "query_jobs": query_jobs.stats(),
+        "query_checker": query_checker_stats.stats(),
+    }
+
+# Endpoint: Connection pool statistics of the Snowflake engines (not exposed in the plugin OpenAPI schema)
+@app.get("/pool_stats", include_in_schema=False)
+async def get_pool_stats(api_key: APIKey = Depends(get_api_key)):
+    return engine_registry.stats()
+
 def start():
     import uvicorn
     uvicorn.run("api.api_endpoints:app", host="localhost", port=8000, reload=True)
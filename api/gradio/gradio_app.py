@@ -11,15 +11,21 @@ import os
 # from dotenv import load_dotenv
 import gradio as gr  # type: ignore
 from dotenv import load_dotenv
-
+from langchain.schema import AgentAction
+
+from chatweb3.callbacks.streaming_callback import (
+    EVENT_ACTION,
+    EVENT_OBSERVATION,
+    EVENT_RESPONSE,
+    EVENT_TOKEN,
+    iter_agent_events,
+)
 from chatweb3.create_agent import create_agent_executor
-from chatweb3.utils import format_response
+from chatweb3.utils import format_agent_action, format_observation, format_response
 from config.config import Config
 from config.config import agent_config
 from config.logging_config import get_logger
 
-# from langchain.schema import AgentAction
-
 logger = get_logger(__name__)
 # logger = get_logger(
 #     __name__, log_level=logging.DEBUG, log_to_console=True, log_to_file=True
@@ -53,6 +59,37 @@ def set_openai_api_key(api_key, agent):
         return agent_executor
 
 
+def format_answer(response):
+    """
+    Formats the answer and the thought process of an agent response.
+
+    Parameters:
+    response (dict): The outputs of the agent executor
+
+    Returns:
+    answer: The answer, followed by the SQL query it used
+    thought_process_text: The formatted thought process text
+    """
+    try:
+        answer = str(response["output"])
+        logger.debug(f"output: {answer}")
+        # thought_process_text = format_response(response)
+        thought_process_text, extracted_query = format_response(response)
+
+        # Append the extracted query to the answer
+        if extracted_query:
+            answer += (
+                f"\n\nThe original SQL query used is:\n```\n{extracted_query}\n```"
+            )
+
+        logger.debug(f"answer: {answer}")
+    except Exception as e:
+        logger.error(f"{type(e).__name__=} exception from parsing {response=}: {e}"),
+        thought_process_text = f"Exception in parsing response: {e}"
+        answer = thought_process_text
+    return answer, thought_process_text
+
+
 def chat(inp, history, agent):
     """
     Handles the chat conversation. If the agent is None,
@@ -88,24 +125,8 @@ def chat(inp, history, agent):
         print("inp: " + inp)
         try:
             response = agent(inp)
-            try:
-                answer = str(response["output"])
-                logger.debug(f"output: {answer}")
-                # thought_process_text = format_response(response)
-                thought_process_text, extracted_query = format_response(response)
-
-                # Append the extracted query to the answer
-                if extracted_query:
-                    answer += f"\n\nThe original SQL query used is:\n```\n{extracted_query}\n```"
-
-                logger.debug(f"answer: {answer}")
-                history.append((inp, answer))
-            except Exception as e:
-                logger.error(
-                    f"{type(e).__name__=} exception from parsing {response=}: {e}"
-                ),
-                thought_process_text = f"Exception in parsing response: {e}"
-                history.append((inp, thought_process_text))
+            answer, thought_process_text = format_answer(response)
+            history.append((inp, answer))
         except Exception as e:
             logger.error(f"{type(e).__name__} exception from receiving response: {e}"),
             thought_process_text = f"Exception in receiving response: {e}"
@@ -116,6 +137,69 @@ def chat(inp, history, agent):
     # return history, history, "\n".join(thought_process_text)
 
 
+def stream_chat(inp, history, agent):
+    """
+    Handles the chat conversation like chat(), but updates the thought process
+    as the agent runs: the LLM tokens as they are generated, then every
+    thought, action and observation as soon as it happens.
+
+    Parameters:
+    inp (str): The user's input
+    history (list): The chat history
+    agent: The chat agent
+
+    Yields:
+    history: The updated chat history
+    thought_process_text: The formatted thought process text so far
+    """
+    if not os.environ.get("FLIPSIDE_API_KEY"):
+        raise Exception(
+            "FLIPSIDE_API_KEY is not set, \
+                        please set it in .env file or in the environment variable"
+        )
+
+    history = history or []
+    if agent is None:
+        history.append((inp, "Please paste your OpenAI API Key to use"))
+        thought_process_text = "Please paste your OpenAI API Key to use"
+        yield history, history, thought_process_text
+        return
+
+    print("\n==== date/time: " + str(datetime.datetime.now()) + " ====")
+    print("inp: " + inp)
+    # the answer is shown once the run finishes
+    history.append((inp, None))
+    steps = []
+    step_number = 0
+    llm_output = ""
+    thought_process_text = ""
+    try:
+        for event in iter_agent_events(agent, inp):
+            if event["type"] == EVENT_TOKEN:
+                llm_output += event["token"]
+            elif event["type"] == EVENT_ACTION:
+                llm_output = ""
+                step_number += 1
+                action = AgentAction(
+                    event["tool"], event["tool_input"], event["thought"]
+                )
+                steps.append(format_agent_action(action, step_number))
+            elif event["type"] == EVENT_OBSERVATION:
+                steps.append(format_observation(event["observation"]))
+            elif event["type"] == EVENT_RESPONSE:
+                answer, thought_process_text = format_answer(event["response"])
+                history[-1] = (inp, answer)
+                yield history, history, thought_process_text
+                return
+            thought_process_text = "\n\n".join(steps + [llm_output])
+            yield history, history, thought_process_text
+    except Exception as e:
+        logger.error(f"{type(e).__name__} exception from receiving response: {e}"),
+        thought_process_text = f"Exception in receiving response: {e}"
+        history[-1] = (inp, thought_process_text)
+        yield history, history, thought_process_text
+
+
 block = gr.Blocks(css=".gradio-container {background-color: #f5f5f5;}")
 
 with block:
@@ -174,14 +258,14 @@ with block:
 
     # "submit" Button.click is triggered when the user clicks the button
     submit.click(
-        chat,
+        stream_chat,
         inputs=[message, state, agent_state],
         # outputs=[chatbot, state, thought_process_textbox],
         outputs=[chatbot, state, thought_process_text],
     )
 
     message.submit(
-        chat,
+        stream_chat,
         inputs=[message, state, agent_state],
         outputs=[chatbot, state, thought_process_text],
     )
@@ -197,7 +281,8 @@ with block:
 def start(debug=False):
     try:
         logger.info("Starting Gradio app...")
-        block.launch(debug=debug)
+        # the queue is required by the generator event handlers
+        block.queue().launch(debug=debug)
         logger.info("Gradio app started successfully!")
     except Exception as e:
         logger.error(f"Error while starting Gradio app: {e}")
@@ -1,8 +1,10 @@
 # Description: This file contains the code to query crypto data from Flipside Crypto
 # Path: api/services/blockchain_data.py
 import os
+from typing import Any, AsyncIterator, Dict, Tuple
 
-from chatweb3.create_agent import create_agent_executor
+from chatweb3.callbacks.streaming_callback import EVENT_RESPONSE, aiter_agent_events
+from chatweb3.create_agent import create_agent_executor, get_snowflake_container
 from chatweb3.utils import format_response
 from config.config import agent_config
 from config.logging_config import get_logger
@@ -25,7 +27,16 @@ if not os.environ.get("OPENAI_API_KEY"):
 
 CONVERSATION_MODE = agent_config.get("agent.conversational_chat")
 
-agent = create_agent_executor(conversation_mode=CONVERSATION_MODE)
+# load the metadata index and create the engines at startup rather than on the first question
+get_snowflake_container()
+
+
+def new_agent_executor():
+    """Return a new agent executor for one question.
+    Concurrent questions must not share an executor: its conversation memory and the state of its tools are per run.
+    The executors still share the SnowflakeContainer of the process, and so its engines and query cache.
+    """
+    return create_agent_executor(conversation_mode=CONVERSATION_MODE)
 
 
 class BlockchainDataError(Exception):
@@ -35,17 +46,50 @@ class BlockchainDataError(Exception):
         super().__init__(self.message)
 
 
-def query_blockchain_data_from_flipside(inp: str) -> str:
+def _format_answer(response) -> Tuple[str, str]:
+    answer = str(response["output"])
+    # thought_process = str(response.get("intermediate_steps"))
+    thought_process, extracted_query = format_response(response)
+
+    if extracted_query:
+        answer += f"\n\nThe original SQL query used is:\n```\n{extracted_query}\n```"
+    return answer, thought_process
+
+
+def query_blockchain_data_from_flipside(inp: str) -> Tuple[str, str]:
+    try:
+        response = new_agent_executor()(inp)
+        return _format_answer(response)
+    except Exception as e:
+        raise BlockchainDataError(name="Blockchain Data Retrival Error", message=str(e))
+
+
+async def aquery_blockchain_data_from_flipside(inp: str) -> Tuple[str, str]:
+    """Answer the question with the async agent path, so that one worker serves many questions at once."""
     try:
-        response = agent(inp)
-        answer = str(response["output"])
-        # thought_process = str(response.get("intermediate_steps"))
-        thought_process, extracted_query = format_response(response)
-
-        if extracted_query:
-            answer += (
-                f"\n\nThe original SQL query used is:\n```\n{extracted_query}\n```"
-            )
-        return answer, thought_process
+        response = await new_agent_executor().acall(inp)
+        return _format_answer(response)
     except Exception as e:
         raise BlockchainDataError(name="Blockchain Data Retrival Error", message=str(e))
+
+
+async def astream_blockchain_data_from_flipside(
+    inp: str,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yield the LLM tokens and the agent steps of the answer as they happen, then the answer itself.
+    The last event is an "answer" event with the answer and the thought process, or an "error" event.
+    """
+    try:
+        async for event in aiter_agent_events(new_agent_executor(), inp):
+            if event["type"] == EVENT_RESPONSE:
+                answer, thought_process = _format_answer(event["response"])
+                yield {
+                    "type": "answer",
+                    "answer": answer,
+                    "thought_process": thought_process,
+                }
+            else:
+                yield event
+    except Exception as e:
+        logger.error(f"Error streaming the answer to {inp}: {e}")
+        yield {"type": "error", "error": str(e)}
@@ -0,0 +1,220 @@
+# Description: This file contains the job store and runner of the submit/poll query API
+# Path: api/services/query_jobs.py
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from pydantic import BaseModel
+
+from config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_FINISHED_STATUSES = (JOB_SUCCEEDED, JOB_FAILED)
+
+
+class QueryJob(BaseModel):
+    job_id: str
+    # sha256 of the API key and the session id that submitted the job, only that caller can read it
+    owner: str
+    query: str
+    status: str = JOB_PENDING
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+
+
+class JobLimitExceededError(Exception):
+    def __init__(self, name, message):
+        self.name = name
+        self.message = message
+        super().__init__(self.message)
+
+
+class MemoryJobStore:
+    """In-process job store, dropping finished jobs retention_seconds after they finish.
+    Only the worker process that ran a job can return it, use SQLiteJobStore when the API runs several workers.
+    """
+
+    def __init__(self, retention_seconds: float = 3600):
+        self.retention_seconds = retention_seconds
+        self._jobs: Dict[str, QueryJob] = {}
+        self._lock = threading.Lock()
+
+    def save(self, job: QueryJob):
+        with self._lock:
+            self._jobs[job.job_id] = job
+            expired_before = time.time() - self.retention_seconds
+            for job_id in [
+                job_id
+                for job_id, stored in self._jobs.items()
+                if stored.finished_at is not None
+                and stored.finished_at < expired_before
+            ]:
+                del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[QueryJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+class SQLiteJobStore:
+    """Job store persisted in a local SQLite file, so that the results survive a worker restart."""
+
+    def __init__(self, file_path: str, retention_seconds: float = 3600):
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        if os.path.dirname(file_path):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        self._connection = sqlite3.connect(file_path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS query_jobs "
+                "(job_id TEXT PRIMARY KEY, job TEXT NOT NULL, finished_at REAL)"
+            )
+
+    def save(self, job: QueryJob):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO query_jobs (job_id, job, finished_at) VALUES (?, ?, ?)",
+                (job.job_id, job.json(), job.finished_at),
+            )
+            self._connection.execute(
+                "DELETE FROM query_jobs WHERE finished_at < ?",
+                (time.time() - self.retention_seconds,),
+            )
+
+    def get(self, job_id: str) -> Optional[QueryJob]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT job FROM query_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return QueryJob(**json.loads(row[0])) if row else None
+
+
+def job_owner(api_key: str, session_id: Optional[str] = None) -> str:
+    """Hash the API key and the caller's session id into the owner of a job.
+    Front-ends sharing an API key pass a session id each, so that they cannot read each other's jobs.
+    """
+    caller = f"{api_key}\0{session_id}" if session_id else api_key
+    return hashlib.sha256(caller.encode("utf-8")).hexdigest()
+
+
+class QueryJobManager:
+    def __init__(
+        self,
+        run_query: Callable[[str], Awaitable[Any]],
+        store=None,
+        max_jobs_per_owner: int = 4,
+    ):
+        """
+        run_query: awaits the result of a query, e.g., QueryDatabaseTool.arun
+        store: MemoryJobStore or SQLiteJobStore, defaults to a MemoryJobStore
+        max_jobs_per_owner: the number of pending or running jobs an owner (API key and session id) may have at once,
+            0 means unlimited. The jobs are counted in this process, so each worker applies the limit separately.
+        """
+        self.run_query = run_query
+        self.store = store if store is not None else MemoryJobStore()
+        self.max_jobs_per_owner = max_jobs_per_owner
+        self._active_jobs: Dict[str, int] = {}
+        # keep a reference to the running tasks so that they are not garbage collected
+        self._tasks: Set[asyncio.Task] = set()
+
+    def submit(
+        self, api_key: str, query: str, session_id: Optional[str] = None
+    ) -> QueryJob:
+        """Create a job for the query and start running it in the background. Must be called from the event loop."""
+        owner = job_owner(api_key, session_id)
+        active_jobs = self._active_jobs.get(owner, 0)
+        if 0 < self.max_jobs_per_owner <= active_jobs:
+            raise JobLimitExceededError(
+                name="Query Job Limit Exceeded",
+                message=f"At most {self.max_jobs_per_owner} query jobs may be pending or running at once, "
+                "poll the existing jobs and retry later.",
+            )
+        self._active_jobs[owner] = active_jobs + 1
+
+        job = QueryJob(
+            job_id=uuid.uuid4().hex, owner=owner, query=query, created_at=time.time()
+        )
+        self.store.save(job)
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        logger.debug(f"Submitted query job {job.job_id}")
+        return job
+
+    async def _run(self, job: QueryJob):
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        self.store.save(job)
+        try:
+            job.result = await self.run_query(job.query)
+            job.status = JOB_SUCCEEDED
+        except Exception as e:
+            logger.error(f"Query job {job.job_id} failed: {e}")
+            job.error = str(e)
+            job.status = JOB_FAILED
+        finally:
+            job.finished_at = time.time()
+            self.store.save(job)
+            self._active_jobs[job.owner] -= 1
+            if not self._active_jobs[job.owner]:
+                del self._active_jobs[job.owner]
+
+    def get(
+        self, api_key: str, job_id: str, session_id: Optional[str] = None
+    ) -> Optional[QueryJob]:
+        """Return the job if it exists and was submitted with the same API key and session id."""
+        job = self.store.get(job_id)
+        if job is None or job.owner != job_owner(api_key, session_id):
+            return None
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active_jobs": sum(self._active_jobs.values()),
+            "active_owners": len(self._active_jobs),
+        }
+
+
+def get_result_page(job: QueryJob, page_number: int, page_size: int) -> Dict:
+    """Return one page of the result rows of a job, with the paging information.
+    Results that are not a list of rows, e.g., the string result of the snowflake mode, are returned whole on page 1.
+    """
+    if page_number < 1 or page_size < 1:
+        raise ValueError("page_number and page_size must be positive.")
+    page = {
+        "job_id": job.job_id,
+        "status": job.status,
+        "error": job.error,
+        "result": None,
+        "page_number": page_number,
+        "page_size": page_size,
+        "total_rows": None,
+        "total_pages": None,
+    }
+    if job.status != JOB_SUCCEEDED:
+        return page
+    if not isinstance(job.result, list):
+        page["result"] = job.result if page_number == 1 else None
+        page["total_pages"] = 1
+        return page
+    total_rows = len(job.result)
+    start = (page_number - 1) * page_size
+    page["result"] = job.result[start : start + page_size]
+    page["total_rows"] = total_rows
+    page["total_pages"] = max(1, -(-total_rows // page_size))
+    return page
@@ -0,0 +1,133 @@
+"""
+bench_agent_concurrency.py
+Load test the /query_blockchain_data endpoint of one worker with N simultaneous questions,
+comparing the async agent path (await agent.acall) against calling the blocking agent(inp) in the handler.
+The LLM is replaced by a stand-in that waits --llm-latency seconds per call and runs one query per question,
+and Flipside by a stand-in that blocks for --latency seconds per query.
+
+Usage:
+    python -m benchmarks.bench_agent_concurrency [--llm-latency S] [--latency S] [--concurrency N ...]
+"""
+import argparse
+import asyncio
+import re
+import time
+from typing import Any, List, Optional
+
+import httpx
+from langchain.chat_models.base import BaseChatModel
+from langchain.schema import AIMessage, BaseMessage, ChatGeneration, ChatResult
+
+from api.api_endpoints import BlockchainDataQuestion, app, db, get_api_key
+from api.services import blockchain_data
+from benchmarks.bench_api_concurrency import BlockingFlipside
+from chatweb3.tools.snowflake_database.constants import QUERY_DATABASE_TOOL_NAME
+
+
+class LatencyChatModel(BaseChatModel):
+    """Queries the number of the question, then answers once it got the observation."""
+
+    latency: float = 1.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "latency-chat-model"
+
+    def _reply(self, messages: List[BaseMessage]) -> ChatResult:
+        prompt = messages[-1].content
+        if "Observation:" in prompt:
+            text = "Final Answer: done"
+        else:
+            number = re.findall(r"question (\d+)", prompt)[-1]
+            text = (
+                "Action:\n```\n"
+                f'{{"action": "{QUERY_DATABASE_TOOL_NAME}", '
+                f'"action_input": {{"query": "select {number}"}}}}\n```'
+            )
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        return self._reply(messages)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._reply(messages)
+
+
+@app.post("/bench_blocking_question", include_in_schema=False)
+async def bench_blocking_question(question: BlockchainDataQuestion):
+    """The handler calling the blocking agent(inp) on the event loop."""
+    answer, thought_process = blockchain_data.query_blockchain_data_from_flipside(
+        question.query
+    )
+    return {"answer": answer, "thought_process": thought_process}
+
+
+async def _load(path, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        start_time = time.perf_counter()
+        responses = await asyncio.gather(
+            *(
+                client.post(path, json={"query": f"Answer question {i}"})
+                for i in range(concurrency)
+            )
+        )
+        duration = time.perf_counter() - start_time
+    assert all(response.status_code == 200 for response in responses), [
+        response.text for response in responses if response.status_code != 200
+    ]
+    return duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    app.dependency_overrides[get_api_key] = lambda: "bench"
+    new_agent_executor = blockchain_data.new_agent_executor
+
+    def new_latency_agent_executor():
+        agent_executor = new_agent_executor()
+        agent_executor.agent.llm_chain.llm = LatencyChatModel(latency=args.llm_latency)
+        return agent_executor
+
+    blockchain_data.new_agent_executor = new_latency_agent_executor
+    db._flipside = BlockingFlipside(args.latency)
+    # distinct queries, so neither the result cache nor single-flight collapse them
+    db.query_cache = None
+
+    print(
+        f"simulated llm latency {args.llm_latency}s per call, "
+        f"flipside latency {args.latency}s per query"
+    )
+    for concurrency in args.concurrency:
+        for name, path in (
+            ("blocking", "/bench_blocking_question"),
+            ("async", "/query_blockchain_data"),
+        ):
+            duration = asyncio.run(_load(path, concurrency))
+            print(
+                f"{name:>8} concurrency={concurrency:<3} {duration:.2f}s "
+                f"{concurrency / duration:.2f} questions/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
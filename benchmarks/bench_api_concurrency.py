@@ -0,0 +1,81 @@
+"""
+bench_api_concurrency.py
+Load test the /query_snowflake_sql_database endpoint of one worker with concurrent requests,
+comparing the async path (await tool.arun) against calling the blocking tool.run() in the handler.
+Flipside is replaced by a stand-in that blocks for --latency seconds per query, like its polling loop does.
+
+Usage:
+    python -m benchmarks.bench_api_concurrency [--latency S] [--concurrency N ...]
+"""
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+
+from api.api_endpoints import SnowflakeQuery, app, db, get_api_key
+from chatweb3.tools.snowflake_database.tool_custom import QueryDatabaseTool
+
+
+class BlockingFlipside:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def query(self, sql, **kwargs):
+        time.sleep(self.latency)
+        return SimpleNamespace(query_id=None, columns=["sql"], rows=[[sql]], page=None)
+
+
+@app.post("/bench_blocking_query", include_in_schema=False)
+async def bench_blocking_query(query: SnowflakeQuery):
+    """The handler as it was before the async path: the blocking tool.run() on the event loop."""
+    tool = QueryDatabaseTool(db=db)
+    return {"result": tool.run(tool_input=query.query)}
+
+
+async def _load(path, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        start_time = time.perf_counter()
+        responses = await asyncio.gather(
+            *(
+                client.post(path, json={"query": f'{{"query": "select {i}"}}'})
+                for i in range(concurrency)
+            )
+        )
+        duration = time.perf_counter() - start_time
+    assert all(response.status_code == 200 for response in responses), [
+        response.text for response in responses if response.status_code != 200
+    ]
+    return duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    app.dependency_overrides[get_api_key] = lambda: "bench"
+    db._flipside = BlockingFlipside(args.latency)
+    # distinct queries, so neither the result cache nor single-flight collapse them
+    db.query_cache = None
+
+    print(f"simulated flipside latency {args.latency}s per query")
+    for concurrency in args.concurrency:
+        for name, path in (
+            ("blocking", "/bench_blocking_query"),
+            ("async", "/query_snowflake_sql_database"),
+        ):
+            duration = asyncio.run(_load(path, concurrency))
+            print(
+                f"{name:>8} concurrency={concurrency:<3} {duration:.2f}s "
+                f"{concurrency / duration:.2f} req/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+bench_ddl_parsing.py
+Compare the legacy per-column regex extraction of column data types and comments
+against the single-pass DDL tokenizer, over the bundled data/metadata/*.json files.
+
+Usage:
+    python -m benchmarks.bench_ddl_parsing [--runs N]
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import time
+
+from chatweb3.metadata_parser import parse_column_definitions
+from config.config import agent_config
+
+PROJ_ROOT_DIR = agent_config.get("proj_root_dir")
+
+
+def legacy_parse_data_type(name, create_table_stmt):
+    pattern = rf"{name}\s+(?P<data_type>.+?(\([^\)]+\))?(?=\s*(,|\n\s*\))))"
+    match = re.search(pattern, create_table_stmt, re.IGNORECASE)
+    return match.group("data_type") if match else None
+
+
+def legacy_parse_comment(name, get_ddl_create_table):
+    pattern = rf"{name}\s+([\w\(\),]*)?\s*COMMENT\s+'(?P<comment>.*?)'"
+    match = re.search(pattern, get_ddl_create_table, re.IGNORECASE | re.DOTALL)
+    return match.group("comment") if match else None
+
+
+def load_tables(file_path):
+    with open(file_path, "r") as f:
+        data = json.load(f)
+    tables = []
+    for database in data["root_schema_obj"]["databases"].values():
+        for schema in database["schemas"].values():
+            tables.extend(schema["tables"].values())
+    return tables
+
+
+def run_legacy(tables):
+    for table in tables:
+        for name in table.get("column_names") or []:
+            if table.get("create_table_stmt"):
+                legacy_parse_data_type(name, table["create_table_stmt"])
+            if table.get("get_ddl_create_table"):
+                legacy_parse_comment(name, table["get_ddl_create_table"])
+
+
+def run_tokenizer(tables):
+    for table in tables:
+        if table.get("create_table_stmt"):
+            parse_column_definitions(table["create_table_stmt"])
+        if table.get("get_ddl_create_table"):
+            parse_column_definitions(table["get_ddl_create_table"])
+
+
+def count_differences(tables):
+    data_type_diffs = comment_diffs = columns = 0
+    for table in tables:
+        data_types = parse_column_definitions(table.get("create_table_stmt") or "")
+        comments = parse_column_definitions(table.get("get_ddl_create_table") or "")
+        for name in table.get("column_names") or []:
+            columns += 1
+            if (
+                table.get("create_table_stmt")
+                and legacy_parse_data_type(name, table["create_table_stmt"])
+                != data_types.get(name.lower(), (None, None))[0]
+            ):
+                data_type_diffs += 1
+            if (
+                table.get("get_ddl_create_table")
+                and legacy_parse_comment(name, table["get_ddl_create_table"])
+                != comments.get(name.lower(), (None, None))[1]
+            ):
+                comment_diffs += 1
+    return columns, data_type_diffs, comment_diffs
+
+
+def _best_of(func, tables, runs):
+    durations = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        func(tables)
+        durations.append(time.perf_counter() - start_time)
+    return min(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    for file_path in sorted(
+        glob.glob(os.path.join(PROJ_ROOT_DIR, "data", "metadata", "context_*.json"))
+    ):
+        tables = load_tables(file_path)
+        legacy = _best_of(run_legacy, tables, args.runs)
+        tokenizer = _best_of(run_tokenizer, tables, args.runs)
+        columns, data_type_diffs, comment_diffs = count_differences(tables)
+        print(
+            f"{os.path.basename(file_path)}: {len(tables)} tables, {columns} columns\n"
+            f"  legacy regex: {legacy * 1000:8.1f}ms  tokenizer: {tokenizer * 1000:8.1f}ms"
+            f"  speedup: {legacy / tokenizer:.1f}x\n"
+            f"  columns whose result changed: data type {data_type_diffs}, comment {comment_diffs}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+bench_metadata_ingestion.py
+Compare the peak memory and time of building the metadata index from a monolithic JSON context file
+against the JSON-lines layout, on a context file synthesized by replicating the tables of the bundled index.
+
+Usage:
+    python -m benchmarks.bench_metadata_ingestion [--size-mb N]
+"""
+import argparse
+import gc
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from chatweb3.metadata_parser import MetadataParser
+from config.config import agent_config
+
+PROJ_ROOT_DIR = agent_config.get("proj_root_dir")
+CONTEXT_FILE = os.path.join(
+    PROJ_ROOT_DIR, agent_config.get("metadata.context_ethereum_file")
+)
+
+
+def synthesize_context(context_file, output_file, size_mb):
+    """Write a context file of about size_mb MB by replicating the tables of context_file into numbered schemas."""
+    with open(context_file, "r") as f:
+        data = json.load(f)
+    databases = data["root_schema_obj"]["databases"]
+    source_size = os.path.getsize(context_file)
+    copies = max(1, int(size_mb * 2**20 / source_size))
+
+    synthesized = {"root_schema_obj": {"databases": {}}}
+    for database_name, database in databases.items():
+        schemas = {}
+        for copy in range(copies):
+            for schema_name, schema in database["schemas"].items():
+                name = f"{schema_name}_{copy}"
+                tables = {
+                    table_name: {
+                        **table,
+                        "schema_name": name,
+                        "long_name": f"{database_name}.{name}.{table_name}",
+                    }
+                    for table_name, table in schema["tables"].items()
+                }
+                schemas[name] = {**schema, "name": name, "tables": tables}
+        synthesized["root_schema_obj"]["databases"][database_name] = {
+            **database,
+            "schemas": schemas,
+        }
+    with open(output_file, "w") as f:
+        json.dump(synthesized, f)
+
+
+def measure(file_path):
+    gc.collect()
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    parser = MetadataParser(file_path=file_path, drop_raw_metadata=True)
+    duration = time.perf_counter() - start_time
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    tables = len(parser.get_tables_from_database_schema_table_names())
+    return tables, duration, retained, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=float, default=200)
+    parser.add_argument("--context", default=CONTEXT_FILE)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_file = os.path.join(tmp_dir, "context.json")
+        jsonl_file = os.path.join(tmp_dir, "context.jsonl")
+        synthesize_context(args.context, json_file, args.size_mb)
+        MetadataParser(file_path=json_file).save_metadata_to_jsonl(jsonl_file)
+        print(
+            f"json: {os.path.getsize(json_file) / 2**20:.1f}MiB, "
+            f"jsonl: {os.path.getsize(jsonl_file) / 2**20:.1f}MiB"
+        )
+
+        for label, file_path in (("json", json_file), ("jsonl", jsonl_file)):
+            tables, duration, retained, peak = measure(file_path)
+            print(
+                f"{label:<6} {tables} tables in {duration:6.2f}s "
+                f"retained={retained / 2**20:8.1f}MiB peak={peak / 2**20:8.1f}MiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+bench_metadata_load.py
+Compare the startup time of building the metadata index from the JSON files
+against loading it from a compiled snapshot.
+
+Usage:
+    python -m benchmarks.bench_metadata_load [--runs N]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from chatweb3.metadata_parser import MetadataParser
+from config.config import agent_config
+
+PROJ_ROOT_DIR = agent_config.get("proj_root_dir")
+CONTEXT_FILE = os.path.join(
+    PROJ_ROOT_DIR, agent_config.get("metadata.context_ethereum_file")
+)
+ANNOTATION_FILE = os.path.join(
+    PROJ_ROOT_DIR, agent_config.get("metadata.annotation_ethereum_file")
+)
+
+
+def _time_runs(func, runs):
+    durations = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start_time)
+    return durations
+
+
+def _report(label, durations):
+    print(
+        f"{label:<10} min={min(durations) * 1000:8.1f}ms "
+        f"median={statistics.median(durations) * 1000:8.1f}ms "
+        f"max={max(durations) * 1000:8.1f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--context", default=CONTEXT_FILE)
+    parser.add_argument("--annotation", default=ANNOTATION_FILE)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot_file = os.path.join(tmp_dir, "index.pkl")
+        MetadataParser(
+            file_path=args.context,
+            annotation_file_path=args.annotation,
+            snapshot_file_path=snapshot_file,
+        )
+        print(f"snapshot size: {os.path.getsize(snapshot_file)} bytes")
+
+        json_durations = _time_runs(
+            lambda: MetadataParser(
+                file_path=args.context, annotation_file_path=args.annotation
+            ),
+            args.runs,
+        )
+        snapshot_durations = _time_runs(
+            lambda: MetadataParser(
+                file_path=args.context,
+                annotation_file_path=args.annotation,
+                snapshot_file_path=snapshot_file,
+            ),
+            args.runs,
+        )
+
+    _report("json", json_durations)
+    _report("snapshot", snapshot_durations)
+    print(
+        f"speedup: {statistics.median(json_durations) / statistics.median(snapshot_durations):.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+bench_metadata_memory.py
+Measure the memory retained by the metadata index, with and without the raw DDL statements,
+sample rows and information_schema values, using tracemalloc.
+
+Usage:
+    python -m benchmarks.bench_metadata_memory [--context FILE] [--annotation FILE]
+"""
+import argparse
+import gc
+import os
+import tracemalloc
+
+from chatweb3.metadata_parser import MetadataParser
+from config.config import agent_config
+
+PROJ_ROOT_DIR = agent_config.get("proj_root_dir")
+CONTEXT_FILE = os.path.join(
+    PROJ_ROOT_DIR, agent_config.get("metadata.context_ethereum_file")
+)
+ANNOTATION_FILE = os.path.join(
+    PROJ_ROOT_DIR, agent_config.get("metadata.annotation_ethereum_file")
+)
+
+
+def measure(context, annotation, drop_raw_metadata):
+    gc.collect()
+    tracemalloc.start()
+    parser = MetadataParser(
+        file_path=context,
+        annotation_file_path=annotation,
+        drop_raw_metadata=drop_raw_metadata,
+    )
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del parser
+    return retained, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--context", default=CONTEXT_FILE)
+    parser.add_argument("--annotation", default=ANNOTATION_FILE)
+    args = parser.parse_args()
+
+    print(f"index: {os.path.basename(args.context)}")
+    for label, drop_raw_metadata in (("full", False), ("drop raw", True)):
+        retained, peak = measure(args.context, args.annotation, drop_raw_metadata)
+        print(
+            f"{label:<10} retained={retained / 2**20:7.2f}MiB peak={peak / 2**20:7.2f}MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+bench_result_formats.py
+Measure the conversion of a synthetic query result (block number, block timestamp, Decimal amount, address)
+to JSON and to the columnar Arrow/Parquet formats, comparing against the per-cell loop
+convert_rows_to_serializable() used before the column-wise conversion.
+The Arrow/Parquet timings require the optional pyarrow package.
+
+Usage:
+    python -m benchmarks.bench_result_formats [--rows N] [--repeat N] [--rows-per-block N]
+"""
+import argparse
+import datetime
+import json
+import time
+from decimal import Decimal
+
+from chatweb3.query_results import arrow_table_to_bytes, rows_to_arrow_table
+from chatweb3.utils import convert_rows_to_serializable
+
+COLUMNS = ["block_number", "block_timestamp", "amount_usd", "origin_from_address"]
+
+
+def per_cell_convert_rows_to_serializable(rows):
+    """convert_rows_to_serializable() as it was before the column-wise conversion."""
+    converted_rows = []
+    for row in rows:
+        converted_row = []
+        for item in row:
+            if isinstance(item, datetime.datetime):
+                item = item.isoformat()
+            elif isinstance(item, datetime.date):
+                item = item.isoformat()
+            elif isinstance(item, Decimal):
+                item = float(item)
+            converted_row.append(item)
+        converted_rows.append(converted_row)
+    return converted_rows
+
+
+def synthetic_rows(num_rows, rows_per_block=1):
+    start = datetime.datetime(2023, 1, 1)
+    return [
+        (
+            17000000 + i // rows_per_block,
+            start + datetime.timedelta(seconds=12 * (i // rows_per_block)),
+            Decimal(i) / Decimal(100),
+            f"0x{i:040x}",
+        )
+        for i in range(num_rows)
+    ]
+
+
+def _time(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start_time)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--rows-per-block",
+        type=int,
+        default=1,
+        help="rows sharing the same block number and timestamp, like the transactions of a block",
+    )
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows, args.rows_per_block)
+    print(
+        f"{args.rows} rows x {len(COLUMNS)} columns, {args.rows_per_block} rows per block, "
+        f"best of {args.repeat}"
+    )
+
+    loop_seconds, loop_rows = _time(
+        lambda: per_cell_convert_rows_to_serializable(rows), args.repeat
+    )
+    columnar_seconds, columnar_rows = _time(
+        lambda: convert_rows_to_serializable(rows), args.repeat
+    )
+    assert loop_rows == columnar_rows
+    json_seconds, json_text = _time(lambda: json.dumps(columnar_rows), args.repeat)
+    print(f"per-cell convert_rows_to_serializable  {loop_seconds * 1000:8.1f} ms")
+    print(f"column-wise convert_rows_to_serializable {columnar_seconds * 1000:6.1f} ms")
+    print(
+        f"json.dumps                             {json_seconds * 1000:8.1f} ms, "
+        f"{len(json_text) / 2**20:.1f} MiB"
+    )
+
+    try:
+        arrow_seconds, table = _time(
+            lambda: rows_to_arrow_table(COLUMNS, rows), args.repeat
+        )
+    except ValueError as e:
+        print(f"skipping the Arrow/Parquet formats: {e}")
+        return
+    print(f"rows_to_arrow_table                    {arrow_seconds * 1000:8.1f} ms")
+    for result_format in ("arrow", "parquet"):
+        seconds, content = _time(
+            lambda: arrow_table_to_bytes(table, result_format), args.repeat
+        )
+        print(
+            f"{result_format + ' serialization':<39}{seconds * 1000:8.1f} ms, "
+            f"{len(content) / 2**20:.1f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
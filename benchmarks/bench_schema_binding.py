@@ -0,0 +1,85 @@
+"""
+bench_schema_binding.py
+Count the statements and the latency per SnowflakeDatabase.run() query, comparing the USE SCHEMA sent before
+every query against the schema tracked per pooled connection.
+Snowflake is replaced by a local SQLite stand-in that counts the statements, adds --latency seconds of round trip
+to each one and turns USE SCHEMA into a no-op.
+
+Usage:
+    python -m benchmarks.bench_schema_binding [--queries N] [--latency S]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event, text
+
+from chatweb3.snowflake_database import CURRENT_SCHEMA_INFO_KEY, SnowflakeDatabase
+
+
+class StandInSnowflakeDatabase(SnowflakeDatabase):
+    @property
+    def dialect(self) -> str:
+        return "snowflake"
+
+
+class UseSchemaPerQueryDatabase(StandInSnowflakeDatabase):
+    """SnowflakeDatabase.run() as it was before: USE SCHEMA before every query."""
+
+    def _set_schema(self, connection) -> None:
+        connection.info.pop(CURRENT_SCHEMA_INFO_KEY, None)
+        super()._set_schema(connection)
+
+
+def create_stand_in_engine(file_path, latency, counter):
+    engine = create_engine(f"sqlite:///{file_path}", pool_size=1, max_overflow=0)
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        keyword = statement.split()[0].upper()
+        counter[keyword] = counter.get(keyword, 0) + 1
+        time.sleep(latency)
+        if statement.upper().startswith("USE SCHEMA"):
+            statement = "SELECT 1"
+        return statement, parameters
+
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE blocks (block_number INTEGER)"))
+        connection.execute(text("INSERT INTO blocks VALUES (17000000)"))
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    print(
+        f"{args.queries} queries, simulated round trip {args.latency * 1000:.1f} ms per statement"
+    )
+    for name, database_class in (
+        ("use schema per query", UseSchemaPerQueryDatabase),
+        ("tracked schema", StandInSnowflakeDatabase),
+    ):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            counter = {}
+            engine = create_stand_in_engine(
+                os.path.join(tmp_dir, "stand_in.db"), args.latency, counter
+            )
+            db = database_class(engine=engine, schema="main")
+            counter.clear()
+            start_time = time.perf_counter()
+            for _ in range(args.queries):
+                db.run("SELECT max(block_number) FROM blocks")
+            duration = time.perf_counter() - start_time
+            engine.dispose()
+        print(
+            f"{name:>20}: {sum(counter.values()) / args.queries:.2f} statements/query "
+            f"({counter.get('USE', 0)} USE SCHEMA), {duration / args.queries * 1000:.2f} ms/query"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+bench_streaming.py
+Measure the time to first byte of an answer over HTTP, comparing the Server-Sent Events of
+/query_blockchain_data/stream against waiting for the whole answer of /query_blockchain_data.
+The app is served by uvicorn on a local port. The LLM is replaced by a stand-in that streams its reply
+one word every --token-latency seconds, and Flipside by a stand-in that blocks for --latency seconds per query.
+
+Usage:
+    python -m benchmarks.bench_streaming [--token-latency S] [--latency S] [--questions N]
+"""
+import argparse
+import asyncio
+import socket
+import statistics
+import threading
+import time
+from typing import Any, List, Optional
+
+import httpx
+import uvicorn
+from langchain.schema import AIMessage, BaseMessage, ChatGeneration, ChatResult
+
+from api.api_endpoints import app, db, get_api_key
+from api.services import blockchain_data
+from benchmarks.bench_agent_concurrency import LatencyChatModel
+from benchmarks.bench_api_concurrency import BlockingFlipside
+
+# the time to first byte of a streamed answer should stay under this many seconds
+TIME_TO_FIRST_BYTE_GOAL = 1.0
+
+
+class StreamingLatencyChatModel(LatencyChatModel):
+    """Streams the reply of LatencyChatModel one word every latency seconds."""
+
+    def _stream_reply(self, messages: List[BaseMessage]):
+        text = self._reply(messages).generations[0].message.content
+        words = text.split(" ")
+        return [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tokens = self._stream_reply(messages)
+        for token in tokens:
+            time.sleep(self.latency)
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+        message = AIMessage(content="".join(tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tokens = self._stream_reply(messages)
+        for token in tokens:
+            await asyncio.sleep(self.latency)
+            if run_manager:
+                await run_manager.on_llm_new_token(token)
+        message = AIMessage(content="".join(tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def _serve(port):
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def _time_to_first_byte(client, path, question):
+    """Return the time to the first byte and to the last byte of the response."""
+    start_time = time.perf_counter()
+    time_to_first_byte = None
+    with client.stream("POST", path, json={"query": question}) as response:
+        response.raise_for_status()
+        for _ in response.iter_raw():
+            if time_to_first_byte is None:
+                time_to_first_byte = time.perf_counter() - start_time
+    return time_to_first_byte, time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--token-latency", type=float, default=0.05)
+    parser.add_argument("--latency", type=float, default=2.0)
+    parser.add_argument("--questions", type=int, default=5)
+    args = parser.parse_args()
+
+    app.dependency_overrides[get_api_key] = lambda: "bench"
+    new_agent_executor = blockchain_data.new_agent_executor
+
+    def new_streaming_agent_executor():
+        agent_executor = new_agent_executor()
+        agent_executor.agent.llm_chain.llm = StreamingLatencyChatModel(
+            latency=args.token_latency
+        )
+        return agent_executor
+
+    blockchain_data.new_agent_executor = new_streaming_agent_executor
+    db._flipside = BlockingFlipside(args.latency)
+    db.query_cache = None
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = _serve(port)
+    print(
+        f"simulated llm latency {args.token_latency}s per token, "
+        f"flipside latency {args.latency}s per query"
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+            for name, path in (
+                ("answer", "/query_blockchain_data"),
+                ("stream", "/query_blockchain_data/stream"),
+            ):
+                timings = [
+                    _time_to_first_byte(client, path, f"Answer question {i}")
+                    for i in range(args.questions)
+                ]
+                time_to_first_byte = statistics.median(t for t, _ in timings)
+                duration = statistics.median(d for _, d in timings)
+                print(
+                    f"{name:>7} time to first byte {time_to_first_byte:.2f}s, "
+                    f"whole answer {duration:.2f}s (median of {args.questions})"
+                )
+        status = "met" if time_to_first_byte < TIME_TO_FIRST_BYTE_GOAL else "missed"
+        print(f"time to first byte goal of {TIME_TO_FIRST_BYTE_GOAL}s {status}")
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+bench_table_lookup.py
+Measure table lookups by long name on a synthetic index, comparing the hash index
+against a scan over every database and schema.
+
+Usage:
+    python -m benchmarks.bench_table_lookup [--tables N] [--schemas N] [--lookups N]
+"""
+import argparse
+import random
+import time
+
+from chatweb3.metadata_parser import Column, MetadataParser, Table
+
+
+def build_parser(num_tables, num_schemas, num_databases=2):
+    parser = MetadataParser()
+    for i in range(num_tables):
+        table = Table(
+            f"table_{i}",
+            f"schema_{i % num_schemas}",
+            f"database_{i % num_databases}",
+        )
+        table.column_names = ["block_number", f"column_{i}"]
+        table.columns = {
+            name: Column(name, table.name, table.schema_name, table.database_name)
+            for name in table.column_names
+        }
+        parser.add_table(table)
+    return parser
+
+
+def scan_lookup(parser, database_name, schema_name, table_name):
+    """The lookup MetadataParser did before the hash index."""
+    for db_name, database in parser.root_schema_obj.databases.items():
+        if db_name == database_name:
+            for sch_name, schema in database.schemas.items():
+                if sch_name == schema_name and table_name in schema.tables:
+                    return schema.tables[table_name]
+    return None
+
+
+def _time(func, long_names):
+    start_time = time.perf_counter()
+    for long_name in long_names:
+        func(long_name)
+    return (time.perf_counter() - start_time) / len(long_names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tables", type=int, default=10000)
+    parser.add_argument("--schemas", type=int, default=500)
+    parser.add_argument("--lookups", type=int, default=10000)
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    metadata_parser = build_parser(args.tables, args.schemas)
+    print(
+        f"built index of {args.tables} tables in {args.schemas} schemas "
+        f"in {time.perf_counter() - start_time:.3f}s"
+    )
+
+    tables = [
+        table
+        for database in metadata_parser.root_schema_obj.databases.values()
+        for schema in database.schemas.values()
+        for table in schema.tables.values()
+    ]
+    long_names = [random.choice(tables).long_name for _ in range(args.lookups)]
+
+    index_time = _time(metadata_parser.get_table_by_long_name, long_names)
+    scan_time = _time(
+        lambda long_name: scan_lookup(metadata_parser, *long_name.split(".")),
+        long_names,
+    )
+    find_time = _time(
+        lambda long_name: metadata_parser._find_target_tables(
+            *long_name.split(".")[:2], [long_name.split(".")[2]]
+        ),
+        long_names,
+    )
+    column_time = _time(
+        lambda long_name: metadata_parser.get_tables_by_column_name("block_number"),
+        long_names[:100],
+    )
+    print(f"hash index lookup:    {index_time * 1e6:8.2f}us")
+    print(f"_find_target_tables:  {find_time * 1e6:8.2f}us")
+    print(f"database/schema scan: {scan_time * 1e6:8.2f}us")
+    print(f"tables by column name ({args.tables} matches): {column_time * 1e3:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
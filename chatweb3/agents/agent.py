@@ -1,4 +1,7 @@
+import asyncio
+import contextvars
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
 from langchain.agents.agent import (
@@ -26,7 +29,9 @@ from openai import BadRequestError
 # from chatweb3.agents.conversational_chat.output_parser import (
 #    ChatWeb3ChatConvoOutputParser,
 # )
-# from config.config import agent_config
+from chatweb3.snowflake_database import pinned_metadata_parsers
+from chatweb3.tools.executor import run_in_tool_executor
+from config.config import agent_config
 from config.logging_config import get_logger
 
 logger = get_logger(__name__)
@@ -35,6 +40,8 @@ logger = get_logger(__name__)
 # )
 
 # CONVERSATION_MODE = agent_config.get("agent.conversational_chat")
+# the actions of one agent step running at once in the sync path
+AGENT_MAX_PARALLEL_ACTIONS = agent_config.get("agent.max_parallel_actions") or 4
 
 # if CONVERSATION_MODE:
 #     parser = ChatWeb3ChatConvoOutputParser()
@@ -68,7 +75,25 @@ class ChatWeb3AgentExecutor(AgentExecutor):
         inputs: Dict[str, str],
         run_manager: Optional[CallbackManagerForChainRun] = None,
     ) -> Dict[str, Any]:
-        """Run text through and get agent response."""
+        """Run text through and get agent response.
+        The whole run sees one metadata index, even if it is hot-reloaded meanwhile.
+        """
+        step_timings: List[Dict[str, Any]] = []
+        with pinned_metadata_parsers():
+            outputs = self._call_agent_loop(
+                inputs, run_manager=run_manager, step_timings=step_timings
+            )
+        return self._with_step_timings(outputs, step_timings)
+
+    def _call_agent_loop(
+        self,
+        inputs: Dict[str, str],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+        step_timings: Optional[List[Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        """Run text through and get agent response.
+        step_timings: collects the planning and tool wall-clock time of every step
+        """
         # Construct a mapping of tool name to tool for easy lookup
         name_to_tool_map = {tool.name: tool for tool in self.tools}
         # We construct a mapping from each tool to a color, used for logging.
@@ -89,6 +114,7 @@ class ChatWeb3AgentExecutor(AgentExecutor):
                     inputs,
                     intermediate_steps,
                     run_manager=run_manager,
+                    step_timings=step_timings,
                 )
             except BadRequestError as e:
                 if "maximum context length" in str(e):
@@ -152,7 +178,25 @@ class ChatWeb3AgentExecutor(AgentExecutor):
         inputs: Dict[str, str],
         run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
     ) -> Dict[str, str]:
-        """Run text through and get agent response."""
+        """Run text through and get agent response.
+        The whole run sees one metadata index, even if it is hot-reloaded meanwhile.
+        """
+        step_timings: List[Dict[str, Any]] = []
+        with pinned_metadata_parsers():
+            outputs = await self._acall_agent_loop(
+                inputs, run_manager=run_manager, step_timings=step_timings
+            )
+        return self._with_step_timings(outputs, step_timings)
+
+    async def _acall_agent_loop(
+        self,
+        inputs: Dict[str, str],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+        step_timings: Optional[List[Dict[str, Any]]] = None,
+    ) -> Dict[str, str]:
+        """Run text through and get agent response.
+        step_timings: collects the planning and tool wall-clock time of every step
+        """
         # Construct a mapping of tool name to tool for easy lookup
         name_to_tool_map = {tool.name: tool for tool in self.tools}
         # We construct a mapping from each tool to a color, used for logging.
@@ -175,8 +219,9 @@ class ChatWeb3AgentExecutor(AgentExecutor):
                             inputs,
                             intermediate_steps,
                             run_manager=run_manager,
+                            step_timings=step_timings,
                         )
-                    except InvalidRequestError as e:
+                    except BadRequestError as e:
                         if "maximum context length" in str(e):
                             output_str = "Unfortunately, this question requires many thought steps that exceeded the context window length supported by the current AI model. Please try a different question or switch to a model that supports a larger context window."
                         else:
@@ -187,11 +232,17 @@ class ChatWeb3AgentExecutor(AgentExecutor):
                             },
                             log=f"Exception raised: {e}",
                         )
+                        logger.error(
+                            f"agent received {type(e).__name__} exception: {e}, created AgentFinish object"
+                        )
                     except Exception as e:
                         next_step_output = AgentFinish(
                             return_values={"output": str(e)},
                             log=f"Exception raised: {e}",
                         )
+                        logger.error(
+                            f"agent received {type(e).__name__} exception: {e}, created AgentFinish object"
+                        )
 
                     if isinstance(next_step_output, AgentFinish):
                         return await self._areturn(
@@ -212,217 +263,284 @@ class ChatWeb3AgentExecutor(AgentExecutor):
 
                     iterations += 1
                     time_elapsed = time.time() - start_time
-                output = self.agent.return_stopped_response(
-                    self.early_stopping_method, intermediate_steps, **inputs
+                output = await self._areturn_stopped_response(
+                    intermediate_steps, inputs
                 )
                 return await self._areturn(
                     output, intermediate_steps, run_manager=run_manager
                 )
             except TimeoutError:
                 # stop early when interrupted by the async timeout
-                output = self.agent.return_stopped_response(
-                    self.early_stopping_method, intermediate_steps, **inputs
+                output = await self._areturn_stopped_response(
+                    intermediate_steps, inputs
                 )
                 return await self._areturn(
                     output, intermediate_steps, run_manager=run_manager
                 )
 
-    # def _take_next_step(
-    #     self,
-    #     name_to_tool_map: Dict[str, BaseTool],
-    #     color_mapping: Dict[str, str],
-    #     inputs: Dict[str, str],
-    #     intermediate_steps: List[Tuple[AgentAction, str]],
-    #     run_manager: Optional[CallbackManagerForChainRun] = None,
-    # ) -> Union[AgentFinish, List[Tuple[AgentAction, str]]]:
-    #     """Take a single step in the thought-action-observation loop.
-
-    #     Override this to take control of how the agent makes and acts on choices.
-    #     """
-    #     try:
-    #         intermediate_steps = self._prepare_intermediate_steps(intermediate_steps)
-
-    #         # Call the LLM to see what to do.
-    #         output = self.agent.plan(
-    #             intermediate_steps,
-    #             callbacks=run_manager.get_child() if run_manager else None,
-    #             **inputs,
-    #         )
-    #     except OutputParserException as e:
-    #         if isinstance(self.handle_parsing_errors, bool):
-    #             raise_error = not self.handle_parsing_errors
-    #         else:
-    #             raise_error = False
-    #         if raise_error:
-    #             raise e
-    #         text = str(e)
-    #         if isinstance(self.handle_parsing_errors, bool):
-    #             if e.send_to_llm:
-    #                 observation = str(e.observation)
-    #                 text = str(e.llm_output)
-    #             else:
-    #                 observation = "Invalid or incomplete response"
-    #         elif isinstance(self.handle_parsing_errors, str):
-    #             observation = self.handle_parsing_errors
-    #         elif callable(self.handle_parsing_errors):
-    #             observation = self.handle_parsing_errors(e)
-    #         else:
-    #             raise ValueError("Got unexpected type of `handle_parsing_errors`")
-    #         output = AgentAction("_Exception", observation, text)
-    #         if run_manager:
-    #             run_manager.on_agent_action(output, color="green")
-    #         tool_run_kwargs = self.agent.tool_run_logging_kwargs()
-    #         observation = ExceptionTool().run(
-    #             output.tool_input,
-    #             verbose=self.verbose,
-    #             color=None,
-    #             callbacks=run_manager.get_child() if run_manager else None,
-    #             **tool_run_kwargs,
-    #         )
-    #         return [(output, observation)]
-    #     # If the tool chosen is the finishing tool, then we end and return.
-    #     if isinstance(output, AgentFinish):
-    #         return output
-    #     actions: List[AgentAction]
-    #     if isinstance(output, AgentAction):
-    #         actions = [output]
-    #     else:
-    #         actions = output
-    #     result = []
-    #     for agent_action in actions:
-    #         if run_manager:
-    #             run_manager.on_agent_action(agent_action, color="green")
-    #         # Otherwise we lookup the tool
-    #         if agent_action.tool in name_to_tool_map:
-    #             tool = name_to_tool_map[agent_action.tool]
-    #             return_direct = tool.return_direct
-    #             color = color_mapping[agent_action.tool]
-    #             tool_run_kwargs = self.agent.tool_run_logging_kwargs()
-    #             if return_direct:
-    #                 tool_run_kwargs["llm_prefix"] = ""
-    #             # We then call the tool on the tool input to get an observation
-    #             observation = tool.run(
-    #                 agent_action.tool_input,
-    #                 verbose=self.verbose,
-    #                 color=color,
-    #                 callbacks=run_manager.get_child() if run_manager else None,
-    #                 **tool_run_kwargs,
-    #             )
-    #         else:
-    #             tool_run_kwargs = self.agent.tool_run_logging_kwargs()
-    #             observation = InvalidTool().run(
-    #                 {
-    #                     "requested_tool_name": agent_action.tool,
-    #                     "available_tool_names": list(name_to_tool_map.keys()),
-    #                 },
-    #                 verbose=self.verbose,
-    #                 color=None,
-    #                 callbacks=run_manager.get_child() if run_manager else None,
-    #                 **tool_run_kwargs,
-    #             )
-    #         result.append((agent_action, observation))
-    #     return result
-
-    # async def _atake_next_step(
-    #     self,
-    #     name_to_tool_map: Dict[str, BaseTool],
-    #     color_mapping: Dict[str, str],
-    #     inputs: Dict[str, str],
-    #     intermediate_steps: List[Tuple[AgentAction, str]],
-    #     run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
-    # ) -> Union[AgentFinish, List[Tuple[AgentAction, str]]]:
-    #     """Take a single step in the thought-action-observation loop.
-
-    #     Override this to take control of how the agent makes and acts on choices.
-    #     """
-    #     try:
-    #         intermediate_steps = self._prepare_intermediate_steps(intermediate_steps)
-
-    #         # Call the LLM to see what to do.
-    #         output = await self.agent.aplan(
-    #             intermediate_steps,
-    #             callbacks=run_manager.get_child() if run_manager else None,
-    #             **inputs,
-    #         )
-    #     except OutputParserException as e:
-    #         if isinstance(self.handle_parsing_errors, bool):
-    #             raise_error = not self.handle_parsing_errors
-    #         else:
-    #             raise_error = False
-    #         if raise_error:
-    #             raise e
-    #         text = str(e)
-    #         if isinstance(self.handle_parsing_errors, bool):
-    #             if e.send_to_llm:
-    #                 observation = str(e.observation)
-    #                 text = str(e.llm_output)
-    #             else:
-    #                 observation = "Invalid or incomplete response"
-    #         elif isinstance(self.handle_parsing_errors, str):
-    #             observation = self.handle_parsing_errors
-    #         elif callable(self.handle_parsing_errors):
-    #             observation = self.handle_parsing_errors(e)
-    #         else:
-    #             raise ValueError("Got unexpected type of `handle_parsing_errors`")
-    #         output = AgentAction("_Exception", observation, text)
-    #         tool_run_kwargs = self.agent.tool_run_logging_kwargs()
-    #         observation = await ExceptionTool().arun(
-    #             output.tool_input,
-    #             verbose=self.verbose,
-    #             color=None,
-    #             callbacks=run_manager.get_child() if run_manager else None,
-    #             **tool_run_kwargs,
-    #         )
-    #         return [(output, observation)]
-    #     # If the tool chosen is the finishing tool, then we end and return.
-    #     if isinstance(output, AgentFinish):
-    #         return output
-    #     actions: List[AgentAction]
-    #     if isinstance(output, AgentAction):
-    #         actions = [output]
-    #     else:
-    #         actions = output
-
-    #     async def _aperform_agent_action(
-    #         agent_action: AgentAction,
-    #     ) -> Tuple[AgentAction, str]:
-    #         if run_manager:
-    #             await run_manager.on_agent_action(
-    #                 agent_action, verbose=self.verbose, color="green"
-    #             )
-    #         # Otherwise we lookup the tool
-    #         if agent_action.tool in name_to_tool_map:
-    #             tool = name_to_tool_map[agent_action.tool]
-    #             return_direct = tool.return_direct
-    #             color = color_mapping[agent_action.tool]
-    #             tool_run_kwargs = self.agent.tool_run_logging_kwargs()
-    #             if return_direct:
-    #                 tool_run_kwargs["llm_prefix"] = ""
-    #             # We then call the tool on the tool input to get an observation
-    #             observation = await tool.arun(
-    #                 agent_action.tool_input,
-    #                 verbose=self.verbose,
-    #                 color=color,
-    #                 callbacks=run_manager.get_child() if run_manager else None,
-    #                 **tool_run_kwargs,
-    #             )
-    #         else:
-    #             tool_run_kwargs = self.agent.tool_run_logging_kwargs()
-    #             observation = await InvalidTool().arun(
-    #                 {
-    #                     "requested_tool_name": agent_action.tool,
-    #                     "available_tool_names": list(name_to_tool_map.keys()),
-    #                 },
-    #                 verbose=self.verbose,
-    #                 color=None,
-    #                 callbacks=run_manager.get_child() if run_manager else None,
-    #                 **tool_run_kwargs,
-    #             )
-    #         return agent_action, observation
-
-    #     # Use asyncio.gather to run multiple tool.arun() calls concurrently
-    #     result = await asyncio.gather(
-    #         *[_aperform_agent_action(agent_action) for agent_action in actions]
-    #     )
-
-    #     return list(result)
+    async def _areturn_stopped_response(
+        self,
+        intermediate_steps: List[Tuple[AgentAction, str]],
+        inputs: Dict[str, str],
+    ) -> AgentFinish:
+        """Return the response of an agent stopped early, off the event loop.
+        With the "generate" early stopping method, the agent makes a final blocking LLM call.
+        """
+        return await run_in_tool_executor(
+            self.agent.return_stopped_response,
+            self.early_stopping_method,
+            intermediate_steps,
+            **inputs,
+        )
+
+    def _handle_parsing_error(self, e: OutputParserException) -> AgentAction:
+        """Turn an output parsing error into the action of the ExceptionTool, or raise it."""
+        if isinstance(self.handle_parsing_errors, bool):
+            raise_error = not self.handle_parsing_errors
+        else:
+            raise_error = False
+        if raise_error:
+            raise ValueError(
+                "An output parsing error occurred. "
+                "In order to pass this error back to the agent and have it try "
+                "again, pass `handle_parsing_errors=True` to the AgentExecutor. "
+                f"This is the error: {str(e)}"
+            )
+        text = str(e)
+        if isinstance(self.handle_parsing_errors, bool):
+            if e.send_to_llm:
+                observation = str(e.observation)
+                text = str(e.llm_output)
+            else:
+                observation = "Invalid or incomplete response"
+        elif isinstance(self.handle_parsing_errors, str):
+            observation = self.handle_parsing_errors
+        elif callable(self.handle_parsing_errors):
+            observation = self.handle_parsing_errors(e)
+        else:
+            raise ValueError("Got unexpected type of `handle_parsing_errors`")
+        return AgentAction("_Exception", observation, text)
+
+    def _tool_run_args(
+        self,
+        agent_action: AgentAction,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+    ) -> Tuple[BaseTool, Any, Dict[str, Any]]:
+        """Return the tool of an action, its input and its run keyword arguments."""
+        tool_run_kwargs = self.agent.tool_run_logging_kwargs()
+        if agent_action.tool in name_to_tool_map:
+            tool = name_to_tool_map[agent_action.tool]
+            if tool.return_direct:
+                tool_run_kwargs["llm_prefix"] = ""
+            return (
+                tool,
+                agent_action.tool_input,
+                dict(color=color_mapping[agent_action.tool], **tool_run_kwargs),
+            )
+        return (
+            InvalidTool(),
+            {
+                "requested_tool_name": agent_action.tool,
+                "available_tool_names": list(name_to_tool_map.keys()),
+            },
+            dict(color=None, **tool_run_kwargs),
+        )
+
+    def _record_step_timing(
+        self,
+        step_timings: Optional[List[Dict[str, Any]]],
+        actions: List[AgentAction],
+        plan_seconds: float,
+        tools_seconds: float,
+        tool_seconds: List[float],
+    ):
+        step_timing = {
+            "tools": [agent_action.tool for agent_action in actions],
+            "plan_seconds": plan_seconds,
+            # wall-clock time of the actions of the step, run concurrently
+            "tools_seconds": tools_seconds,
+            "tool_seconds": tool_seconds,
+        }
+        logger.info(f"Agent step timing: {step_timing}")
+        if step_timings is not None:
+            step_timings.append(step_timing)
+
+    def _with_step_timings(
+        self, outputs: Dict[str, Any], step_timings: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        if self.return_intermediate_steps:
+            outputs["step_timings"] = step_timings
+        return outputs
+
+    def _take_next_step(  # type: ignore[override]
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        inputs: Dict[str, str],
+        intermediate_steps: List[Tuple[AgentAction, str]],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+        step_timings: Optional[List[Dict[str, Any]]] = None,
+    ) -> Union[AgentFinish, List[Tuple[AgentAction, str]]]:
+        """Take a single step in the thought-action-observation loop.
+        The actions of a step run concurrently in a thread pool, their results keep the order of the actions.
+        """
+        start_time = time.perf_counter()
+        try:
+            intermediate_steps = self._prepare_intermediate_steps(intermediate_steps)
+
+            # Call the LLM to see what to do.
+            output = self.agent.plan(
+                intermediate_steps,
+                callbacks=run_manager.get_child() if run_manager else None,
+                **inputs,
+            )
+        except OutputParserException as e:
+            output = self._handle_parsing_error(e)
+            if run_manager:
+                run_manager.on_agent_action(output, color="green")
+            tool_run_kwargs = self.agent.tool_run_logging_kwargs()
+            observation = ExceptionTool().run(
+                output.tool_input,
+                verbose=self.verbose,
+                color=None,
+                callbacks=run_manager.get_child() if run_manager else None,
+                **tool_run_kwargs,
+            )
+            return [(output, observation)]
+        # If the tool chosen is the finishing tool, then we end and return.
+        if isinstance(output, AgentFinish):
+            return output
+        actions: List[AgentAction]
+        if isinstance(output, AgentAction):
+            actions = [output]
+        else:
+            actions = output
+        plan_seconds = time.perf_counter() - start_time
+
+        def perform_agent_action(agent_action: AgentAction) -> Tuple[str, float]:
+            action_start_time = time.perf_counter()
+            tool, tool_input, tool_run_kwargs = self._tool_run_args(
+                agent_action, name_to_tool_map, color_mapping
+            )
+            # We then call the tool on the tool input to get an observation
+            observation = tool.run(
+                tool_input,
+                verbose=self.verbose,
+                callbacks=run_manager.get_child() if run_manager else None,
+                **tool_run_kwargs,
+            )
+            return observation, time.perf_counter() - action_start_time
+
+        for agent_action in actions:
+            if run_manager:
+                run_manager.on_agent_action(agent_action, color="green")
+        tools_start_time = time.perf_counter()
+        if len(actions) == 1:
+            results = [perform_agent_action(actions[0])]
+        else:
+            with ThreadPoolExecutor(
+                max_workers=min(len(actions), AGENT_MAX_PARALLEL_ACTIONS),
+                thread_name_prefix="chatweb3-agent-step",
+            ) as executor:
+                # each action runs in a copy of the context, so the pinned metadata parsers carry over
+                futures = [
+                    executor.submit(
+                        contextvars.copy_context().run,
+                        perform_agent_action,
+                        agent_action,
+                    )
+                    for agent_action in actions
+                ]
+                results = [future.result() for future in futures]
+        self._record_step_timing(
+            step_timings,
+            actions,
+            plan_seconds,
+            time.perf_counter() - tools_start_time,
+            [seconds for _, seconds in results],
+        )
+        return [
+            (agent_action, observation)
+            for agent_action, (observation, _) in zip(actions, results)
+        ]
+
+    async def _atake_next_step(  # type: ignore[override]
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        inputs: Dict[str, str],
+        intermediate_steps: List[Tuple[AgentAction, str]],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+        step_timings: Optional[List[Dict[str, Any]]] = None,
+    ) -> Union[AgentFinish, List[Tuple[AgentAction, str]]]:
+        """Take a single step in the thought-action-observation loop.
+        The actions of a step are awaited concurrently, their results keep the order of the actions.
+        """
+        start_time = time.perf_counter()
+        try:
+            intermediate_steps = self._prepare_intermediate_steps(intermediate_steps)
+
+            # Call the LLM to see what to do.
+            output = await self.agent.aplan(
+                intermediate_steps,
+                callbacks=run_manager.get_child() if run_manager else None,
+                **inputs,
+            )
+        except OutputParserException as e:
+            output = self._handle_parsing_error(e)
+            tool_run_kwargs = self.agent.tool_run_logging_kwargs()
+            observation = await ExceptionTool().arun(
+                output.tool_input,
+                verbose=self.verbose,
+                color=None,
+                callbacks=run_manager.get_child() if run_manager else None,
+                **tool_run_kwargs,
+            )
+            return [(output, observation)]
+        # If the tool chosen is the finishing tool, then we end and return.
+        if isinstance(output, AgentFinish):
+            return output
+        actions: List[AgentAction]
+        if isinstance(output, AgentAction):
+            actions = [output]
+        else:
+            actions = output
+        plan_seconds = time.perf_counter() - start_time
+
+        async def _aperform_agent_action(
+            agent_action: AgentAction,
+        ) -> Tuple[str, float]:
+            action_start_time = time.perf_counter()
+            if run_manager:
+                await run_manager.on_agent_action(
+                    agent_action, verbose=self.verbose, color="green"
+                )
+            tool, tool_input, tool_run_kwargs = self._tool_run_args(
+                agent_action, name_to_tool_map, color_mapping
+            )
+            # We then call the tool on the tool input to get an observation
+            observation = await tool.arun(
+                tool_input,
+                verbose=self.verbose,
+                callbacks=run_manager.get_child() if run_manager else None,
+                **tool_run_kwargs,
+            )
+            return observation, time.perf_counter() - action_start_time
+
+        # Use asyncio.gather to run multiple tool.arun() calls concurrently
+        tools_start_time = time.perf_counter()
+        results = await asyncio.gather(
+            *[_aperform_agent_action(agent_action) for agent_action in actions]
+        )
+        self._record_step_timing(
+            step_timings,
+            actions,
+            plan_seconds,
+            time.perf_counter() - tools_start_time,
+            [seconds for _, seconds in results],
+        )
+        return [
+            (agent_action, observation)
+            for agent_action, (observation, _) in zip(actions, results)
+        ]
@@ -19,6 +19,7 @@ from chatweb3.tools.snowflake_database.prompt import (
     TOOLKIT_INSTRUCTIONS,
 )
 from chatweb3.tools.snowflake_database.tool import (
+    QUERY_DATABASE_TOOL_PREVIEW_ROWS,
     handle_tool_error,
 )
 from chatweb3.tools.snowflake_database.tool_custom import (
@@ -107,6 +108,8 @@ class CustomSnowflakeDatabaseToolkit(SnowflakeDatabaseToolkit):
             QueryDatabaseTool(  # type: ignore[call-arg]
                 db=self.db,  # type: ignore[arg-type]
                 return_direct=query_database_tool_return_direct,
+                # the agent only needs a preview of large results
+                preview_rows=QUERY_DATABASE_TOOL_PREVIEW_ROWS,
                 # return_direct=agent_config.get(
                 #     "tool.query_database_tool_return_direct"
                 # ),
@@ -17,6 +17,10 @@ logger = get_logger(__name__)
 class LoggerCallbackHandler(BaseCallbackHandler):
     """Callback Handler that prints to std out."""
 
+    # logging is cheap: in the async path, handle the events on the event loop
+    # rather than in a thread of the default executor
+    run_inline = True
+
     def __init__(self, color: Optional[str] = None) -> None:
         """Initialize callback handler."""
         self.color = color
@@ -0,0 +1,167 @@
+"""Callback Handlers that stream the LLM tokens and the agent steps of a run as events"""
+import asyncio
+import contextvars
+import queue
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Set
+from uuid import UUID
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.schema import AgentAction, AgentFinish
+
+from config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+EVENT_TOKEN = "token"
+EVENT_ACTION = "action"
+EVENT_OBSERVATION = "observation"
+EVENT_FINISH = "finish"
+# the last event of a run, carrying the outputs of the agent executor
+EVENT_RESPONSE = "response"
+
+
+def _thought_of(action: AgentAction) -> str:
+    """Return the text the LLM wrote before the action blob."""
+    thought = action.log.split("Action:")[0].strip()
+    if thought.startswith("Thought:"):
+        thought = thought[len("Thought:") :].strip()
+    return thought
+
+
+class StreamingCallbackHandler(BaseCallbackHandler, ABC):
+    """Callback Handler that turns the LLM tokens and the agent steps into events.
+    An event is a dict with a "type" key, one of the EVENT_* types.
+    Only the tokens of the agent's own LLM are streamed: the tokens of the LLMs the tools call, e.g., the query checker, are dropped.
+    """
+
+    # the events are only put on a queue: handle them where they happen, including in the tool threads
+    run_inline = True
+
+    def __init__(self) -> None:
+        # the tool runs and the chain runs nested in them, whose LLM tokens are not streamed
+        self._tool_run_ids: Set[UUID] = set()
+
+    @abstractmethod
+    def put(self, event: Dict[str, Any]) -> None:
+        """Hand an event over to the consumer of the stream."""
+
+    def on_tool_start(
+        self,
+        serialized: Dict[str, Any],
+        input_str: str,
+        *,
+        run_id: UUID,
+        **kwargs: Any,
+    ) -> None:
+        self._tool_run_ids.add(run_id)
+
+    def on_chain_start(
+        self,
+        serialized: Dict[str, Any],
+        inputs: Dict[str, Any],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        if parent_run_id in self._tool_run_ids:
+            self._tool_run_ids.add(run_id)
+
+    def on_llm_new_token(
+        self, token: str, *, parent_run_id: Optional[UUID] = None, **kwargs: Any
+    ) -> None:
+        if parent_run_id in self._tool_run_ids:
+            return
+        self.put({"type": EVENT_TOKEN, "token": token})
+
+    def on_agent_action(self, action: AgentAction, **kwargs: Any) -> Any:
+        self.put(
+            {
+                "type": EVENT_ACTION,
+                "thought": _thought_of(action),
+                "tool": action.tool,
+                "tool_input": action.tool_input,
+            }
+        )
+
+    def on_tool_end(self, output: Any, **kwargs: Any) -> None:
+        self.put({"type": EVENT_OBSERVATION, "observation": output})
+
+    def on_agent_finish(self, finish: AgentFinish, **kwargs: Any) -> None:
+        self.put({"type": EVENT_FINISH, "output": finish.return_values.get("output")})
+
+
+class QueueCallbackHandler(StreamingCallbackHandler):
+    """Puts the events on a thread-safe queue, for a consumer iterating in a thread."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.queue: queue.Queue = queue.Queue()
+
+    def put(self, event: Dict[str, Any]) -> None:
+        self.queue.put(event)
+
+
+class AsyncQueueCallbackHandler(StreamingCallbackHandler):
+    """Puts the events on an asyncio queue of the running event loop, for a consumer iterating in that loop."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def put(self, event: Dict[str, Any]) -> None:
+        # the tools may report their observations from the tool executor threads
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+
+def iter_agent_events(agent, inp: Any) -> Iterator[Dict[str, Any]]:
+    """Run the agent executor in a thread and yield the events of the run as they happen.
+    The last event is an EVENT_RESPONSE event with the outputs of the run; the exception of a failed run is re-raised.
+    """
+    handler = QueueCallbackHandler()
+    outcome: Dict[str, Any] = {}
+
+    def run():
+        try:
+            outcome["response"] = agent(inp, callbacks=[handler])
+        except Exception as e:
+            outcome["error"] = e
+        finally:
+            handler.queue.put(None)
+
+    context = contextvars.copy_context()
+    threading.Thread(
+        target=context.run, args=(run,), name="chatweb3-agent-stream", daemon=True
+    ).start()
+    while True:
+        event = handler.queue.get()
+        if event is None:
+            break
+        yield event
+    if "error" in outcome:
+        raise outcome["error"]
+    yield {"type": EVENT_RESPONSE, "response": outcome["response"]}
+
+
+async def aiter_agent_events(agent, inp: Any) -> AsyncIterator[Dict[str, Any]]:
+    """Run the agent executor with the async path and yield the events of the run as they happen.
+    The last event is an EVENT_RESPONSE event with the outputs of the run; the exception of a failed run is re-raised.
+    Closing the iterator early, e.g., when the client disconnects, cancels the run.
+    """
+    handler = AsyncQueueCallbackHandler()
+    task = asyncio.create_task(agent.acall(inp, callbacks=[handler]))
+    task.add_done_callback(lambda _: handler.put(None))
+    try:
+        while True:
+            event = await handler.queue.get()
+            if event is None:
+                break
+            yield event
+        yield {"type": EVENT_RESPONSE, "response": task.result()}
+    finally:
+        if not task.done():
+            logger.debug("Cancelling the agent run of a closed event stream")
+            task.cancel()
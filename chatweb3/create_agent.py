@@ -4,6 +4,7 @@ This file sets up the agent executor for the chatbot application.
 """
 
 import os
+import threading
 
 from langchain.chat_models import ChatOpenAI
 from langchain.memory import ConversationBufferMemory
@@ -31,6 +32,7 @@ from chatweb3.agents.conversational_chat.prompt import (  # CUSTOM_CONV_SNOWFLAK
     CONV_SNOWFLAKE_SUFFIX_WITH_TOOLKIT_INSTRUCTIONS,
 )
 from chatweb3.callbacks.logger_callback import LoggerCallbackHandler
+from chatweb3.query_cache import create_query_cache
 from chatweb3.snowflake_database import SnowflakeContainer
 from config.config import agent_config
 from config.logging_config import get_logger
@@ -60,7 +62,26 @@ INDEX_ANNOTATION_FILE_PATH = os.path.join(
     PROJ_ROOT_DIR, agent_config.get("metadata.annotation_ethereum_file")
 )
 #    PROJ_ROOT_DIR, agent_config.get("metadata.annotation_ethereum_core_file")
+LOCAL_INDEX_SNAPSHOT_FILE_PATH = (
+    os.path.join(PROJ_ROOT_DIR, agent_config.get("metadata.snapshot_ethereum_file"))
+    if agent_config.get("metadata.snapshot_ethereum_file")
+    else None
+)
+LOCAL_INDEX_SHARD_DIR_PATH = (
+    os.path.join(PROJ_ROOT_DIR, agent_config.get("metadata.shard_dir"))
+    if agent_config.get("metadata.shard_dir")
+    else None
+)
+LOCAL_INDEX_MAX_RESIDENT_SHARDS = agent_config.get("metadata.max_resident_shards") or 0
+LOCAL_INDEX_RELOAD_INTERVAL_SECONDS = (
+    agent_config.get("metadata.reload_interval_seconds") or 0
+)
+LOCAL_INDEX_DROP_RAW_METADATA = bool(agent_config.get("metadata.drop_raw_metadata"))
+QUERY_CACHE_PARAMS = agent_config.get("query_cache")
+SNOWFLAKE_POOL_PARAMS = agent_config.get("snowflake_pool")
+SNOWFLAKE_LAZY_REFLECTION = bool(agent_config.get("database.lazy_reflection"))
 QUERY_DATABASE_TOOL_TOP_K = agent_config.get("tool.query_database_tool_top_k")
+LLM_STREAMING = bool(agent_config.get("model.streaming"))
 # AGENT_EXECUTOR_RETURN_INTERMEDIDATE_STEPS = agent_config.get(
 #    "agent_chain.agent_executor_return_intermediate_steps"
 # )
@@ -71,7 +92,37 @@ agent_executor_kwargs = {
 }  # noqa: E501
 
 
-def get_snowflake_container():
+# the metadata index, query cache and engines are shared by every agent executor of the process
+_shared_snowflake_container = None
+_shared_snowflake_container_lock = threading.Lock()
+
+
+def get_query_cache():
+    """Create the query result cache from the query_cache config section, None if it is disabled."""
+    if not QUERY_CACHE_PARAMS or not QUERY_CACHE_PARAMS.get("enabled"):
+        return None
+    params = {
+        key: value for key, value in QUERY_CACHE_PARAMS.items() if key != "enabled"
+    }
+    if params.get("sqlite_path"):
+        params["sqlite_path"] = os.path.join(PROJ_ROOT_DIR, params["sqlite_path"])
+    return create_query_cache(**params)
+
+
+def get_snowflake_container(shared: bool = True):
+    """Return the SnowflakeContainer of the process, creating it on first use.
+    shared: set to False to always create a new container, which still shares the engines of the process
+    """
+    global _shared_snowflake_container
+    if not shared:
+        return _create_snowflake_container()
+    with _shared_snowflake_container_lock:
+        if _shared_snowflake_container is None:
+            _shared_snowflake_container = _create_snowflake_container()
+        return _shared_snowflake_container
+
+
+def _create_snowflake_container():
     container = SnowflakeContainer(
         **agent_config.get("flipside_params")
         if agent_config.get("flipside_params")
@@ -84,8 +135,17 @@ def get_snowflake_container():
         else {},
         local_index_file_path=LOCAL_INDEX_FILE_PATH,
         index_annotation_file_path=INDEX_ANNOTATION_FILE_PATH,
+        local_index_snapshot_file_path=LOCAL_INDEX_SNAPSHOT_FILE_PATH,
+        local_index_drop_raw_metadata=LOCAL_INDEX_DROP_RAW_METADATA,
+        local_index_shard_dir_path=LOCAL_INDEX_SHARD_DIR_PATH,
+        local_index_max_resident_shards=LOCAL_INDEX_MAX_RESIDENT_SHARDS,
+        query_cache=get_query_cache(),
+        engine_pool_kwargs=SNOWFLAKE_POOL_PARAMS,
+        lazy_reflection=SNOWFLAKE_LAZY_REFLECTION,
         verbose=False,
     )
+    if LOCAL_INDEX_RELOAD_INTERVAL_SECONDS > 0:
+        container.start_metadata_reloader(LOCAL_INDEX_RELOAD_INTERVAL_SECONDS)
     return container
 
 
@@ -104,6 +164,7 @@ def create_agent_executor(conversation_mode=False):
         temperature=0,
         callbacks=callbacks,
         max_tokens=256,
+        streaming=LLM_STREAMING,
         verbose=True,
     )
 
@@ -0,0 +1,150 @@
+"""
+engine_registry.py
+This file contains the process-wide registry of SQLAlchemy engines.
+Engines are created once per database URL with explicit pool settings and shared by every SnowflakeContainer
+and every per-schema SnowflakeDatabase view of the process, so that they all draw from one bounded connection pool.
+The pools record their checkouts and how long callers waited for a connection.
+"""
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.pool import QueuePool
+
+from config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class PoolMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        # checkouts that found no idle connection and no room to open a new one
+        self.waits = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record(self, wait_seconds: float, waited: bool, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            if waited:
+                self.waits += 1
+                self.total_wait_seconds += wait_seconds
+                self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "checkouts": self.checkouts,
+            "waits": self.waits,
+            "timeouts": self.timeouts,
+            "total_wait_seconds": self.total_wait_seconds,
+            "max_wait_seconds": self.max_wait_seconds,
+        }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool recording its checkouts and connection waits in a PoolMetrics."""
+
+    metrics: Optional[PoolMetrics] = None
+
+    def _do_get(self):
+        # the pool is exhausted when no connection is idle and the overflow is used up
+        waited = self.checkedin() == 0 and -1 < self._max_overflow <= self.overflow()
+        start_time = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            if self.metrics is not None:
+                self.metrics.record(
+                    time.perf_counter() - start_time, waited, timed_out=True
+                )
+            raise
+        if self.metrics is not None:
+            self.metrics.record(time.perf_counter() - start_time, waited)
+        return connection
+
+    def recreate(self):
+        # keep the metrics across pool re-creation, e.g., after the connections are invalidated
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class EngineRegistry:
+    def __init__(self):
+        self._engines: Dict[str, Engine] = {}
+        self._lock = threading.Lock()
+
+    def get_engine(
+        self,
+        url: str,
+        connect_args: Optional[Dict[str, Any]] = None,
+        pool_size: int = 5,
+        max_overflow: int = 10,
+        pool_timeout: float = 30,
+        pool_recycle: int = 3600,
+        pool_pre_ping: bool = True,
+    ) -> Engine:
+        """Return the engine of the URL, creating it with the pool settings on first use.
+        The pool settings of later calls for the same URL are ignored.
+        """
+        with self._lock:
+            engine = self._engines.get(url)
+            if engine is None:
+                engine = create_engine(
+                    url,
+                    connect_args=connect_args or {},
+                    poolclass=InstrumentedQueuePool,
+                    pool_size=pool_size,
+                    max_overflow=max_overflow,
+                    pool_timeout=pool_timeout,
+                    pool_recycle=pool_recycle,
+                    pool_pre_ping=pool_pre_ping,
+                )
+                engine.pool.metrics = PoolMetrics()
+                self._engines[url] = engine
+                logger.debug(
+                    f"Created engine for {self._display_url(url)} with {pool_size=}, {max_overflow=}"
+                )
+            return engine
+
+    @staticmethod
+    def _display_url(url: str) -> str:
+        url_obj: URL = make_url(url)
+        return url_obj.render_as_string(hide_password=True)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return the pool status and metrics of every engine, keyed on the URL without the password."""
+        with self._lock:
+            engines = dict(self._engines)
+        stats = {}
+        for url, engine in engines.items():
+            pool = engine.pool
+            pool_stats = {
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+            }
+            metrics = getattr(pool, "metrics", None)
+            if metrics is not None:
+                pool_stats.update(metrics.stats())
+            stats[self._display_url(url)] = pool_stats
+        return stats
+
+    def dispose_all(self):
+        with self._lock:
+            for engine in self._engines.values():
+                engine.dispose()
+            self._engines.clear()
+
+
+# the registry shared by the whole process
+engine_registry = EngineRegistry()
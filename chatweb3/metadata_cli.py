@@ -0,0 +1,181 @@
+"""
+metadata_cli.py
+This file contains the command line interface for building metadata index artifacts.
+
+Usage:
+    python -m chatweb3.metadata_cli snapshot [--context FILE] [--annotation FILE] [--output FILE] [--force]
+    python -m chatweb3.metadata_cli shards --output DIR [--context FILE] [--by {database,schema}]
+    python -m chatweb3.metadata_cli jsonl --output FILE [--context FILE]
+    python -m chatweb3.metadata_cli refresh [--context FILE] [--output FILE] [--dry-run]
+"""
+import argparse
+import os
+import time
+
+from chatweb3.metadata_parser import MetadataParser
+from chatweb3.metadata_shards import write_shards
+from config.config import agent_config
+
+PROJ_ROOT_DIR = agent_config.get("proj_root_dir")
+
+
+def _config_path(key):
+    value = agent_config.get(key)
+    return os.path.join(PROJ_ROOT_DIR, value) if value else None
+
+
+def build_snapshot(args):
+    parser = MetadataParser(
+        file_path=args.context, annotation_file_path=args.annotation
+    )
+    if not args.force and parser.is_snapshot_fresh(args.output):
+        print(f"Snapshot {args.output} is up to date.")
+        return
+
+    start_time = time.perf_counter()
+    parser.save_snapshot(args.output)
+    print(
+        f"Wrote snapshot {args.output} "
+        f"({os.path.getsize(args.output)} bytes) in {time.perf_counter() - start_time:.3f}s"
+    )
+
+
+def build_shards(args):
+    parser = MetadataParser()
+    manifest = write_shards(
+        parser.load_metadata_from_json(args.context), args.output, by=args.by
+    )
+    print(
+        f"Wrote {len(manifest['shards'])} shards "
+        f"({sum(shard['tables'] for shard in manifest['shards'])} tables) to {args.output}"
+    )
+
+
+def build_jsonl(args):
+    parser = MetadataParser(file_path=args.context)
+    parser.save_metadata_to_jsonl(args.output)
+    print(f"Wrote {args.output} ({os.path.getsize(args.output)} bytes)")
+
+
+def refresh_metadata(args):
+    # delay import, the Snowflake container is only needed for the refresh
+    from chatweb3.create_agent import get_snowflake_container
+    from chatweb3.metadata_refresher import MetadataRefresher, snowflake_run_query
+
+    parser = MetadataParser(file_path=args.context)
+    refresher = MetadataRefresher(
+        parser, snowflake_run_query(get_snowflake_container())
+    )
+    start_time = time.perf_counter()
+    result = refresher.refresh(dry_run=args.dry_run)
+    print(
+        f"{'Would refresh' if args.dry_run else 'Refreshed'} {len(result['refreshed'])} tables "
+        f"in {time.perf_counter() - start_time:.1f}s: {', '.join(result['refreshed'])}"
+    )
+    if result["failed"]:
+        print(f"Failed: {', '.join(result['failed'])}")
+    if result["missing"]:
+        print(f"Not found in Snowflake: {', '.join(result['missing'])}")
+    if args.dry_run:
+        return
+
+    output = args.output or args.context
+    if output.endswith(".jsonl"):
+        parser.save_metadata_to_jsonl(output)
+    else:
+        parser.save_metadata_to_json(output)
+    print(f"Wrote {output}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build ChatWeb3 metadata artifacts")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    snapshot_parser = subparsers.add_parser(
+        "snapshot", help="Build the compiled snapshot of the metadata index"
+    )
+    snapshot_parser.add_argument(
+        "--context",
+        default=_config_path("metadata.context_ethereum_file"),
+        help="Metadata context JSON file (default: from config.yaml)",
+    )
+    snapshot_parser.add_argument(
+        "--annotation",
+        default=_config_path("metadata.annotation_ethereum_file"),
+        help="Annotation JSON file (default: from config.yaml)",
+    )
+    snapshot_parser.add_argument(
+        "--output",
+        default=_config_path("metadata.snapshot_ethereum_file"),
+        help="Output snapshot file (default: from config.yaml)",
+    )
+    snapshot_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rebuild the snapshot even if it is up to date",
+    )
+    snapshot_parser.set_defaults(func=build_snapshot)
+
+    shards_parser = subparsers.add_parser(
+        "shards", help="Split the metadata index into per-database/per-schema shards"
+    )
+    shards_parser.add_argument(
+        "--context",
+        default=_config_path("metadata.context_ethereum_file"),
+        help="Metadata context JSON file (default: from config.yaml)",
+    )
+    shards_parser.add_argument(
+        "--output",
+        default=_config_path("metadata.shard_dir"),
+        required=not agent_config.get("metadata.shard_dir"),
+        help="Output shard directory (default: from config.yaml)",
+    )
+    shards_parser.add_argument(
+        "--by",
+        choices=["database", "schema"],
+        default="schema",
+        help="Shard granularity (default: schema)",
+    )
+    shards_parser.set_defaults(func=build_shards)
+
+    jsonl_parser = subparsers.add_parser(
+        "jsonl",
+        help="Convert the metadata index into the JSON-lines layout with one table per line",
+    )
+    jsonl_parser.add_argument(
+        "--context",
+        default=_config_path("metadata.context_ethereum_file"),
+        help="Metadata context JSON file (default: from config.yaml)",
+    )
+    jsonl_parser.add_argument(
+        "--output", required=True, help="Output JSON-lines file (.jsonl)"
+    )
+    jsonl_parser.set_defaults(func=build_jsonl)
+
+    refresh_parser = subparsers.add_parser(
+        "refresh",
+        help="Re-fetch the tables whose LAST_ALTERED changed in Snowflake and update the metadata index",
+    )
+    refresh_parser.add_argument(
+        "--context",
+        default=_config_path("metadata.context_ethereum_file"),
+        help="Metadata context file to refresh (default: from config.yaml)",
+    )
+    refresh_parser.add_argument(
+        "--output",
+        default=None,
+        help="Output file (default: overwrite the context file)",
+    )
+    refresh_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only list the tables that changed",
+    )
+    refresh_parser.set_defaults(func=refresh_metadata)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
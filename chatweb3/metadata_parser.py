@@ -1,10 +1,16 @@
 # %%
+import hashlib
 import json
 import logging
+import os
+import pickle
 import re
+import sys
 from collections import defaultdict
-from typing import Dict, List, Optional
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Tuple
 
+from chatweb3.metadata_shards import MetadataShards
 from chatweb3.utils import parse_table_long_name, parse_table_long_name_to_json_list
 from config.logging_config import get_logger
 
@@ -13,6 +19,125 @@ from config.logging_config import get_logger
 # )
 logger = get_logger(__name__)
 
+# Bump this whenever the object model or the derivation of Column/Table fields
+# changes, so that snapshots built by an older version are rebuilt.
+SNAPSHOT_FORMAT_VERSION = 5
+
+TABLE_COMMENT_PATTERN = re.compile(
+    r"COMMENT='{1,3}(.*?)'{1,3}(?:[\s\\n]*as[\s\\n]*\((?:.|[\r\n])*?SELECT|[\s\\n]*;)",
+    re.IGNORECASE,
+)
+
+
+def compute_metadata_checksum(
+    file_path: str, annotation_file_path: Optional[str] = None
+) -> str:
+    """Return a checksum tied to the snapshot format and the contents of the metadata and annotation files"""
+    sha256 = hashlib.sha256(f"snapshot-v{SNAPSHOT_FORMAT_VERSION}".encode())
+    for path in (file_path, annotation_file_path):
+        sha256.update(b"\0")
+        if path is not None and os.path.exists(path):
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+# Tokens of a DDL statement: single quoted strings, double quoted identifiers, parentheses and commas.
+# Quotes inside strings are either escaped (\' or '') or, in statements compiled by SQLAlchemy,
+# left unescaped as apostrophes between two word characters, e.g., 'a given block's gas limit'.
+# A doubled quote right before a comma or parenthesis ends the string and the stray quote is
+# dropped ('... by Jan. 10 2024.'', _LOG_ID ...)
+QUOTED_STRING_BODY = r"(?:[^'\\]|\\.|''(?!\s*[,)])|(?<=\w)'(?=\w))*"
+STRAY_QUOTE = r"(?:'(?=\s*[,)]))?"
+DDL_TOKEN_PATTERN = re.compile(
+    rf"'{QUOTED_STRING_BODY}'{STRAY_QUOTE}|\"[^\"]*\"|[(),]", re.DOTALL
+)
+COLUMN_COMMENT_PATTERN = re.compile(
+    rf"(?:^|\s)COMMENT\s+'({QUOTED_STRING_BODY})'", re.IGNORECASE | re.DOTALL
+)
+COMMENT_ESCAPE_PATTERN = re.compile(r"\\(['\\])|''")
+
+
+def _split_column_definitions(ddl: str) -> List[str]:
+    """Split the column list of a CREATE TABLE/VIEW statement into one string per column definition.
+    The statement is scanned once; commas inside parentheses, quoted strings and quoted identifiers are not treated as separators.
+    Parenthesized clauses before the column list, e.g., `cluster by (block_timestamp::DATE)`, are skipped.
+    """
+    definitions: List[str] = []
+    depth = 0
+    start = 0
+    skip_group = False
+    for token in DDL_TOKEN_PATTERN.finditer(ddl):
+        char = token.group()
+        if char == "(":
+            depth += 1
+            if depth == 1:
+                start = token.end()
+                skip_group = ddl[: token.start()].rstrip()[-2:].lower() == "by"
+        elif char == ")":
+            depth -= 1
+            if depth == 0:
+                if skip_group:
+                    continue
+                definitions.append(ddl[start : token.start()])
+                break
+        elif char == "," and depth == 1 and not skip_group:
+            definitions.append(ddl[start : token.start()])
+            start = token.end()
+    return definitions
+
+
+def _parse_column_definition(
+    definition: str,
+) -> Optional[Tuple[str, Optional[str], Optional[str]]]:
+    """Parse a single column definition into (name, data_type, comment)."""
+    definition = definition.strip()
+    if not definition:
+        return None
+
+    if definition[0] == '"':
+        end = definition.find('"', 1)
+        end = len(definition) if end == -1 else end
+        name = definition[1:end]
+        rest = definition[end + 1 :]
+    else:
+        parts = definition.split(None, 1)
+        name = parts[0]
+        rest = parts[1] if len(parts) > 1 else ""
+    # names are sometimes qualified, e.g., ETHEREUM.CORE.DIM_CONTRACTS_ID
+    name = name.rsplit(".", 1)[-1].strip('"').lower()
+
+    comment = None
+    match = COLUMN_COMMENT_PATTERN.search(rest)
+    if match:
+        comment = COMMENT_ESCAPE_PATTERN.sub(
+            lambda m: m.group(1) or "'", match.group(1)
+        )
+        rest = rest[: match.start()]
+
+    data_type = " ".join(rest.split()) or None
+    return name, data_type, comment
+
+
+def parse_column_definitions(
+    ddl: str,
+) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    """Parse a CREATE TABLE statement or a GET_DDL output in a single pass.
+    Returns a dictionary mapping lower case column names to (data_type, comment) tuples.
+
+    Example:
+        parse_column_definitions("CREATE TABLE T (A NUMBER(38,0) COMMENT 'a, b', B VARCHAR)")
+        returns {"a": ("NUMBER(38,0)", "a, b"), "b": ("VARCHAR", None)}
+    """
+    columns: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+    for definition in _split_column_definitions(ddl):
+        parsed = _parse_column_definition(definition)
+        if parsed is not None:
+            name, data_type, comment = parsed
+            columns.setdefault(name, (data_type, comment))
+    return columns
+
 
 def nested_dict_to_dict(d):
     return {
@@ -45,7 +170,55 @@ def nested_dict():
     return defaultdict(nested_dict)
 
 
+def intern_name(name: Optional[str]) -> Optional[str]:
+    """Lower case and intern a database/schema/table/column name, so that the many objects referring to the same name share one string."""
+    return sys.intern(name.lower()) if name else None
+
+
+# raw fields of a Table that are only needed to derive the comments, data types and sample values of its columns
+RAW_TABLE_FIELDS = (
+    "create_table_stmt",
+    "sample_row_column_names",
+    "sample_rows",
+    "get_ddl_create_table",
+    "information_schema_columns_names",
+    "information_schema_columns_values",
+)
+
+
+class NestedTableAttribute:
+    """Compatibility accessor exposing a Table attribute as the database -> schema -> table nested dictionary that MetadataParser used to keep.
+    The nested dictionary is built from root_schema_obj on access instead of holding a second copy of the metadata.
+    """
+
+    def __init__(self, table_attribute: str):
+        self.table_attribute = table_attribute
+
+    def __get__(self, parser, owner=None):
+        if parser is None:
+            return self
+        nested = nested_dict()
+        for database_name, database in parser.root_schema_obj.databases.items():
+            for schema_name, schema in database.schemas.items():
+                for table_name, table in schema.tables.items():
+                    nested[database_name][schema_name][table_name] = (
+                        getattr(table, self.table_attribute) or None
+                    )
+        return nested
+
+
 class Column:
+    __slots__ = (
+        "name",
+        "table_name",
+        "schema_name",
+        "database_name",
+        "data_type",
+        "comment",
+        "sample_values_list",
+        "_verbose",
+    )
+
     def __init__(
         self,
         name,
@@ -56,10 +229,10 @@ class Column:
         comment=None,
         verbose=False,
     ):
-        self.name = name.lower()
-        self.table_name = table_name.lower() if table_name else None
-        self.schema_name = schema_name.lower() if schema_name else None
-        self.database_name = database_name.lower() if database_name else None
+        self.name = intern_name(name)
+        self.table_name = intern_name(table_name)
+        self.schema_name = intern_name(schema_name)
+        self.database_name = intern_name(database_name)
         self.data_type = data_type
         self.comment = comment
         self.sample_values_list = []
@@ -89,48 +262,6 @@ class Column:
     def verbose(self, value):
         self._verbose = value
 
-    def _parse_data_type_from_create_table_stmt(self, create_table_stmt):
-        pattern = rf"{self.name}\s+(?P<data_type>.+?(\([^\)]+\))?(?=\s*(,|\n\s*\))))"
-
-        match = re.search(pattern, create_table_stmt, re.IGNORECASE)
-
-        if match:
-            data_type = match.group("data_type")
-        else:
-            if self.verbose:
-                logger.warning(
-                    f"{self.database_name}.{self.schema_name}.{self.table_name}: {self.name} data type not parsed from create table statement."
-                )
-            data_type = None
-        return data_type
-
-    def _parse_comment_from_ddl(self, get_ddl_create_table):
-        pattern = rf"{self.name}\s+([\w\(\),]*)?\s*COMMENT\s+'(?P<comment>.*?)'"
-        match = re.search(pattern, get_ddl_create_table, re.IGNORECASE | re.DOTALL)
-
-        if match:
-            comment = match.group("comment")
-        else:
-            if self.verbose:
-                logger.warning(
-                    f"{self.database_name}.{self.schema_name}.{self.table_name}: {self.name} comment not parsed from get_ddl_create_table."
-                )
-            comment = None
-        return comment
-
-    def _parse_value_from_sample_rows(self, sample_row_column_names, sample_rows):
-        if self.name in sample_row_column_names:
-            index = sample_row_column_names.index(self.name)
-            values = [row[index] for row in sample_rows]
-            sample_values_list = list(values)
-        else:
-            if self.verbose:
-                logger.warning(
-                    f"{self.database_name}.{self.schema_name}.{self.table_name}: {self.name} value not parsed from sample rows."
-                )
-            sample_values_list = None
-        return sample_values_list
-
     def to_dict(self):
         return {
             "name": self.name,
@@ -154,10 +285,32 @@ class Column:
 
 
 class Table:
+    __slots__ = (
+        "name",
+        "schema_name",
+        "database_name",
+        "long_name",
+        "comment",
+        "_summary",
+        "column_names",
+        "columns",
+        "create_table_stmt",
+        "select_sample_rows_stmt",
+        "sample_row_column_names",
+        "sample_rows",
+        "select_get_ddl_table_stmt",
+        "get_ddl_create_table",
+        "select_information_schema_columns_stmt",
+        "information_schema_columns_names",
+        "information_schema_columns_values",
+        "last_altered",
+        "_verbose",
+    )
+
     def __init__(self, table_name, schema_name, database_name, verbose=False):
-        self.name = table_name.lower()
-        self.schema_name = schema_name.lower()
-        self.database_name = database_name.lower()
+        self.name = intern_name(table_name)
+        self.schema_name = intern_name(schema_name)
+        self.database_name = intern_name(database_name)
         self.long_name = f"{database_name}.{schema_name}.{table_name}".lower()
         self.comment = ""
         self.summary = ""
@@ -172,6 +325,8 @@ class Table:
         self.select_information_schema_columns_stmt = None
         self.information_schema_columns_names = None
         self.information_schema_columns_values = None
+        # LAST_ALTERED of the table in INFORMATION_SCHEMA.TABLES when its metadata was fetched
+        self.last_altered = None
         self.verbose = verbose
 
     def __repr__(self) -> str:
@@ -228,11 +383,7 @@ class Table:
             column.verbose = verbose
 
     def _parse_comment_from_ddl(self, get_ddl_create_table):
-        comment_pattern = re.compile(
-            r"COMMENT='{1,3}(.*?)'{1,3}(?:[\s\\n]*as[\s\\n]*\((?:.|[\r\n])*?SELECT|[\s\\n]*;)",
-            re.IGNORECASE,
-        )
-        match = comment_pattern.search(get_ddl_create_table)
+        match = TABLE_COMMENT_PATTERN.search(get_ddl_create_table)
         if match:
             comment = match.group(1).strip().replace("\\n", "\n")
         else:
@@ -243,6 +394,74 @@ class Table:
             comment = ""
         return comment
 
+    def _populate_column_data_types(self):
+        """Populate the data type of each column from the create table statement, parsed once for the whole table."""
+        definitions = (
+            parse_column_definitions(self.create_table_stmt)
+            if self.create_table_stmt
+            else None
+        )
+        for column in self.columns.values():
+            if definitions is None:
+                column.data_type = None
+                continue
+            data_type = definitions.get(column.name, (None, None))[0]
+            if data_type is None and self.verbose:
+                logger.warning(
+                    f"{self.long_name}: {column.name} data type not parsed from create table statement."
+                )
+            column.data_type = data_type
+
+    def _populate_column_comments(self):
+        """Populate the comment of each column from the GET_DDL output, parsed once for the whole table."""
+        definitions = (
+            parse_column_definitions(self.get_ddl_create_table)
+            if self.get_ddl_create_table
+            else None
+        )
+        for column in self.columns.values():
+            if definitions is None:
+                column.comment = None
+                continue
+            comment = definitions.get(column.name, (None, None))[1]
+            if comment is None and self.verbose:
+                logger.warning(
+                    f"{self.long_name}: {column.name} comment not parsed from get_ddl_create_table."
+                )
+            column.comment = comment
+
+    def _transpose_sample_rows(self) -> Dict[str, Tuple]:
+        """Transpose the sample rows once into a dictionary mapping lower case column names to tuples of sample values."""
+        if not self.sample_rows or not self.sample_row_column_names:
+            return {}
+        return dict(
+            zip(
+                (name.lower() for name in self.sample_row_column_names),
+                zip(*self.sample_rows),
+            )
+        )
+
+    def _populate_column_sample_values(self):
+        """Populate the sample values of each column from a single transposition of the sample rows."""
+        if not self.sample_rows:
+            for column in self.columns.values():
+                column.sample_values_list = None
+            return
+
+        sample_values = self._transpose_sample_rows()
+        for column in self.columns.values():
+            values = sample_values.get(column.name)
+            if values is None and self.verbose:
+                logger.warning(
+                    f"{self.long_name}: {column.name} value not parsed from sample rows."
+                )
+            column.sample_values_list = values
+
+    def drop_raw_fields(self):
+        """Release the raw fields listed in RAW_TABLE_FIELDS."""
+        for field in RAW_TABLE_FIELDS:
+            setattr(self, field, None)
+
     def _create_columns(self):
         """Create Column objects for each column in the table if they do not already exist."""
         for column_name in self.column_names:
@@ -314,7 +533,7 @@ class Table:
 
                     formatted_values = [
                         ", ".join(str(self._format_value(v)) for v in value)
-                        if isinstance(value, list)
+                        if isinstance(value, (list, tuple))
                         else self._format_value(value)
                         for value in column_values
                     ]
@@ -348,6 +567,7 @@ class Table:
                 "select_information_schema_columns_stmt": self.select_information_schema_columns_stmt,
                 "information_schema_columns_names": self.information_schema_columns_names,
                 "information_schema_columns_values": self.information_schema_columns_values,
+                "last_altered": self.last_altered,
             }.items()
             if value
         }
@@ -361,9 +581,9 @@ class Table:
         table.long_name = data.get("long_name").lower()
         table.comment = data.get("comment")
         table.summary = data.get("summary")
-        table.column_names = [x.lower() for x in data.get("column_names")]
+        table.column_names = [intern_name(x) for x in data.get("column_names")]
         table.columns = {
-            name.lower(): Column.from_dict(col_data)
+            intern_name(name): Column.from_dict(col_data)
             for name, col_data in data.get("columns", {}).items()
         }
         table.create_table_stmt = data.get("create_table_stmt")
@@ -381,14 +601,17 @@ class Table:
         table.information_schema_columns_values = data.get(
             "information_schema_columns_values"
         )
+        table.last_altered = data.get("last_altered")
         # adjust for columns
         return table
 
 
 class Schema:
+    __slots__ = ("name", "database_name", "long_name", "tables", "_verbose")
+
     def __init__(self, schema_name, database_name, verbose=False):
         self.name = schema_name
-        self.database_name = database_name.lower()
+        self.database_name = intern_name(database_name)
         self.long_name = f"{database_name}.{schema_name}".lower()
         self.tables = {}
         self.verbose = verbose
@@ -428,13 +651,15 @@ class Schema:
     def from_dict(cls, data):
         schema = cls(data["name"], data["database_name"])
         schema.tables = {
-            name.lower(): Table.from_dict(table_data)
+            intern_name(name): Table.from_dict(table_data)
             for name, table_data in data["tables"].items()
         }
         return schema
 
 
 class Database:
+    __slots__ = ("name", "schemas", "_verbose")
+
     def __init__(self, database_name, verbose=False):
         self.name = database_name
         self.schemas = {}
@@ -472,13 +697,15 @@ class Database:
         database = cls(data.get("name"))
         # ["name"])
         database.schemas = {
-            name.lower(): Schema.from_dict(schema_data)
+            intern_name(name): Schema.from_dict(schema_data)
             for name, schema_data in data["schemas"].items()
         }
         return database
 
 
 class RootSchema:
+    __slots__ = ("databases", "_verbose")
+
     def __init__(self):
         self.databases = {}  # dictionary of databases
         self.verbose = False
@@ -513,33 +740,89 @@ class RootSchema:
     def from_dict(cls, data):
         root_schema = cls()
         root_schema.databases = {
-            name.lower(): Database.from_dict(cat_data)
+            intern_name(name): Database.from_dict(cat_data)
             for name, cat_data in data["databases"].items()
         }
         return root_schema
 
 
 class MetadataParser:
+    # Compatibility accessors for the nested dictionaries (database -> schema -> table -> value) that used to be kept next to root_schema_obj
+    create_table_stmt = NestedTableAttribute("create_table_stmt")
+    select_sample_rows_stmt = NestedTableAttribute("select_sample_rows_stmt")
+    table_sample_rows = NestedTableAttribute("sample_rows")
+    table_sample_row_column_names = NestedTableAttribute("sample_row_column_names")
+    select_get_ddl_table_stmt = NestedTableAttribute("select_get_ddl_table_stmt")
+    get_ddl_create_table = NestedTableAttribute("get_ddl_create_table")
+    select_information_schema_columns_stmt = NestedTableAttribute(
+        "select_information_schema_columns_stmt"
+    )
+    information_schema_columns_names = NestedTableAttribute(
+        "information_schema_columns_names"
+    )
+    information_schema_columns_values = NestedTableAttribute(
+        "information_schema_columns_values"
+    )
+
     def __init__(
         self,
         file_path: Optional[str] = None,
         annotation_file_path: Optional[str] = None,
         verbose: bool = False,
+        snapshot_file_path: Optional[str] = None,
+        drop_raw_metadata: bool = False,
+        shard_dir_path: Optional[str] = None,
+        max_resident_shards: int = 0,
     ):
         """
         Note: the verbose flag is only effective when the file_path is provided. Otherwise, we have to manually set it after the contents of the root_schema_obj is set.
         The verbose flag is useful when we want to print out the processing warning messages, e.g., parsing issues for comments and other fields of metadata.
+        If a snapshot_file_path is provided, the fully-derived index is loaded from the snapshot when it is up to date with file_path and annotation_file_path, otherwise the index is built from the JSON files and the snapshot is (re)written.
+        If drop_raw_metadata is True, the raw DDL statements, sample rows and information_schema values are released once the index is built, see drop_raw_metadata().
+        If a shard_dir_path is provided instead of a file_path, the index is read from a directory of shards (see chatweb3/metadata_shards.py).
+        A shard is loaded when a lookup first touches one of its databases/schemas, and at most max_resident_shards (0 means unbounded) stay loaded.
         """
         self.file_path = file_path
+        self.annotation_file_path = annotation_file_path
         self._verbose = verbose
+        # rendered metadata blocks keyed on (table long name, include flags, column_info_format)
+        self._rendered_metadata_cache: Dict[Tuple, str] = {}
+        self.metadata_cache_hits = 0
+        self.metadata_cache_misses = 0
+        # lookup indexes over root_schema_obj, built on the first lookup
+        self._tables_by_long_name: Optional[Dict[str, Table]] = None
+        self._tables_by_schema: Dict[Tuple[str, str], Dict[str, Table]] = {}
+        self._tables_by_column_name: Dict[str, Dict[str, Table]] = {}
+        self._drop_raw_metadata = drop_raw_metadata
+        self._shards: Optional[MetadataShards] = None
+
+        if shard_dir_path is not None:
+            if file_path is not None:
+                raise ValueError(
+                    "Provide either file_path or shard_dir_path, not both."
+                )
+            self._shards = MetadataShards(shard_dir_path, max_resident_shards)
+            self.root_schema_obj = RootSchema()
+            if annotation_file_path is not None:
+                self.add_table_summary(file_path_json=annotation_file_path)
+            return
 
-        self._initialize_nested_dicts()
+        if file_path is not None and snapshot_file_path is not None:
+            loaded = self.load_snapshot(snapshot_file_path)
+        else:
+            loaded = False
 
-        if file_path is not None:
-            # If a file_path is provided, load metadata from the file
-            data = self.load_metadata_from_json()
-            # then deserialize the metadata into the RootSchema object
-            self.from_dict(data, verbose=verbose)
+        if file_path is not None and not loaded:
+            if file_path.endswith(".jsonl"):
+                # If a JSON-lines file_path is provided, build the index one table at a time
+                self.load_metadata_from_jsonl(
+                    verbose=verbose, drop_raw_metadata=drop_raw_metadata
+                )
+            else:
+                # If a file_path is provided, load metadata from the file
+                data = self.load_metadata_from_json()
+                # then deserialize the metadata into the RootSchema object
+                self.from_dict(data, verbose=verbose)
 
             if annotation_file_path is not None:
                 # If an annotation_file_path is provided, load the annotation file and add the summary to the RootSchema object
@@ -547,10 +830,199 @@ class MetadataParser:
 
             # set the verbose flag for the RootSchema object
             # self.verbose = verbose
-        else:
+
+            if snapshot_file_path is not None:
+                try:
+                    self.save_snapshot(snapshot_file_path)
+                except OSError as e:
+                    logger.warning(
+                        f"Unable to write metadata snapshot {snapshot_file_path}: {e}"
+                    )
+        elif file_path is None:
             # If no file_path is provided, create an empty RootSchema object
             self.root_schema_obj = RootSchema()
 
+        if drop_raw_metadata:
+            self.drop_raw_metadata()
+
+    @property
+    def root_schema_obj(self):
+        return self._root_schema_obj
+
+    @root_schema_obj.setter
+    def root_schema_obj(self, value):
+        self._root_schema_obj = value
+        self.invalidate_metadata_cache()
+        self.invalidate_table_index()
+
+    def invalidate_metadata_cache(self):
+        """Discard the rendered metadata blocks, e.g., after the table summaries or the index change."""
+        self._rendered_metadata_cache = {}
+
+    def invalidate_table_index(self):
+        """Discard the table lookup indexes, they are rebuilt on the next lookup.
+        Call this after modifying root_schema_obj in place, or use add_table()/remove_table() which keep the indexes up to date.
+        """
+        self._tables_by_long_name = None
+        self._tables_by_schema = {}
+        self._tables_by_column_name = {}
+
+    def _ensure_table_index(self):
+        if self._tables_by_long_name is not None:
+            return
+        # build the indexes aside and publish them at once, _tables_by_long_name last:
+        # a concurrent lookup sees either no index or a complete one, never a partial one
+        tables_by_long_name: Dict[str, Table] = {}
+        tables_by_schema: Dict[Tuple[str, str], Dict[str, Table]] = {}
+        tables_by_column_name: Dict[str, Dict[str, Table]] = {}
+        # iterate over snapshots, a shard may be loaded or evicted meanwhile
+        for database_name, database in list(self.root_schema_obj.databases.items()):
+            for schema_name, schema in list(database.schemas.items()):
+                tables_by_schema[(database_name, schema_name)] = schema.tables
+                for table_name, table in list(schema.tables.items()):
+                    self._index_table(
+                        f"{database_name}.{schema_name}.{table_name}",
+                        table,
+                        tables_by_long_name,
+                        tables_by_column_name,
+                    )
+        self._tables_by_schema = tables_by_schema
+        self._tables_by_column_name = tables_by_column_name
+        self._tables_by_long_name = tables_by_long_name
+
+    def _index_table(
+        self,
+        long_name: str,
+        table: Table,
+        tables_by_long_name: Optional[Dict[str, Table]] = None,
+        tables_by_column_name: Optional[Dict[str, Dict[str, Table]]] = None,
+    ):
+        if tables_by_long_name is None:
+            tables_by_long_name = self._tables_by_long_name
+        if tables_by_column_name is None:
+            tables_by_column_name = self._tables_by_column_name
+        tables_by_long_name[long_name] = table
+        for column_name in table.columns:
+            tables_by_column_name.setdefault(column_name, {})[long_name] = table
+
+    def _unindex_table(self, long_name: str):
+        table = self._tables_by_long_name.pop(long_name, None)
+        if table is None:
+            return
+        for column_name in table.columns:
+            tables = self._tables_by_column_name.get(column_name, {})
+            tables.pop(long_name, None)
+            if not tables:
+                self._tables_by_column_name.pop(column_name, None)
+
+    def _ensure_shard_loaded(self, database_name: str, schema_name: str):
+        """Load the shard holding the given database/schema if the index is sharded and the shard is not resident."""
+        if self._shards is None:
+            return
+        shard_file = self._shards.shard_file(database_name, schema_name)
+        if shard_file is None:
+            return
+        with self._shards.lock:
+            if self._shards.touch(shard_file):
+                return
+            logger.debug(f"Loading metadata shard {shard_file}")
+            shard_parser = MetadataParser(verbose=self._verbose)
+            shard_parser.from_dict(
+                self._shards.read_shard(shard_file), verbose=self._verbose
+            )
+            if self._drop_raw_metadata:
+                shard_parser.drop_raw_metadata()
+            for table in shard_parser.get_tables_from_database_schema_table_names():
+                summary = self._shards.summaries.get(table.long_name)
+                if summary is not None:
+                    table.summary = summary
+                self.add_table(table)
+            for evicted_file in self._shards.mark_resident(shard_file):
+                self._unload_shard(evicted_file)
+
+    def _unload_shard(self, shard_file: str):
+        for database_name, schema_name in self._shards.shard_schemas(shard_file):
+            database = self.root_schema_obj.databases.get(database_name)
+            if database is None or schema_name not in database.schemas:
+                continue
+            for table_name in list(database.schemas[schema_name].tables):
+                self.remove_table(f"{database_name}.{schema_name}.{table_name}")
+            del database.schemas[schema_name]
+            self._tables_by_schema.pop((database_name, schema_name), None)
+            if not database.schemas:
+                del self.root_schema_obj.databases[database_name]
+
+    def _shard_lock(self):
+        """Return the lock to hold while loading a shard and reading its tables, so no other thread evicts the shard in between."""
+        return self._shards.lock if self._shards is not None else nullcontext()
+
+    def shard_stats(self) -> Optional[Dict[str, int]]:
+        """Return the shard counters of a sharded index, or None if the index is not sharded."""
+        return self._shards.stats() if self._shards is not None else None
+
+    def get_table_by_long_name(self, table_long_name: str) -> Optional[Table]:
+        """Return the table with the given database_name.schema_name.table_name, or None if it does not exist."""
+        with self._shard_lock():
+            if self._shards is not None:
+                database_name, schema_name, _ = parse_table_long_name(table_long_name)
+                self._ensure_shard_loaded(database_name, schema_name)
+            self._ensure_table_index()
+            return self._tables_by_long_name.get(table_long_name)
+
+    def get_tables_by_column_name(self, column_name: str) -> List[Table]:
+        """Return all tables that have a column with the given name.
+        Note: for a sharded index only the tables of the resident shards are considered.
+        """
+        self._ensure_table_index()
+        return list(self._tables_by_column_name.get(column_name.lower(), {}).values())
+
+    def add_table(self, table: Table):
+        """Add a table to the index, replacing any table with the same long name."""
+        self._ensure_table_index()
+        database = self.root_schema_obj.databases.get(table.database_name)
+        if database is None:
+            database = Database(table.database_name, verbose=self._verbose)
+            self.root_schema_obj.databases[table.database_name] = database
+        schema = database.schemas.get(table.schema_name)
+        if schema is None:
+            schema = Schema(
+                table.schema_name, table.database_name, verbose=self._verbose
+            )
+            database.schemas[table.schema_name] = schema
+            self._tables_by_schema[
+                (table.database_name, table.schema_name)
+            ] = schema.tables
+
+        long_name = f"{table.database_name}.{table.schema_name}.{table.name}"
+        self._unindex_table(long_name)
+        schema.tables[table.name] = table
+        self._index_table(long_name, table)
+        self.invalidate_metadata_cache()
+
+    def remove_table(self, table_long_name: str) -> Optional[Table]:
+        """Remove a table from the index and return it, or None if it does not exist."""
+        self._ensure_table_index()
+        database_name, schema_name, table_name = parse_table_long_name(table_long_name)
+        table = self._tables_by_long_name.get(table_long_name)
+        if table is None:
+            return None
+        self._unindex_table(table_long_name)
+        del (
+            self.root_schema_obj.databases[database_name]
+            .schemas[schema_name]
+            .tables[table_name]
+        )
+        self.invalidate_metadata_cache()
+        return table
+
+    def metadata_cache_stats(self) -> Dict[str, int]:
+        """Return the hit/miss counters and the size of the rendered metadata cache."""
+        return {
+            "hits": self.metadata_cache_hits,
+            "misses": self.metadata_cache_misses,
+            "size": len(self._rendered_metadata_cache),
+        }
+
     def from_dict(self, data, verbose: bool = False):
         """Takes in the metadata dictionary loaded from the JSON file and deserializes it into the RootSchema object"""
         self.root_schema_obj = RootSchema.from_dict(data=data["root_schema_obj"])
@@ -568,11 +1040,55 @@ class MetadataParser:
         self._populate_column_comment()
         self._populate_column_sample_values_list()
 
-        # NOTE: the use of nested dicts will be removed in the future
-        # Initialize the nested dictionaries
-        self._initialize_nested_dicts()
-        # Populate the nested dictionaries
-        self._populate_nested_dicts()
+    def _derive_table(self, table: Table, verbose: bool = False):
+        """Derive the comment and the column attributes of a single table, the per-table equivalent of from_dict()."""
+        table._create_columns()
+        if verbose:
+            table.verbose = verbose
+        table.comment = (
+            table._parse_comment_from_ddl(table.get_ddl_create_table)
+            if table.get_ddl_create_table
+            else None
+        )
+        for column in table.columns.values():
+            column.table_name = table.name
+            column.schema_name = table.schema_name
+            column.database_name = table.database_name
+        table._populate_column_data_types()
+        table._populate_column_comments()
+        table._populate_column_sample_values()
+
+    def load_metadata_from_jsonl(
+        self,
+        file_path: Optional[str] = None,
+        verbose: bool = False,
+        drop_raw_metadata: bool = False,
+    ):
+        """Build the index from a JSON-lines file holding one Table.to_dict() per line, see save_metadata_to_jsonl().
+        Each table is derived as soon as its line is read and its raw dictionary is then discarded.
+        With drop_raw_metadata, the peak memory is therefore bounded by the largest table instead of the whole file.
+        """
+        if file_path is None:
+            file_path = self.file_path
+
+        self.root_schema_obj = RootSchema()
+        with open(file_path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                table = Table.from_dict(json.loads(line))
+                self._derive_table(table, verbose=verbose)
+                if drop_raw_metadata:
+                    table.drop_raw_fields()
+                self.add_table(table)
+
+    def save_metadata_to_jsonl(self, file_path: str):
+        """Save the index as a JSON-lines file with one table per line."""
+        self._unify_names_to_lower_cases()
+        with open(file_path, "w") as f:
+            for table in self.get_tables_from_database_schema_table_names():
+                f.write(json.dumps(table.to_dict()))
+                f.write("\n")
 
     def to_dict(self):
         self._unify_names_to_lower_cases()
@@ -581,58 +1097,15 @@ class MetadataParser:
         }
         return data
 
-    def _initialize_nested_dicts(self):
-        self.create_table_stmt = nested_dict()
-        self.select_sample_rows_stmt = nested_dict()
-        self.table_sample_rows = nested_dict()
-        self.table_sample_row_column_names = nested_dict()
-        self.select_get_ddl_table_stmt = nested_dict()
-        self.get_ddl_create_table = nested_dict()
-        self.select_information_schema_columns_stmt = nested_dict()
-        self.information_schema_columns_names = nested_dict()
-        self.information_schema_columns_values = nested_dict()
-
-    def _populate_nested_dicts(self):
-        for database_name, database in self.root_schema_obj.databases.items():
-            for schema_name, schema in database.schemas.items():
-                for table_name, table in schema.tables.items():
-                    self.create_table_stmt[database_name][schema_name][table_name] = (
-                        table.create_table_stmt or None
-                    )
-
-                    self.select_sample_rows_stmt[database_name][schema_name][
-                        table_name
-                    ] = (table.select_sample_rows_stmt or None)
-
-                    self.table_sample_row_column_names[database_name][schema_name][
-                        table_name
-                    ] = (table.sample_row_column_names or None)
-
-                    self.table_sample_rows[database_name][schema_name][table_name] = (
-                        table.sample_rows or None
-                    )
-
-                    self.select_get_ddl_table_stmt[database_name][schema_name][
-                        table_name
-                    ] = (table.select_get_ddl_table_stmt or None)
-
-                    self.get_ddl_create_table[database_name][schema_name][
-                        table_name
-                    ] = (table.get_ddl_create_table or None)
-
-                    self.select_information_schema_columns_stmt[database_name][
-                        schema_name
-                    ][table_name] = (
-                        table.select_information_schema_columns_stmt or None
-                    )
-
-                    self.information_schema_columns_names[database_name][schema_name][
-                        table_name
-                    ] = (table.information_schema_columns_names or None)
-
-                    self.information_schema_columns_values[database_name][schema_name][
-                        table_name
-                    ] = (table.information_schema_columns_values or None)
+    def drop_raw_metadata(self):
+        """Release the raw DDL statements, sample rows and information_schema values of every table.
+        They are only needed to derive the table comments and the column data types, comments and sample values, which are kept.
+        Note: the raw fields are no longer available to to_dict() and save_metadata_to_json() afterwards.
+        """
+        for database in self.root_schema_obj.databases.values():
+            for schema in database.schemas.values():
+                for table in schema.tables.values():
+                    table.drop_raw_fields()
 
     def _populate_column_table_schema_database_names(self):
         for database_name, database in self.root_schema_obj.databases.items():
@@ -651,50 +1124,22 @@ class MetadataParser:
                     table._create_columns()
 
     def _populate_column_comment(self):
-        for database_name, database in self.root_schema_obj.databases.items():
-            for schema_name, schema in database.schemas.items():
-                for table_name, table in schema.tables.items():
-                    ddl_create_table = table.get_ddl_create_table
-                    for column in table.columns.values():
-                        column.comment = (
-                            column._parse_comment_from_ddl(ddl_create_table)
-                            if ddl_create_table
-                            else None
-                        )
-
-    #                    ddl_create_table = self.get_ddl_create_table[database_name][ schema_name ][table_name]
+        for database in self.root_schema_obj.databases.values():
+            for schema in database.schemas.values():
+                for table in schema.tables.values():
+                    table._populate_column_comments()
 
     def _populate_column_data_type(self):
-        for database_name, database in self.root_schema_obj.databases.items():
-            for schema_name, schema in database.schemas.items():
-                for table_name, table in schema.tables.items():
-                    create_table_stmt = table.create_table_stmt
-                    for column in table.columns.values():
-                        column.data_type = (
-                            (
-                                column._parse_data_type_from_create_table_stmt(
-                                    create_table_stmt
-                                )
-                            )
-                            if create_table_stmt
-                            else None
-                        )
-
-                    # create_table_stmt = self.create_table_stmt[database_name][ schema_name ][table_name]
+        for database in self.root_schema_obj.databases.values():
+            for schema in database.schemas.values():
+                for table in schema.tables.values():
+                    table._populate_column_data_types()
 
     def _populate_column_sample_values_list(self):
         for database in self.root_schema_obj.databases.values():
             for schema in database.schemas.values():
                 for table in schema.tables.values():
-                    for column in table.columns.values():
-                        column.sample_values_list = (
-                            column._parse_value_from_sample_rows(
-                                table.sample_row_column_names,
-                                table.sample_rows,
-                            )
-                            if table.sample_rows
-                            else None
-                        )
+                    table._populate_column_sample_values()
 
     def _populate_table_comment(self):
         for db in self.root_schema_obj.databases.values():
@@ -708,13 +1153,13 @@ class MetadataParser:
 
     def _unify_names_to_lower_cases(self):
         for database in self.root_schema_obj.databases.values():
-            database.name = database.name.lower()
+            database.name = intern_name(database.name)
             for schema in database.schemas.values():
-                schema.name = schema.name.lower()
+                schema.name = intern_name(schema.name)
                 for table in schema.tables.values():
-                    table.name = table.name.lower()
+                    table.name = intern_name(table.name)
                     for column in table.columns.values():
-                        column.name = column.name.lower()
+                        column.name = intern_name(column.name)
 
     def add_table_summary(
         self,
@@ -759,15 +1204,22 @@ class MetadataParser:
                 f"Unable to load table summary from {file_path_json} or {table_summary_json}."
             )
 
+        if self._shards is not None:
+            # summaries of tables in shards that are not resident are applied when the shard is loaded
+            self._shards.summaries.update(table_summary)
+
         for table_long_name, summary in table_summary.items():
             # parse the table long name
             database_name, schema_name, table_name = parse_table_long_name(
                 table_long_name
             )
             # add the summary to the table
-            self.root_schema_obj.databases[database_name].schemas[schema_name].tables[
-                table_name
-            ].summary = summary
+            self._ensure_table_index()
+            long_name = f"{database_name}.{schema_name}.{table_name}"
+            if self._shards is not None and long_name not in self._tables_by_long_name:
+                continue
+            self._tables_by_long_name[long_name].summary = summary
+        self.invalidate_metadata_cache()
 
     # create a property to access the verbose attribute
     @property
@@ -784,6 +1236,74 @@ class MetadataParser:
         with open(file_path, "w") as f:
             json.dump(self.to_dict(), f)
 
+    def save_snapshot(self, snapshot_file_path: str):
+        """Save the fully-derived index to a compiled snapshot file.
+        The snapshot holds a small header (format version and source checksum) followed by the pickled RootSchema object.
+        The file is written to a temporary path first and then atomically moved into place, so concurrent workers never read a partial snapshot.
+        """
+        if self.file_path is None:
+            raise ValueError("A snapshot can only be saved for a file based index.")
+
+        header = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "checksum": compute_metadata_checksum(
+                self.file_path, self.annotation_file_path
+            ),
+        }
+        snapshot_dir = os.path.dirname(os.path.abspath(snapshot_file_path))
+        os.makedirs(snapshot_dir, exist_ok=True)
+        tmp_file_path = f"{snapshot_file_path}.{os.getpid()}.tmp"
+        with open(tmp_file_path, "wb") as f:
+            pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(self.root_schema_obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file_path, snapshot_file_path)
+        logger.debug(f"Saved metadata snapshot to {snapshot_file_path}")
+
+    @staticmethod
+    def read_snapshot_header(snapshot_file_path: str) -> Optional[Dict]:
+        """Return the header of a snapshot file, or None if it can not be read."""
+        try:
+            with open(snapshot_file_path, "rb") as f:
+                header = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logger.debug(f"Unable to read snapshot header {snapshot_file_path}: {e}")
+            return None
+        return header if isinstance(header, dict) else None
+
+    def is_snapshot_fresh(self, snapshot_file_path: str) -> bool:
+        """Check whether a snapshot was built from the current metadata and annotation files."""
+        header = self.read_snapshot_header(snapshot_file_path)
+        if header is None or self.file_path is None:
+            return False
+        return header.get("format_version") == SNAPSHOT_FORMAT_VERSION and header.get(
+            "checksum"
+        ) == compute_metadata_checksum(self.file_path, self.annotation_file_path)
+
+    def load_snapshot(self, snapshot_file_path: str) -> bool:
+        """Load the index from a snapshot file if it is fresh.
+        Returns True if the snapshot was loaded, False if it is missing or stale and the index needs to be rebuilt.
+        Note: snapshots are pickle files, only load snapshots that were built locally.
+        """
+        if not self.is_snapshot_fresh(snapshot_file_path):
+            logger.info(f"Metadata snapshot {snapshot_file_path} is missing or stale.")
+            return False
+
+        try:
+            with open(snapshot_file_path, "rb") as f:
+                pickle.load(f)  # skip the header
+                root_schema_obj = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+            logger.warning(
+                f"Unable to load metadata snapshot {snapshot_file_path}: {e}"
+            )
+            return False
+
+        self.root_schema_obj = root_schema_obj
+        if self._verbose:
+            self.root_schema_obj.verbose = self._verbose
+        logger.debug(f"Loaded metadata snapshot from {snapshot_file_path}")
+        return True
+
     def load_metadata_from_json(self, file_path=None):
         """Load metadata from a JSON file and returns it."""
         if file_path is None:
@@ -815,24 +1335,16 @@ class MetadataParser:
                 raise ValueError(
                     "database_name and schema_name must be provided if table_name is provided"
                 )
-            table = (
-                self.root_schema_obj.databases[database_name]
-                .schemas[schema_name]
-                .tables[table_name]
-            )
-            tables.append(table)
+            with self._shard_lock():
+                self._ensure_shard_loaded(database_name, schema_name)
+                self._ensure_table_index()
+                tables.append(
+                    self._tables_by_long_name[
+                        f"{database_name}.{schema_name}.{table_name}"
+                    ]
+                )
         else:
-            for (
-                cat_name,
-                database,
-            ) in (
-                self.root_schema_obj.databases.items()
-            ):  # database could be e.g., "ethereum"
-                if database_name is None or cat_name == database_name:
-                    for sch_name, schema in database.schemas.items():
-                        if schema_name is None or sch_name == schema_name:
-                            for table in schema.tables.values():
-                                tables.append(table)
+            tables = self._find_target_tables(database_name, schema_name)
         return tables
 
     def get_table_metadata(
@@ -860,36 +1372,92 @@ class MetadataParser:
         """
         target_tables = self._find_target_tables(database, schema, tables)
 
-        output = ""
-        for table in target_tables:
-            output += table._get_metadata(
+        return "\n\n".join(
+            self._get_rendered_table_metadata(
+                table,
                 include_table_name=include_table_name,
                 include_table_summary=include_table_summary,
                 include_column_names=include_column_names,
                 include_column_info=include_column_info,
                 column_info_format=column_info_format,
             )
+            for table in target_tables
+        ).strip()
 
-            output += "\n\n"
-
-        return output.strip()
+    def _get_rendered_table_metadata(
+        self,
+        table: Table,
+        include_table_name: Optional[bool] = True,
+        include_table_summary: Optional[bool] = True,
+        include_column_names: Optional[bool] = False,
+        include_column_info: Optional[bool] = True,
+        column_info_format: Optional[List] = None,
+    ) -> str:
+        """Return the rendered metadata block of a table, rendering it only on the first request."""
+        key = (
+            table.long_name,
+            include_table_name,
+            include_table_summary,
+            include_column_names,
+            include_column_info,
+            tuple(column_info_format) if column_info_format is not None else None,
+        )
+        rendered = self._rendered_metadata_cache.get(key)
+        if rendered is not None:
+            self.metadata_cache_hits += 1
+            return rendered
+
+        self.metadata_cache_misses += 1
+        rendered = table._get_metadata(
+            include_table_name=include_table_name,
+            include_table_summary=include_table_summary,
+            include_column_names=include_column_names,
+            include_column_info=include_column_info,
+            column_info_format=column_info_format,
+        )
+        self._rendered_metadata_cache[key] = rendered
+        return rendered
 
     def _find_target_tables(self, database=None, schema=None, tables=None):
         matched_tables = []
 
-        if database is not None and database not in self.root_schema_obj.databases:
+        if (
+            database is not None
+            and database not in self.root_schema_obj.databases
+            and not (self._shards is not None and self._shards.has_database(database))
+        ):
             logger.warning(f"Database '{database}' does not exist.")
 
-        for db_name, db in self.root_schema_obj.databases.items():
-            if database is None or db_name == database:
-                for sch_name, sch in db.schemas.items():
-                    if schema is None or sch_name == schema:
-                        if tables is None:
-                            matched_tables.extend(list(sch.tables.values()))
-                        else:
-                            for table_name in tables:
-                                if table_name in sch.tables:
-                                    matched_tables.append(sch.tables[table_name])
+        self._ensure_table_index()
+        if database is not None and schema is not None:
+            schema_keys = [(database, schema)]
+        else:
+            # a single snapshot of the indexed schemas, shards may be loaded or evicted meanwhile
+            indexed_schema_keys = list(self._tables_by_schema)
+            schema_keys = [
+                (db_name, sch_name)
+                for db_name, sch_name in indexed_schema_keys
+                if (database is None or db_name == database)
+                and (schema is None or sch_name == schema)
+            ]
+            if self._shards is not None:
+                schema_keys += [
+                    key
+                    for key in self._shards.schema_keys(database, schema)
+                    if key not in indexed_schema_keys
+                ]
+
+        for db_name, sch_name in schema_keys:
+            # tables are collected right after their shard is loaded, before a later shard can evict it
+            with self._shard_lock():
+                self._ensure_shard_loaded(db_name, sch_name)
+                sch_tables = dict(self._tables_by_schema.get((db_name, sch_name), {}))
+            if tables is None:
+                matched_tables.extend(sch_tables.values())
+            else:
+                for table_name in tables:
+                    if table_name in sch_tables:
+                        matched_tables.append(sch_tables[table_name])
 
         return matched_tables
 
@@ -0,0 +1,186 @@
+"""
+metadata_refresher.py
+This file contains the incremental refresh of the metadata index from Snowflake.
+Only the tables whose LAST_ALTERED in INFORMATION_SCHEMA.TABLES changed are re-fetched, using the
+select statements stored with each Table, and re-derived before the updated index is written out.
+"""
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+
+from chatweb3.metadata_parser import MetadataParser, Table
+from chatweb3.utils import convert_rows_to_serializable
+from config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# run_query(command, database, schema) returns the column names and the rows of the result
+RunQuery = Callable[[str, str, str], Tuple[List[str], List[Sequence]]]
+
+
+def snowflake_run_query(container) -> RunQuery:
+    """Return a run_query callable that executes the statements through the SnowflakeDatabase engines of a SnowflakeContainer."""
+
+    def run_query(command: str, database: str, schema: str):
+        engine = container.get_database(database=database, schema=schema)._engine
+        with engine.connect() as connection:
+            result = connection.execute(text(command))
+            return list(result.keys()), [tuple(row) for row in result.fetchall()]
+
+    return run_query
+
+
+def _format_data_type(column: Dict) -> str:
+    """Format the data type of an information_schema column the way CREATE TABLE statements show it, e.g., NUMBER(38,0)."""
+    data_type = column.get("data_type") or ""
+    if data_type == "TEXT":
+        data_type = "VARCHAR"
+    if column.get("character_maximum_length") is not None:
+        return f"{data_type}({column['character_maximum_length']})"
+    if data_type == "NUMBER" and column.get("numeric_precision") is not None:
+        return f"{data_type}({column['numeric_precision']},{column.get('numeric_scale') or 0})"
+    if (
+        data_type.startswith("TIMESTAMP")
+        and column.get("datetime_precision") is not None
+    ):
+        return f"{data_type}({column['datetime_precision']})"
+    return data_type
+
+
+def create_table_stmt_from_information_schema(
+    table_long_name: str, column_names: List[str], column_values: List[Sequence]
+) -> str:
+    """Synthesize a create table statement, in the layout of the stored ones, from the information_schema columns of a table."""
+    columns = sorted(
+        (dict(zip(column_names, values)) for values in column_values),
+        key=lambda column: column.get("ordinal_position") or 0,
+    )
+    definitions = []
+    for column in columns:
+        definition = f"{column['column_name']}\n\t{_format_data_type(column)}"
+        if column.get("comment"):
+            comment = str(column["comment"]).replace("'", "''")
+            definition += f"\n\tCOMMENT '{comment}'"
+        definitions.append(definition)
+    return (
+        f"\nCREATE TABLE {table_long_name.upper()} (\n\t"
+        + ", ".join(definitions)
+        + "\n)\n\n"
+    )
+
+
+class MetadataRefresher:
+    def __init__(self, metadata_parser: MetadataParser, run_query: RunQuery):
+        """
+        metadata_parser: the index to refresh in place
+        run_query: executes a statement on a database/schema, see snowflake_run_query()
+        """
+        self.metadata_parser = metadata_parser
+        self.run_query = run_query
+
+    def fetch_last_altered(
+        self, database_name: str, schema_names: List[str]
+    ) -> Dict[str, str]:
+        """Return the LAST_ALTERED of every table of the given schemas, keyed on the table long name."""
+        schemas = ", ".join(f"'{name.upper()}'" for name in schema_names)
+        command = (
+            f"SELECT TABLE_SCHEMA, TABLE_NAME, LAST_ALTERED "
+            f"FROM {database_name.upper()}.INFORMATION_SCHEMA.TABLES "
+            f"WHERE TABLE_SCHEMA IN ({schemas})"
+        )
+        _, rows = self.run_query(command, database_name, schema_names[0])
+        return {
+            f"{database_name}.{schema_name}.{table_name}".lower(): (
+                last_altered.isoformat()
+                if hasattr(last_altered, "isoformat")
+                else str(last_altered)
+            )
+            for schema_name, table_name, last_altered in rows
+        }
+
+    def find_changed_tables(self) -> Tuple[List[Tuple[Table, str]], List[str]]:
+        """Return the (table, new LAST_ALTERED) pairs of the tables that changed since they were fetched,
+        and the long names of the tables that are no longer in INFORMATION_SCHEMA.TABLES.
+        """
+        changed: List[Tuple[Table, str]] = []
+        missing: List[str] = []
+        for (
+            database_name,
+            database,
+        ) in self.metadata_parser.root_schema_obj.databases.items():
+            last_altered = self.fetch_last_altered(
+                database_name, list(database.schemas)
+            )
+            for schema in database.schemas.values():
+                for table in schema.tables.values():
+                    if table.long_name not in last_altered:
+                        missing.append(table.long_name)
+                    elif table.last_altered != last_altered[table.long_name]:
+                        changed.append((table, last_altered[table.long_name]))
+        return changed, missing
+
+    def fetch_table(self, table: Table, last_altered: Optional[str] = None) -> Table:
+        """Re-run the stored select statements of a table and return a new, fully derived Table."""
+        database_name, schema_name = table.database_name, table.schema_name
+        data = {
+            key: value
+            for key, value in table.to_dict().items()
+            if key not in ("columns", "comment")
+        }
+        data["last_altered"] = last_altered
+
+        if table.select_information_schema_columns_stmt:
+            names, rows = self.run_query(
+                table.select_information_schema_columns_stmt, database_name, schema_name
+            )
+            names = [name.lower() for name in names]
+            rows = convert_rows_to_serializable(rows)
+            data["information_schema_columns_names"] = names
+            data["information_schema_columns_values"] = rows
+            data["column_names"] = [
+                dict(zip(names, row))["column_name"].lower() for row in rows
+            ]
+            data["create_table_stmt"] = create_table_stmt_from_information_schema(
+                table.long_name, names, rows
+            )
+        if table.select_get_ddl_table_stmt:
+            _, rows = self.run_query(
+                table.select_get_ddl_table_stmt, database_name, schema_name
+            )
+            data["get_ddl_create_table"] = rows[0][0] if rows else None
+        if table.select_sample_rows_stmt:
+            names, rows = self.run_query(
+                table.select_sample_rows_stmt, database_name, schema_name
+            )
+            data["sample_row_column_names"] = [name.lower() for name in names]
+            data["sample_rows"] = convert_rows_to_serializable(rows)
+
+        new_table = Table.from_dict(data)
+        self.metadata_parser._derive_table(new_table)
+        new_table.summary = table.summary
+        return new_table
+
+    def refresh(self, dry_run: bool = False) -> Dict[str, List[str]]:
+        """Re-fetch the changed tables and replace them in the index.
+        Returns the long names of the refreshed, failed and missing tables.
+        """
+        changed, missing = self.find_changed_tables()
+        refreshed: List[str] = []
+        failed: List[str] = []
+        for table, last_altered in changed:
+            if dry_run:
+                refreshed.append(table.long_name)
+                continue
+            try:
+                self.metadata_parser.add_table(self.fetch_table(table, last_altered))
+                refreshed.append(table.long_name)
+            except Exception as e:
+                logger.error(f"Failed to refresh {table.long_name}: {e}")
+                failed.append(table.long_name)
+
+        if missing:
+            logger.warning(f"Tables not found in INFORMATION_SCHEMA.TABLES: {missing}")
+        logger.info(
+            f"Refreshed {len(refreshed)} of {len(changed)} changed tables, {len(failed)} failed"
+        )
+        return {"refreshed": refreshed, "failed": failed, "missing": missing}
@@ -0,0 +1,121 @@
+"""
+metadata_reloader.py
+This file contains the background reloader of the metadata index.
+It polls the metadata and annotation files, rebuilds a new MetadataParser off the request path when they change,
+and atomically swaps it into the SnowflakeContainer used by the tools.
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class MetadataReloader:
+    def __init__(
+        self,
+        container,
+        file_paths: List[str],
+        interval_seconds: float,
+        build_parser: Optional[Callable] = None,
+    ):
+        """
+        container: the SnowflakeContainer whose metadata_parser is swapped on reload
+        file_paths: the files to watch, e.g., the context, annotation or shard manifest files
+        build_parser: builds the new MetadataParser, defaults to container.build_metadata_parser
+        """
+        if interval_seconds <= 0:
+            raise ValueError("interval_seconds must be positive.")
+        self.container = container
+        self.file_paths = [path for path in file_paths if path]
+        self.interval_seconds = interval_seconds
+        self.build_parser = build_parser or container.build_metadata_parser
+        self._signature = self._file_signature()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        self.reload_count = 0
+        self.failure_count = 0
+        self.last_reload_duration_seconds: Optional[float] = None
+        self.total_reload_duration_seconds = 0.0
+        self.last_reload_time: Optional[float] = None
+
+    def _file_signature(self) -> Tuple:
+        signature = []
+        for path in self.file_paths:
+            try:
+                stat = os.stat(path)
+                signature.append((path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append((path, None, None))
+        return tuple(signature)
+
+    def check(self) -> bool:
+        """Reload the metadata index if any of the watched files changed. Returns True if a new index was swapped in."""
+        signature = self._file_signature()
+        if signature == self._signature:
+            return False
+        if self.reload():
+            # only remember the new signature on success, so that a partially written file is retried on the next poll
+            self._signature = signature
+            return True
+        return False
+
+    def reload(self) -> bool:
+        """Build a new metadata index and swap it into the container. Returns True on success."""
+        with self._lock:
+            start_time = time.perf_counter()
+            try:
+                metadata_parser = self.build_parser()
+            except Exception as e:
+                self.failure_count += 1
+                logger.error(f"Failed to reload the metadata index: {e}")
+                return False
+            # a single attribute assignment, in-flight readers keep the parser they already hold
+            self.container.metadata_parser = metadata_parser
+            duration = time.perf_counter() - start_time
+
+            self.reload_count += 1
+            self.last_reload_duration_seconds = duration
+            self.total_reload_duration_seconds += duration
+            self.last_reload_time = time.time()
+            logger.info(f"Reloaded the metadata index in {duration:.3f}s")
+            return True
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval_seconds):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Metadata reloader error: {e}")
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="metadata-reloader", daemon=True
+        )
+        self._thread.start()
+        logger.debug(
+            f"Started metadata reloader for {self.file_paths} every {self.interval_seconds}s"
+        )
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> Dict:
+        return {
+            "reload_count": self.reload_count,
+            "failure_count": self.failure_count,
+            "last_reload_duration_seconds": self.last_reload_duration_seconds,
+            "total_reload_duration_seconds": self.total_reload_duration_seconds,
+            "last_reload_time": self.last_reload_time,
+        }
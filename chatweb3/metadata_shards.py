@@ -0,0 +1,151 @@
+"""
+metadata_shards.py
+This file contains the on-disk layout of a sharded metadata index: a directory of
+per-database or per-schema shard files plus a small manifest.json describing them.
+
+Each shard file has the same format as a metadata context file, restricted to its databases/schemas,
+so it can be deserialized by MetadataParser.from_dict().
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+MANIFEST_FILE_NAME = "manifest.json"
+SHARD_FORMAT_VERSION = 1
+
+
+def write_shards(data: Dict, output_dir: str, by: str = "schema") -> Dict:
+    """Split the metadata context dictionary into shard files under output_dir and write the manifest.
+    by: "database" writes one shard per database, "schema" writes one shard per schema.
+    Returns the manifest.
+    """
+    if by not in ("database", "schema"):
+        raise ValueError(f"Unsupported shard granularity: {by}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    shards = []
+    for database_name, database in data["root_schema_obj"]["databases"].items():
+        schema_groups = (
+            [database["schemas"]]
+            if by == "database"
+            else [{name: schema} for name, schema in database["schemas"].items()]
+        )
+        for schemas in schema_groups:
+            if by == "database":
+                file_name = f"{database_name.lower()}.json"
+            else:
+                file_name = (
+                    f"{database_name.lower()}.{next(iter(schemas)).lower()}.json"
+                )
+            shard_data = {
+                "root_schema_obj": {
+                    "databases": {
+                        database_name: {**database, "schemas": schemas},
+                    }
+                }
+            }
+            with open(os.path.join(output_dir, file_name), "w") as f:
+                json.dump(shard_data, f)
+            shards.append(
+                {
+                    "file": file_name,
+                    "database": database_name.lower(),
+                    "schemas": [name.lower() for name in schemas],
+                    "tables": sum(len(schema["tables"]) for schema in schemas.values()),
+                }
+            )
+
+    manifest = {"format_version": SHARD_FORMAT_VERSION, "shards": shards}
+    with open(os.path.join(output_dir, MANIFEST_FILE_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class MetadataShards:
+    """The manifest of a shard directory and the bookkeeping of which shards are resident.
+    Shards are evicted in least recently used order once more than max_resident_shards are loaded (0 means unbounded).
+    """
+
+    def __init__(self, shard_dir_path: str, max_resident_shards: int = 0):
+        self.shard_dir_path = shard_dir_path
+        self.max_resident_shards = max_resident_shards
+        manifest_path = os.path.join(shard_dir_path, MANIFEST_FILE_NAME)
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != SHARD_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported shard manifest version {manifest.get('format_version')} in {manifest_path}"
+            )
+
+        # (database, schema) -> shard file, in manifest order
+        self._shard_files: Dict[Tuple[str, str], str] = {}
+        self._shard_schemas: Dict[str, List[Tuple[str, str]]] = {}
+        for shard in manifest["shards"]:
+            keys = [(shard["database"], schema) for schema in shard["schemas"]]
+            self._shard_schemas[shard["file"]] = keys
+            for key in keys:
+                self._shard_files[key] = shard["file"]
+
+        self._resident: "OrderedDict[str, None]" = OrderedDict()
+        # table long name -> summary, applied to the tables of a shard when it is loaded
+        self.summaries: Dict[str, str] = {}
+        self.loads = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+
+    def has_database(self, database_name: str) -> bool:
+        return any(key[0] == database_name for key in self._shard_files)
+
+    def schema_keys(
+        self, database_name: Optional[str] = None, schema_name: Optional[str] = None
+    ) -> List[Tuple[str, str]]:
+        """Return the (database, schema) pairs in the manifest matching the optional filters."""
+        return [
+            key
+            for key in self._shard_files
+            if (database_name is None or key[0] == database_name)
+            and (schema_name is None or key[1] == schema_name)
+        ]
+
+    def shard_file(self, database_name: str, schema_name: str) -> Optional[str]:
+        return self._shard_files.get((database_name, schema_name))
+
+    def shard_schemas(self, shard_file: str) -> List[Tuple[str, str]]:
+        return self._shard_schemas[shard_file]
+
+    def touch(self, shard_file: str) -> bool:
+        """Mark a shard as most recently used. Returns False if the shard is not resident."""
+        if shard_file not in self._resident:
+            return False
+        self._resident.move_to_end(shard_file)
+        return True
+
+    def read_shard(self, shard_file: str) -> Dict:
+        with open(os.path.join(self.shard_dir_path, shard_file), "r") as f:
+            return json.load(f)
+
+    def mark_resident(self, shard_file: str) -> List[str]:
+        """Record a newly loaded shard and return the shards to evict."""
+        self._resident[shard_file] = None
+        self.loads += 1
+        evicted = []
+        while 0 < self.max_resident_shards < len(self._resident):
+            evicted_file, _ = self._resident.popitem(last=False)
+            evicted.append(evicted_file)
+            self.evictions += 1
+            logger.debug(f"Evicting metadata shard {evicted_file}")
+        return evicted
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "shards": len(self._shard_schemas),
+            "resident": len(self._resident),
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
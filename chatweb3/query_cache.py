@@ -0,0 +1,334 @@
+"""
+query_cache.py
+This file contains the result cache of QuerySnowflakeDatabaseTool.
+Results are keyed on the canonicalized SQL (comments stripped, whitespace collapsed, lower case outside quoted
+literals and identifiers) plus the query mode, database and schema, and expire after a TTL that depends on the
+shape of the query: queries on CURRENT_DATE and friends get a short TTL.
+
+Backends:
+    - MemoryLRUCacheBackend: in-process, bounded, least recently used eviction
+    - SQLiteCacheBackend: a local SQLite file, shared by the processes on one machine
+    - RedisCacheBackend: a Redis server, shared across machines (requires the optional redis package)
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from chatweb3.utils import dumps_serializable
+from config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+SQL_TOKEN_PATTERN = re.compile(
+    r"(?P<string>'(?:[^'\\]|\\.|'')*')"
+    r"|(?P<identifier>\"(?:[^\"]|\"\")*\")"
+    r"|(?P<comment>--[^\n]*|//[^\n]*|/\*.*?\*/)"
+    r"|(?P<space>\s+)"
+    r"|(?P<other>[^'\"\s/-]+|[/-])",
+    re.DOTALL,
+)
+VOLATILE_SQL_PATTERN = re.compile(
+    r"\b(current_date|current_time|current_timestamp|localtime|localtimestamp"
+    r"|getdate|sysdate|systimestamp|now|random|uuid_string|seq[1248])\b"
+)
+CACHEABLE_SQL_PATTERN = re.compile(r"^\(*\s*(select|with|show|describe|desc)\b")
+
+
+def canonicalize_sql(query: str) -> str:
+    """Return the canonical form of a SQL query used as the cache key.
+    Comments are dropped, runs of whitespace become a single space, a trailing semicolon is removed,
+    and everything outside quoted string literals and quoted identifiers is lower cased.
+    """
+    tokens = []
+    for match in SQL_TOKEN_PATTERN.finditer(query):
+        kind = match.lastgroup
+        if kind == "comment" or kind == "space":
+            # a comment separates tokens just like whitespace
+            if tokens and tokens[-1] != " ":
+                tokens.append(" ")
+        elif kind == "other":
+            tokens.append(match.group().lower())
+        else:
+            tokens.append(match.group())
+    return "".join(tokens).strip().rstrip(";").strip()
+
+
+def _mask_literals(canonical_sql: str) -> str:
+    return SQL_TOKEN_PATTERN.sub(
+        lambda match: "''" if match.lastgroup == "string" else match.group(),
+        canonical_sql,
+    )
+
+
+def query_ttl_seconds(
+    canonical_sql: str, default_ttl_seconds: float, volatile_ttl_seconds: float
+) -> float:
+    """Return how long the results of a canonicalized query may be cached, 0 for queries that should not be cached.
+    Read-only queries get default_ttl_seconds, unless they depend on the current date/time or random values,
+    in which case they get volatile_ttl_seconds.
+    """
+    if not CACHEABLE_SQL_PATTERN.match(canonical_sql):
+        return 0
+    if VOLATILE_SQL_PATTERN.search(_mask_literals(canonical_sql)):
+        return volatile_ttl_seconds
+    return default_ttl_seconds
+
+
+class MemoryLRUCacheBackend:
+    """In-process cache backend evicting the least recently used entries beyond max_entries.
+    The entries are stored JSON serialized like in the other backends: a hit is a fresh copy the caller may modify.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive.")
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return json.loads(entry)
+
+    def set(self, key: str, entry: Dict, ttl_seconds: float):
+        serialized_entry = dumps_serializable(entry)
+        with self._lock:
+            self._entries[key] = (time.time() + ttl_seconds, serialized_entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """Cache backend storing JSON serialized entries in a local SQLite file."""
+
+    def __init__(self, file_path: str, max_entries: int = 100000):
+        self.file_path = file_path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        if os.path.dirname(file_path):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        self._connection = sqlite3.connect(file_path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS query_cache "
+                "(key TEXT PRIMARY KEY, entry TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT entry FROM query_cache WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, entry: Dict, ttl_seconds: float):
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO query_cache (key, entry, expires_at) VALUES (?, ?, ?)",
+                (key, dumps_serializable(entry), now + ttl_seconds),
+            )
+            self._connection.execute(
+                "DELETE FROM query_cache WHERE expires_at <= ?", (now,)
+            )
+            # drop the entries closest to expiry beyond max_entries
+            self._connection.execute(
+                "DELETE FROM query_cache WHERE key IN (SELECT key FROM query_cache "
+                "ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM query_cache")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM query_cache WHERE expires_at > ?", (time.time(),)
+            ).fetchone()[0]
+
+
+class RedisCacheBackend:
+    """Cache backend storing JSON serialized entries in Redis, expiring them with the Redis TTL."""
+
+    def __init__(self, url: str, key_prefix: str = "chatweb3:query_cache:"):
+        try:
+            import redis
+        except ImportError:
+            raise ValueError(
+                "Could not import redis python package. "
+                "Please install it with `pip install redis`."
+            )
+        self.key_prefix = key_prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[Dict]:
+        value = self._client.get(self.key_prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, entry: Dict, ttl_seconds: float):
+        self._client.set(
+            self.key_prefix + key,
+            dumps_serializable(entry),
+            px=max(1, int(ttl_seconds * 1000)),
+        )
+
+    def clear(self):
+        for key in self._client.scan_iter(match=self.key_prefix + "*"):
+            self._client.delete(key)
+
+
+class QueryResultCache:
+    def __init__(
+        self,
+        backend=None,
+        default_ttl_seconds: float = 600,
+        volatile_ttl_seconds: float = 60,
+        ttl_for_query: Optional[Callable[[str], float]] = None,
+    ):
+        """
+        backend: one of the cache backends above, defaults to a MemoryLRUCacheBackend
+        ttl_for_query: maps a canonicalized query to its TTL in seconds (0 disables caching),
+            defaults to query_ttl_seconds() with the default and volatile TTLs
+        """
+        self.backend = backend if backend is not None else MemoryLRUCacheBackend()
+        self.default_ttl_seconds = default_ttl_seconds
+        self.volatile_ttl_seconds = volatile_ttl_seconds
+        self.ttl_for_query = ttl_for_query or (
+            lambda canonical_sql: query_ttl_seconds(
+                canonical_sql, self.default_ttl_seconds, self.volatile_ttl_seconds
+            )
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.errors = 0
+        self.saved_latency_seconds = 0.0
+
+    @staticmethod
+    def make_key(mode: str, database: str, schema: str, canonical_sql: str) -> str:
+        key = json.dumps(
+            [mode, database.strip().lower(), schema.strip().lower(), canonical_sql]
+        )
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get(
+        self, mode: str, database: str, schema: str, query: str
+    ) -> Tuple[bool, Any]:
+        """Return (True, result) on a cache hit and (False, None) otherwise."""
+        canonical_sql = canonicalize_sql(query)
+        if self.ttl_for_query(canonical_sql) <= 0:
+            return False, None
+        try:
+            entry = self.backend.get(
+                self.make_key(mode, database, schema, canonical_sql)
+            )
+        except Exception as e:
+            # a broken shared backend must not fail the query
+            logger.warning(f"Query cache lookup failed: {e}")
+            with self._lock:
+                self.errors += 1
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            self.saved_latency_seconds += entry["latency_seconds"]
+        logger.debug(f"Query cache hit for {canonical_sql=}")
+        return True, entry["result"]
+
+    def set(
+        self,
+        mode: str,
+        database: str,
+        schema: str,
+        query: str,
+        result: Any,
+        latency_seconds: float,
+    ):
+        """Store the result of a query along with how long it took to compute."""
+        canonical_sql = canonicalize_sql(query)
+        ttl_seconds = self.ttl_for_query(canonical_sql)
+        if ttl_seconds <= 0:
+            return
+        entry = {"result": result, "latency_seconds": latency_seconds}
+        try:
+            self.backend.set(
+                self.make_key(mode, database, schema, canonical_sql), entry, ttl_seconds
+            )
+        except Exception as e:
+            logger.warning(f"Query cache store failed: {e}")
+            with self._lock:
+                self.errors += 1
+            return
+        with self._lock:
+            self.stores += 1
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "errors": self.errors,
+            "saved_latency_seconds": self.saved_latency_seconds,
+        }
+
+
+def create_query_cache(
+    backend: str = "memory",
+    max_entries: int = 1024,
+    default_ttl_seconds: float = 600,
+    volatile_ttl_seconds: float = 60,
+    sqlite_path: Optional[str] = None,
+    redis_url: Optional[str] = None,
+) -> QueryResultCache:
+    """Create a QueryResultCache with the named backend: "memory", "sqlite" or "redis"."""
+    if backend == "memory":
+        cache_backend: Any = MemoryLRUCacheBackend(max_entries=max_entries)
+    elif backend == "sqlite":
+        if not sqlite_path:
+            raise ValueError("sqlite_path is required for the sqlite query cache.")
+        cache_backend = SQLiteCacheBackend(sqlite_path, max_entries=max_entries)
+    elif backend == "redis":
+        if not redis_url:
+            raise ValueError("redis_url is required for the redis query cache.")
+        cache_backend = RedisCacheBackend(redis_url)
+    else:
+        raise ValueError(f"Unsupported query cache backend: {backend}")
+    return QueryResultCache(
+        cache_backend,
+        default_ttl_seconds=default_ttl_seconds,
+        volatile_ttl_seconds=volatile_ttl_seconds,
+    )
@@ -0,0 +1,239 @@
+"""
+query_results.py
+This file contains the streaming result abstraction of the query tools.
+A result stream iterates over the rows of a query result one page at a time, either through the
+Flipside result pages or with fetchmany() on a SQLAlchemy cursor, so the full result set is never held in memory.
+
+The results can also be delivered in the columnar Apache Arrow IPC or Parquet formats, which requires the optional pyarrow package.
+"""
+import json
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import text
+
+from chatweb3.utils import convert_rows_to_serializable
+from config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+ARROW_MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+class FlipsideResultStream:
+    def __init__(
+        self,
+        flipside,
+        sql: str,
+        page_size: int = 1000,
+        run_query: Optional[Callable] = None,
+        **query_kwargs,
+    ):
+        """
+        flipside: the Flipside client, used to fetch the pages after the first one
+        run_query: runs the query and returns its first page, defaults to flipside.query
+        query_kwargs: passed to run_query, e.g., timeout_minutes
+        """
+        self.flipside = flipside
+        self.sql = sql
+        self.page_size = page_size
+        self.run_query = run_query or flipside.query
+        self.query_kwargs = query_kwargs
+        self.query_id: Optional[str] = None
+        self.columns: Optional[List[str]] = None
+        self.total_rows: Optional[int] = None
+        self.total_pages: Optional[int] = None
+        self._first_page: Optional[List[Any]] = None
+
+    def start(self) -> "FlipsideResultStream":
+        """Run the query and fetch the first page of its results."""
+        if self._first_page is None:
+            result_set = self.run_query(
+                self.sql, page_size=self.page_size, page_number=1, **self.query_kwargs
+            )
+            self.query_id = result_set.query_id
+            self.columns = result_set.columns
+            self._first_page = result_set.rows or []
+            if result_set.page is not None:
+                self.total_rows = result_set.page.totalRows
+                self.total_pages = result_set.page.totalPages
+            else:
+                self.total_rows = len(self._first_page)
+                self.total_pages = 1
+        return self
+
+    def iter_pages(self, serializable: bool = True) -> Iterator[List[Any]]:
+        """Yield the result rows one page at a time. The Flipside rows are always JSON serializable."""
+        self.start()
+        yield self._first_page or []
+        for page_number in range(2, (self.total_pages or 1) + 1):
+            result_set = self.flipside.get_query_results(
+                self.query_id, page_number=page_number, page_size=self.page_size
+            )
+            yield result_set.rows or []
+
+    def __iter__(self) -> Iterator[Any]:
+        for page in self.iter_pages():
+            yield from page
+
+    def close(self):
+        pass
+
+
+class SQLAlchemyResultStream:
+    def __init__(self, sql_database, command: str, page_size: int = 1000):
+        """
+        sql_database: the SnowflakeDatabase to run the command on
+        """
+        self.sql_database = sql_database
+        self.command = command
+        self.page_size = page_size
+        self.columns: Optional[List[str]] = None
+        # only known once the stream is exhausted
+        self.total_rows: Optional[int] = None
+        self._connection = None
+        self._result = None
+
+    def start(self) -> "SQLAlchemyResultStream":
+        """Execute the command, keeping the connection open until the rows are consumed or the stream is closed."""
+        if self._result is None:
+            self._connection = self.sql_database._engine.connect()
+            try:
+                self.sql_database._set_schema(self._connection)
+                self.sql_database._track_schema_change(self._connection, self.command)
+                self._result = self._connection.execution_options(
+                    stream_results=True
+                ).execute(text(self.command))
+                self.columns = (
+                    list(self._result.keys()) if self._result.returns_rows else []
+                )
+            except Exception:
+                self.close()
+                raise
+        return self
+
+    def iter_pages(self, serializable: bool = True) -> Iterator[List[Any]]:
+        """Yield the result rows one page at a time.
+        serializable: convert the datetime and Decimal values with convert_rows_to_serializable()
+        """
+        self.start()
+        row_count = 0
+        try:
+            while self._result.returns_rows:
+                rows = self._result.fetchmany(self.page_size)
+                if not rows:
+                    break
+                row_count += len(rows)
+                yield (
+                    convert_rows_to_serializable(rows)
+                    if serializable
+                    else [tuple(row) for row in rows]
+                )
+            self.total_rows = row_count
+        finally:
+            self.close()
+
+    def __iter__(self) -> Iterator[Any]:
+        for page in self.iter_pages():
+            yield from page
+
+    def close(self):
+        if self._result is not None:
+            self._result.close()
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def preview_result_stream(stream, max_rows: int) -> Dict[str, Any]:
+    """Return the first max_rows rows of a result stream along with the total row count.
+    Rows past the preview are counted and dropped; pages are not fetched at all when the stream knows its total up front.
+    """
+    rows: List[Any] = []
+    row_count = 0
+    try:
+        for page in stream.iter_pages():
+            rows.extend(page[: max_rows - len(rows)])
+            row_count += len(page)
+            if len(rows) >= max_rows and stream.total_rows is not None:
+                row_count = stream.total_rows
+                break
+    finally:
+        stream.close()
+    return {
+        "columns": stream.columns,
+        "rows": rows,
+        "row_count": row_count,
+        "truncated": row_count > len(rows),
+    }
+
+
+def iter_ndjson(stream) -> Iterator[str]:
+    """Yield the rows of a result stream as newline-delimited JSON objects keyed on the column names."""
+    try:
+        stream.start()
+        columns = stream.columns or []
+        for page in stream.iter_pages():
+            yield "".join(
+                json.dumps(dict(zip(columns, row)), default=str) + "\n" for row in page
+            )
+    finally:
+        stream.close()
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ValueError(
+            "Could not import pyarrow python package. "
+            "Please install it with `pip install pyarrow`."
+        )
+    return pyarrow
+
+
+def rows_to_arrow_table(columns: List[str], rows: List[Any]):
+    """Build an Arrow table from result rows, converting each column in one call.
+    The datetime, date and Decimal values keep their types as Arrow timestamp, date and decimal columns.
+    """
+    pa = _import_pyarrow()
+    if rows:
+        arrays = [pa.array(column) for column in zip(*rows)]
+    else:
+        arrays = [pa.array([], type=pa.null()) for _ in columns]
+    return pa.Table.from_arrays(arrays, names=list(columns))
+
+
+def result_stream_to_arrow(stream):
+    """Build an Arrow table from all the pages of a result stream, one record batch per page."""
+    pa = _import_pyarrow()
+    stream.start()
+    columns = stream.columns or []
+    tables = [
+        rows_to_arrow_table(columns, page)
+        for page in stream.iter_pages(serializable=False)
+        if page
+    ]
+    if not tables:
+        return rows_to_arrow_table(columns, [])
+    # the pages are typed independently: widen the types that differ across pages, e.g., an all null column
+    # or decimals of different precisions
+    return pa.concat_tables(tables, promote_options="permissive")
+
+
+def arrow_table_to_bytes(table, result_format: str) -> bytes:
+    """Serialize an Arrow table in the "arrow" (IPC stream) or "parquet" format."""
+    pa = _import_pyarrow()
+    sink = pa.BufferOutputStream()
+    if result_format == "arrow":
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    elif result_format == "parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, sink)
+    else:
+        raise ValueError(f"Unsupported result format: {result_format}")
+    return sink.getvalue().to_pybytes()
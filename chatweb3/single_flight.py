@@ -0,0 +1,68 @@
+"""
+single_flight.py
+This file contains a single-flight coordinator: concurrent callers asking for the same key
+share one in-flight execution of the function and all receive its result (or its exception).
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executions = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn() unless a call with the same key is already in flight, in which case wait for and return its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            logger.debug(f"Waiting for the in-flight call of {key=}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # later callers start a new execution instead of reusing this result
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "executions": self.executions,
+            "shared": self.shared,
+            "in_flight": self.in_flight(),
+        }
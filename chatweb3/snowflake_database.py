@@ -1,19 +1,38 @@
 # %%
 import logging
-from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+import os
+import re
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 from flipside import Flipside
 from langchain.sql_database import SQLDatabase
 from shroomdk import ShroomDK
-from sqlalchemy import MetaData, create_engine, text
+from sqlalchemy import MetaData, Table, inspect, text
 from sqlalchemy.engine import Engine
 
 # from sqlalchemy.engine.cursor import LegacyCursorResult
 from sqlalchemy.engine.cursor import CursorResult
 from sqlalchemy.engine.row import Row
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import InvalidRequestError, SQLAlchemyError
 from sqlalchemy.schema import CreateTable
 
+from chatweb3.engine_registry import engine_registry
+from chatweb3.query_cache import canonicalize_sql
+from chatweb3.single_flight import SingleFlight
+from chatweb3.tools.executor import map_in_metadata_executor
 from config.logging_config import get_logger
 
 logger = get_logger(__name__)
@@ -21,6 +40,29 @@ logger = get_logger(__name__)
 #     __name__, log_level=logging.DEBUG, log_to_console=True, log_to_file=True
 # )
 
+# metadata parsers pinned per SnowflakeContainer for the current agent run, see pinned_metadata_parsers()
+_pinned_metadata_parsers: ContextVar[Optional[Dict[int, Any]]] = ContextVar(
+    "pinned_metadata_parsers", default=None
+)
+
+
+@contextmanager
+def pinned_metadata_parsers():
+    """Pin the metadata parser of every SnowflakeContainer at its first use within the block.
+    A metadata reload during the block is then only seen by later runs, so an agent run works on one consistent index.
+    """
+    token = _pinned_metadata_parsers.set({})
+    try:
+        yield
+    finally:
+        _pinned_metadata_parsers.reset(token)
+
+
+# key of the schema a pooled connection is on, in its connection.info
+CURRENT_SCHEMA_INFO_KEY = "chatweb3_current_schema"
+# statements that may move the session to another schema, e.g., USE SCHEMA or USE DATABASE
+SESSION_SCHEMA_CHANGE_PATTERN = re.compile(r"\buse\s", re.IGNORECASE)
+
 
 class SnowflakeDatabase(SQLDatabase):
     def __init__(
@@ -35,11 +77,33 @@ class SnowflakeDatabase(SQLDatabase):
         indexes_in_table_info: bool = False,
         custom_table_info: Optional[dict] = None,
         view_support: bool = True,
+        lazy_reflection: bool = False,
+        usable_table_names: Optional[Callable[[], Iterable[str]]] = None,
     ):
         """
         We make schema a required parameter for SnowflakeDatabase, because we know it is needed for our databases.
         We also make view_support required and default to True, because we know it is needed for our databases.
+
+        lazy_reflection: skip reflecting the whole schema up front, each table is reflected on its first use and kept
+        usable_table_names: with lazy_reflection, returns the usable table names, e.g., from the local metadata index,
+            so they are not listed from the database. The database is listed if it returns no names.
         """
+        self._lazy_reflection = lazy_reflection
+        self._reflection_lock = threading.Lock()
+        if lazy_reflection:
+            self._init_lazy(
+                engine=engine,
+                schema=schema,
+                metadata=metadata,
+                ignore_tables=ignore_tables,
+                include_tables=include_tables,
+                sample_rows_in_table_info=sample_rows_in_table_info,
+                indexes_in_table_info=indexes_in_table_info,
+                custom_table_info=custom_table_info,
+                view_support=view_support,
+                usable_table_names=usable_table_names,
+            )
+            return
 
         super().__init__(
             engine=engine,
@@ -53,6 +117,120 @@ class SnowflakeDatabase(SQLDatabase):
             view_support=view_support,
         )
 
+    def _init_lazy(
+        self,
+        engine: Engine,
+        schema: str,
+        metadata: Optional[MetaData],
+        ignore_tables: Optional[List[str]],
+        include_tables: Optional[List[str]],
+        sample_rows_in_table_info: int,
+        indexes_in_table_info: bool,
+        custom_table_info: Optional[dict],
+        view_support: bool,
+        usable_table_names: Optional[Callable[[], Iterable[str]]],
+    ):
+        """Set the attributes SQLDatabase.__init__ sets, without listing or reflecting the tables of the schema."""
+        if include_tables and ignore_tables:
+            raise ValueError("Cannot specify both include_tables and ignore_tables")
+        if not isinstance(sample_rows_in_table_info, int):
+            raise TypeError("sample_rows_in_table_info must be an integer")
+        self._engine = engine
+        self._schema = schema
+        self._inspector = inspect(engine)
+        self._include_tables = set(include_tables) if include_tables else set()
+        self._ignore_tables = set(ignore_tables) if ignore_tables else set()
+        self._sample_rows_in_table_info = sample_rows_in_table_info
+        self._indexes_in_table_info = indexes_in_table_info
+        self._custom_table_info = custom_table_info
+        self._max_string_length = 300
+        self._metadata = metadata or MetaData()
+        self._view_support = view_support
+        self._usable_table_names = usable_table_names
+        # the table names listed from the database, only when usable_table_names has none
+        self._all_tables: Optional[set] = None  # type: ignore[assignment]
+
+    def get_usable_table_names(self) -> Iterable[str]:
+        if not self._lazy_reflection:
+            return super().get_usable_table_names()
+        if self._include_tables:
+            return sorted(self._include_tables)
+        table_names = (
+            set(self._usable_table_names()) if self._usable_table_names else set()
+        )
+        if not table_names:
+            with self._reflection_lock:
+                if self._all_tables is None:
+                    self._all_tables = set(
+                        self._inspector.get_table_names(schema=self._schema)
+                        + (
+                            self._inspector.get_view_names(schema=self._schema)
+                            if self._view_support
+                            else []
+                        )
+                    )
+            table_names = self._all_tables
+        return sorted(table_names - self._ignore_tables)
+
+    def _ensure_reflected(self, table_names: Iterable[str]) -> None:
+        """Reflect the given tables that are not reflected yet, with lazy_reflection."""
+        if not self._lazy_reflection:
+            return
+        with self._reflection_lock:
+            missing_tables = [
+                table_name
+                for table_name in table_names
+                if f"{self._schema}.{table_name}" not in self._metadata.tables
+            ]
+            if not missing_tables:
+                return
+            logger.debug(f"Reflecting {missing_tables} of schema {self._schema}")
+            try:
+                self._metadata.reflect(
+                    views=self._view_support,
+                    bind=self._engine,
+                    only=missing_tables,
+                    schema=self._schema,
+                )
+            except InvalidRequestError as e:
+                # e.g., a table of the local index that is not in the database
+                raise ValueError(f"Error reflecting tables {missing_tables}: {e}")
+
+    def get_table_info(self, table_names: Optional[List[str]] = None) -> str:
+        self._ensure_reflected(
+            table_names if table_names is not None else self.get_usable_table_names()
+        )
+        return super().get_table_info(table_names)
+
+    def _set_schema(self, connection) -> None:
+        if self._schema is not None:
+            # Set the session-level default schema
+
+            if self.dialect == "snowflake":
+                # USE SCHEMA holds for the whole Snowflake session and is not undone by a rollback,
+                # so it is only sent when the pooled connection is not already on the schema.
+                # connection.info lives as long as the DBAPI connection, across pool checkouts.
+                if connection.info.get(CURRENT_SCHEMA_INFO_KEY) == self._schema:
+                    return
+                set_schema_command = f"USE SCHEMA {self._schema}"
+                connection.execute(text(set_schema_command))
+                connection.info[CURRENT_SCHEMA_INFO_KEY] = self._schema
+            else:
+                connection.exec_driver_sql(f"SET search_path TO {self._schema}")
+
+    @staticmethod
+    def _track_schema_change(connection, command: str) -> None:
+        """Forget the schema of the connection if the command may have changed it."""
+        if SESSION_SCHEMA_CHANGE_PATTERN.search(command):
+            connection.info.pop(CURRENT_SCHEMA_INFO_KEY, None)
+
+    def run_stream(self, command: str, page_size: int = 1000):
+        """Execute a SQL command and return a SQLAlchemyResultStream fetching its rows page_size at a time."""
+        # delay import to avoid circular import
+        from chatweb3.query_results import SQLAlchemyResultStream
+
+        return SQLAlchemyResultStream(self, command, page_size=page_size)
+
     def run(  # type: ignore
         self, command: str, fetch: str = "all", return_string: bool = True
     ) -> Union[str, CursorResult]:
@@ -64,14 +242,8 @@ class SnowflakeDatabase(SQLDatabase):
         # logger.debug(f"Entering run with command: {command}")
 
         with self._engine.begin() as connection:
-            if self._schema is not None:
-                # Set the session-level default schema
-
-                if self.dialect == "snowflake":
-                    set_schema_command = f"USE SCHEMA {self._schema}"
-                    connection.execute(text(set_schema_command))
-                else:
-                    connection.exec_driver_sql(f"SET search_path TO {self._schema}")
+            self._set_schema(connection)
+            self._track_schema_change(connection, command)
 
             cursor: CursorResult = connection.execute(text(command))
 
@@ -120,43 +292,9 @@ class SnowflakeDatabase(SQLDatabase):
         We duplicate the parent method here to avoid having to modify the parent method.
         """
         try:
-            all_table_names = self.get_usable_table_names()
-            if table_names is not None:
-                missing_tables = set(table_names).difference(all_table_names)
-                if missing_tables:
-                    raise ValueError(
-                        f"table_names {missing_tables} not found in database"
-                    )
-                all_table_names = table_names
-
-            meta_tables = [
-                tbl
-                for tbl in self._metadata.sorted_tables
-                if tbl.name in set(all_table_names)
-                and not (self.dialect == "sqlite" and tbl.name.startswith("sqlite_"))
-            ]
-
-            tables = []
-            for table in meta_tables:
-                if self._custom_table_info and table.name in self._custom_table_info:
-                    tables.append(self._custom_table_info[table.name])
-                    continue
-
-                # add create table command
-                create_table = str(CreateTable(table).compile(self._engine))
-                table_info = f"{create_table.rstrip()}"
-                has_extra_info = (
-                    self._indexes_in_table_info or self._sample_rows_in_table_info
-                )
-                if has_extra_info:
-                    table_info += "\n\n/*"
-                if self._indexes_in_table_info:
-                    table_info += f"\n{self._get_table_indexes(table)}\n"
-                if self._sample_rows_in_table_info:
-                    table_info += f"\n{self._get_sample_rows(table)}\n"
-                if has_extra_info:
-                    table_info += "*/"
-                tables.append(table_info)
+            meta_tables = self.get_meta_tables(table_names)
+            # the tables are reflected and sampled concurrently, each on its own pooled connection
+            tables = map_in_metadata_executor(self.get_single_table_info, meta_tables)
             if as_dict:
                 return {
                     table.name: table_info
@@ -172,6 +310,46 @@ class SnowflakeDatabase(SQLDatabase):
             else:
                 return f"Error: {e}"
 
+    def get_meta_tables(self, table_names: Optional[List[str]] = None) -> List[Table]:
+        """Return the reflected tables of the given table names, or of all usable tables.
+        Raises a ValueError if a table is not found in the database.
+        """
+        all_table_names = self.get_usable_table_names()
+        if table_names is not None:
+            missing_tables = set(table_names).difference(all_table_names)
+            if missing_tables:
+                raise ValueError(f"table_names {missing_tables} not found in database")
+            all_table_names = table_names
+        self._ensure_reflected(all_table_names)
+
+        # the lock keeps a concurrent lazy reflection from changing the metadata while it is read
+        with self._reflection_lock:
+            return [
+                tbl
+                for tbl in self._metadata.sorted_tables
+                if tbl.name in set(all_table_names)
+                and not (self.dialect == "sqlite" and tbl.name.startswith("sqlite_"))
+            ]
+
+    def get_single_table_info(self, table: Table) -> str:
+        """Return the create table command of a reflected table, with its indexes and sample rows if enabled."""
+        if self._custom_table_info and table.name in self._custom_table_info:
+            return self._custom_table_info[table.name]
+
+        # add create table command
+        create_table = str(CreateTable(table).compile(self._engine))
+        table_info = f"{create_table.rstrip()}"
+        has_extra_info = self._indexes_in_table_info or self._sample_rows_in_table_info
+        if has_extra_info:
+            table_info += "\n\n/*"
+        if self._indexes_in_table_info:
+            table_info += f"\n{self._get_table_indexes(table)}\n"
+        if self._sample_rows_in_table_info:
+            table_info += f"\n{self._get_sample_rows(table)}\n"
+        if has_extra_info:
+            table_info += "*/"
+        return table_info
+
 
 class SnowflakeContainer:
     def __init__(
@@ -183,6 +361,13 @@ class SnowflakeContainer:
         shroomdk_api_key: Optional[str] = None,
         local_index_file_path: Optional[str] = None,
         index_annotation_file_path: Optional[str] = None,
+        local_index_snapshot_file_path: Optional[str] = None,
+        local_index_drop_raw_metadata: bool = False,
+        local_index_shard_dir_path: Optional[str] = None,
+        local_index_max_resident_shards: int = 0,
+        query_cache=None,
+        engine_pool_kwargs: Optional[Dict[str, Any]] = None,
+        lazy_reflection: bool = False,
         verbose: bool = False,
     ):
         """Create a Snowflake container.
@@ -191,21 +376,37 @@ class SnowflakeContainer:
         These databases can be accessed via the (database, schema) key pair
         It can later append the database and schema to the URL to create a Snowflake db engine.
         """
-        # delay import to avoid circular import
-        from chatweb3.metadata_parser import MetadataParser
-
         self._user = user
         self._password = password
         self._account_identifier = account_identifier
         # Store SQLDatabase objects with (database, schema) as the key
         self._databases: Dict[str, SnowflakeDatabase] = {}
+        # get_database() is called from the metadata executor threads
+        self._databases_lock = threading.Lock()
         # Keep the dialect attribute for compatibility with SQLDatabase object
         self.dialect = "snowflake"
-        self.metadata_parser = MetadataParser(
-            file_path=local_index_file_path,
+        # pool_size, max_overflow, pool_timeout, pool_recycle and pool_pre_ping of the shared engines
+        self._engine_pool_kwargs = engine_pool_kwargs or {}
+        # reflect the tables of a schema on first use, listing them from the local index, see SnowflakeDatabase
+        self._lazy_reflection = lazy_reflection
+        self._metadata_parser_kwargs = dict(
+            # a shard directory takes precedence over the monolithic index file
+            file_path=local_index_file_path
+            if local_index_shard_dir_path is None
+            else None,
             annotation_file_path=index_annotation_file_path,
             verbose=verbose,
+            snapshot_file_path=local_index_snapshot_file_path,
+            drop_raw_metadata=local_index_drop_raw_metadata,
+            shard_dir_path=local_index_shard_dir_path,
+            max_resident_shards=local_index_max_resident_shards,
         )
+        self.metadata_parser = self.build_metadata_parser()
+        self.metadata_reloader = None
+        # the QueryResultCache of the query database tool, None disables caching
+        self.query_cache = query_cache
+        # shares one in-flight Flipside query run among concurrent callers of the same query
+        self.single_flight = SingleFlight()
         self._flipside = (
             Flipside(flipside_api_key) if flipside_api_key is not None else None
         )
@@ -213,6 +414,49 @@ class SnowflakeContainer:
             ShroomDK(shroomdk_api_key) if shroomdk_api_key is not None else None
         )
 
+    @property
+    def metadata_parser(self):
+        pinned = _pinned_metadata_parsers.get()
+        if pinned is None:
+            return self._metadata_parser
+        return pinned.setdefault(id(self), self._metadata_parser)
+
+    @metadata_parser.setter
+    def metadata_parser(self, metadata_parser):
+        self._metadata_parser = metadata_parser
+
+    def build_metadata_parser(self):
+        """Build a new MetadataParser from the local index files of this container."""
+        # delay import to avoid circular import
+        from chatweb3.metadata_parser import MetadataParser
+
+        return MetadataParser(**self._metadata_parser_kwargs)
+
+    def metadata_file_paths(self) -> List[str]:
+        """Return the files the local index is built from."""
+        # delay import to avoid circular import
+        from chatweb3.metadata_shards import MANIFEST_FILE_NAME
+
+        kwargs = self._metadata_parser_kwargs
+        file_paths = [kwargs["file_path"], kwargs["annotation_file_path"]]
+        if kwargs["shard_dir_path"] is not None:
+            file_paths.append(
+                os.path.join(kwargs["shard_dir_path"], MANIFEST_FILE_NAME)
+            )
+        return [path for path in file_paths if path]
+
+    def start_metadata_reloader(self, interval_seconds: float):
+        """Start polling the local index files and swap in a rebuilt index when they change."""
+        # delay import to avoid circular import
+        from chatweb3.metadata_reloader import MetadataReloader
+
+        if self.metadata_reloader is None:
+            self.metadata_reloader = MetadataReloader(
+                self, self.metadata_file_paths(), interval_seconds
+            )
+        self.metadata_reloader.start()
+        return self.metadata_reloader
+
     @property
     def flipside(self):
         if self._flipside is None:
@@ -221,6 +465,46 @@ class SnowflakeContainer:
             )
         return self._flipside
 
+    def flipside_query(self, query: str, **kwargs):
+        """Run a Flipside query, see Flipside.query().
+        Concurrent callers with the same canonical query and arguments share one query run and its result set.
+        """
+        key = (canonicalize_sql(query), tuple(sorted(kwargs.items())))
+        return self.single_flight.do(key, lambda: self.flipside.query(query, **kwargs))
+
+    def stream_query(
+        self,
+        database: str,
+        schema: str,
+        query: str,
+        mode: str = "default",
+        page_size: int = 1000,
+        **kwargs,
+    ):
+        """Return a result stream of the query, iterating over the result pages instead of fetching the full result set.
+        mode: "flipside" pages through the Flipside query results, "snowflake" fetches from the Snowflake cursor,
+        "default" uses flipside if its API key is set and snowflake otherwise.
+        kwargs are passed to Flipside.query(), e.g., timeout_minutes.
+        """
+        # delay import to avoid circular import
+        from chatweb3.query_results import FlipsideResultStream
+
+        if mode == "default":
+            mode = "flipside" if self._flipside is not None else "snowflake"
+        if mode == "flipside":
+            return FlipsideResultStream(
+                self.flipside,
+                query,
+                page_size=page_size,
+                run_query=self.flipside_query,
+                **kwargs,
+            )
+        if mode == "snowflake":
+            return self.get_database(database, schema).run_stream(
+                query, page_size=page_size
+            )
+        raise ValueError(f"Streaming is not supported in mode: {mode}")
+
     @property
     def shroomdk(self):
         if self._shroomdk is None:
@@ -239,12 +523,13 @@ class SnowflakeContainer:
             f"snowflake://{self._user}:{self._password}@{self._account_identifier}/"
         )
         engine_url += f"{database}/"
-        engine = create_engine(
+        # engines are shared process-wide per database, the schemas are views over the same pool
+        engine = engine_registry.get_engine(
             engine_url,
             connect_args={
                 "client_session_keep_alive": True,
             },
-            # echo=True,
+            **self._engine_pool_kwargs,
         )
         logger.debug(f"to return {engine=}")
         return engine
@@ -252,12 +537,23 @@ class SnowflakeContainer:
     def get_database(self, database: str, schema: str) -> SnowflakeDatabase:
         key = f"{database}.{schema}"
 
-        if key in self._databases:
-            return self._databases[key]
-        else:
+        snowflake_database = self._databases.get(key)
+        if snowflake_database is not None:
+            return snowflake_database
+        with self._databases_lock:
+            # another thread may have created it while this one waited for the lock
+            if key in self._databases:
+                return self._databases[key]
             try:
                 engine = self._create_engine(database)
-                snowflake_database = SnowflakeDatabase(engine=engine, schema=schema)
+                snowflake_database = SnowflakeDatabase(
+                    engine=engine,
+                    schema=schema,
+                    lazy_reflection=self._lazy_reflection,
+                    usable_table_names=lambda: self._get_indexed_table_names(
+                        database, schema
+                    ),
+                )
                 logger.debug(f"Created {snowflake_database=}")
                 # sql_database = SQLDatabase(engine=engine, schema=schema)
                 self._databases[key] = snowflake_database
@@ -267,6 +563,15 @@ class SnowflakeContainer:
                     f"Error getting snowflake database for {key}: {str(e)}"
                 )
 
+    def _get_indexed_table_names(self, database: str, schema: str) -> List[str]:
+        """Return the names of the tables of the schema in the local metadata index."""
+        return [
+            table.name
+            for table in self.metadata_parser.get_tables_from_database_schema_table_names(
+                database, schema
+            )
+        ]
+
     def run_no_throw(
         self,
         command: str,
@@ -0,0 +1,307 @@
+"""
+sql_validation.py
+This file contains the local static checker of the Snowflake queries written by the agent.
+A query is parsed with sqlglot against the Snowflake dialect and its tables and columns are looked up in the MetadataParser index.
+A clean query does not need the LLM query checker; a flagged query, or any query when the optional sqlglot package
+is not installed, still goes through it.
+
+The column validator resolves the table and column references of a query against the columns of the indexed tables,
+so that a query using a non-existent column is rejected before it takes a remote query slot.
+"""
+import difflib
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def _import_sqlglot():
+    try:
+        import sqlglot
+    except ImportError:
+        raise ValueError(
+            "Could not import sqlglot python package. "
+            "Please install it with `pip install sqlglot`."
+        )
+    return sqlglot
+
+
+def check_query_statically(query: str, metadata_parser=None) -> List[str]:
+    """Return the issues found in the query, an empty list meaning the query is clean.
+    Besides syntax errors, unknown tables and columns, and column references that cannot be resolved against the index,
+    the constructs the LLM query checker is asked to review (NOT IN, UNION, BETWEEN, INTERVAL, functions unknown to sqlglot)
+    are flagged, so those queries still get reviewed.
+    """
+    try:
+        sqlglot = _import_sqlglot()
+    except ValueError as e:
+        return [str(e)]
+    from sqlglot import exp
+    from sqlglot.errors import SqlglotError
+
+    try:
+        statements = [
+            statement
+            for statement in sqlglot.parse(query, read="snowflake")
+            if statement is not None
+        ]
+    except SqlglotError as e:
+        return [f"Syntax error: {e}"]
+    if len(statements) != 1:
+        return [f"Expected exactly one statement, got {len(statements)}"]
+    tree = statements[0]
+    if not isinstance(tree, (exp.Select, exp.Union)):
+        return [f"Not a SELECT query: {tree.key.upper()}"]
+
+    issues = []
+    # sqlglot turns NOT IN (subquery) into <> ALL (subquery)
+    if any(tree.find_all(exp.All)) or any(
+        isinstance(node.this, exp.In) for node in tree.find_all(exp.Not)
+    ):
+        issues.append("NOT IN needs review")
+    if any(node.args.get("distinct") for node in tree.find_all(exp.Union)):
+        issues.append("UNION needs review")
+    if any(tree.find_all(exp.Between)):
+        issues.append("BETWEEN needs review")
+    if any(tree.find_all(exp.Interval)):
+        issues.append("INTERVAL needs review")
+    for function in tree.find_all(exp.Anonymous):
+        issues.append(f"Unknown function: {function.name}")
+
+    cte_names = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+    for table in tree.find_all(exp.Table):
+        if not isinstance(table.this, exp.Identifier):
+            issues.append(f"Table expression needs review: {table.sql('snowflake')}")
+        elif not table.db and table.name.lower() in cte_names:
+            continue
+        elif not (table.catalog and table.db):
+            issues.append(
+                f"Table {table.name} is not qualified as database.schema.table"
+            )
+        elif metadata_parser is None:
+            issues.append("No metadata index to look up the tables")
+        else:
+            table_long_name = f"{table.catalog}.{table.db}.{table.name}".lower()
+            if metadata_parser.get_table_by_long_name(table_long_name) is None:
+                issues.append(f"Table {table_long_name} not found in the index")
+    if metadata_parser is not None and not issues:
+        # the tables resolve, their columns must too
+        try:
+            column_errors, unresolved = _check_column_references(tree, metadata_parser)
+        except SqlglotError as e:
+            column_errors, unresolved = [f"Column references need review: {e}"], 0
+        issues.extend(column_errors)
+        if unresolved:
+            issues.append(
+                f"{unresolved} column reference(s) could not be resolved, needs review"
+            )
+    # the same issue may be found several times
+    return list(dict.fromkeys(issues))
+
+
+def _source_columns(source, metadata_parser) -> Optional[Set[str]]:
+    """Return the column names of a FROM/JOIN source of a scope, or None if they are not known.
+    The source is a table, looked up in the index, or a subquery/CTE whose output columns are named,
+    by the column list of its alias (sub(cnt), WITH c(d, n) AS ...) or by its select expressions.
+    """
+    from sqlglot import exp
+    from sqlglot.optimizer.scope import Scope
+
+    if isinstance(source, exp.Table):
+        if not (source.catalog and source.db) or metadata_parser is None:
+            return None
+        table = metadata_parser.get_table_by_long_name(_table_long_name(source))
+        return set(table.columns) if table is not None else None
+    if not isinstance(source, Scope):
+        return None
+    parent = source.expression.parent
+    table_alias = (
+        parent.args.get("alias")
+        if isinstance(parent, (exp.Subquery, exp.CTE))
+        else None
+    )
+    if table_alias is not None and table_alias.columns:
+        return {column.name.lower() for column in table_alias.columns}
+    if isinstance(source.expression, exp.Select):
+        if any(select.is_star for select in source.expression.selects):
+            return None
+        names = [name.lower() for name in source.expression.named_selects]
+        # an expression without an alias, e.g., COUNT(*), gets a name only the database knows
+        if not all(names):
+            return None
+        return set(names)
+    return None
+
+
+def _table_long_name(table) -> str:
+    return f"{table.catalog}.{table.db}.{table.name}".lower()
+
+
+def _describe_source(alias: str, source) -> str:
+    from sqlglot import exp
+
+    if isinstance(source, exp.Table):
+        table_long_name = _table_long_name(source)
+        return (
+            table_long_name
+            if alias.lower() == source.name.lower()
+            else f"{table_long_name} (alias {alias})"
+        )
+    return f"subquery {alias}"
+
+
+def _column_not_found(column_name: str, source_description: str, columns: Set[str]):
+    message = f"Column '{column_name}' does not exist in {source_description}."
+    close_matches = difflib.get_close_matches(column_name, columns, n=3)
+    if close_matches:
+        message += f" Did you mean {', '.join(repr(name) for name in close_matches)}?"
+    return message + f" Available columns: {', '.join(sorted(columns))}."
+
+
+def validate_query_columns(query: str, metadata_parser) -> List[str]:
+    """Return an error message for every column reference of the query that does not resolve.
+    Only the references that can be resolved with certainty are checked: the columns of tables missing from the index,
+    of table functions or of subqueries selecting *, and queries sqlglot cannot parse, are left to the database.
+    The check is skipped when the optional sqlglot package is not installed.
+    """
+    try:
+        sqlglot = _import_sqlglot()
+    except ValueError:
+        return []
+    from sqlglot.errors import SqlglotError
+
+    try:
+        tree = sqlglot.parse_one(query, read="snowflake")
+        errors, _ = _check_column_references(tree, metadata_parser)
+    except SqlglotError as e:
+        logger.debug(f"Skipping the column validation of {query=}: {e}")
+        return []
+    return errors
+
+
+def _check_column_references(tree, metadata_parser) -> Tuple[List[str], int]:
+    """Return the error messages of the column references of a parsed query that do not resolve,
+    along with the number of references that could not be resolved with certainty, see validate_query_columns().
+    """
+    from sqlglot import exp
+    from sqlglot.optimizer.scope import traverse_scope
+
+    scopes = traverse_scope(tree)
+    errors = []
+    unresolved = 0
+    # the columns of a scope also include those of its subqueries, which traverse_scope() yields first:
+    # each column is checked once, in the innermost scope it appears in, against the sources of that scope
+    checked_columns: Set[int] = set()
+    for scope in scopes:
+        own_columns = [
+            column for column in scope.columns if id(column) not in checked_columns
+        ]
+        checked_columns.update(id(column) for column in own_columns)
+        sources = {
+            alias: (source, _source_columns(source, metadata_parser))
+            for alias, (_, source) in scope.selected_sources.items()
+        }
+        for column in own_columns:
+            column_name = column.name.lower()
+            if not column_name or column_name == "*":
+                continue
+            if column.table:
+                # the alias is a source of the scope, or of an enclosing scope (correlated subqueries)
+                enclosing_scope = scope
+                while (
+                    enclosing_scope is not None
+                    and column.table not in enclosing_scope.selected_sources
+                ):
+                    enclosing_scope = enclosing_scope.parent
+                if enclosing_scope is None:
+                    unresolved += 1
+                    continue
+                _, source = enclosing_scope.selected_sources[column.table]
+                columns = _source_columns(source, metadata_parser)
+                if columns is None:
+                    unresolved += 1
+                elif column_name not in columns:
+                    errors.append(
+                        _column_not_found(
+                            column_name, _describe_source(column.table, source), columns
+                        )
+                    )
+                continue
+            # an unqualified column may come from any source of the scope or of an enclosing scope (correlated
+            # subqueries), or be an alias of the select list
+            candidate_columns: Set[str] = set()
+            enclosing_scope = scope
+            while enclosing_scope is not None:
+                for alias, (_, source) in enclosing_scope.selected_sources.items():
+                    columns = _source_columns(source, metadata_parser)
+                    if columns is None:
+                        candidate_columns = None  # type: ignore[assignment]
+                        break
+                    candidate_columns |= columns
+                if candidate_columns is None:
+                    break
+                candidate_columns |= {
+                    select.alias.lower()
+                    for select in getattr(enclosing_scope.expression, "selects", [])
+                    if isinstance(select, exp.Alias)
+                }
+                enclosing_scope = enclosing_scope.parent
+            if candidate_columns is None or not sources:
+                unresolved += 1
+            elif column_name not in candidate_columns:
+                errors.append(
+                    _column_not_found(
+                        column_name,
+                        " or ".join(
+                            _describe_source(alias, source)
+                            for alias, (source, _) in sources.items()
+                        ),
+                        {
+                            name
+                            for _, columns in sources.values()
+                            for name in columns or ()
+                        },
+                    )
+                )
+    # the same column may be referenced several times
+    return list(dict.fromkeys(errors)), unresolved
+
+
+class QueryCheckerStats:
+    """Counts the queries that skipped the LLM query checker thanks to the static checker."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.llm_calls_avoided = 0
+        self.llm_calls = 0
+
+    def record(self, llm_call_avoided: bool):
+        with self._lock:
+            if llm_call_avoided:
+                self.llm_calls_avoided += 1
+            else:
+                self.llm_calls += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            checked = self.llm_calls_avoided + self.llm_calls
+            return {
+                "llm_calls_avoided": self.llm_calls_avoided,
+                "llm_calls": self.llm_calls,
+                "avoided_rate": self.llm_calls_avoided / checked if checked else 0.0,
+            }
+
+
+# the counters of the process, reported by the /query_cache_stats endpoint
+query_checker_stats = QueryCheckerStats()
+
+
+def static_check_passes(query: str, metadata_parser=None) -> bool:
+    """Return whether the query is clean for the static checker, recording whether the LLM checker is avoided."""
+    issues = check_query_statically(query, metadata_parser)
+    if issues:
+        logger.debug(f"Static query check flagged {issues} in {query=}")
+    query_checker_stats.record(llm_call_avoided=not issues)
+    return not issues
@@ -0,0 +1,71 @@
+"""
+executor.py
+This file contains the bounded thread pool the tools use to run their blocking work
+(Flipside polling, Snowflake queries, metadata lookups) off the asyncio event loop,
+and the bounded thread pool fetching the metadata of several tables from Snowflake at once.
+"""
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Iterable, List, Optional
+
+from config.config import agent_config
+
+TOOL_EXECUTOR_MAX_WORKERS = agent_config.get("tool.async_executor_max_workers") or 16
+METADATA_EXECUTOR_MAX_WORKERS = (
+    agent_config.get("tool.metadata_executor_max_workers") or 8
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_metadata_executor: Optional[ThreadPoolExecutor] = None
+_metadata_executor_lock = threading.Lock()
+
+
+def get_tool_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=TOOL_EXECUTOR_MAX_WORKERS,
+                thread_name_prefix="chatweb3-tool",
+            )
+        return _executor
+
+
+async def run_in_tool_executor(func: Callable, *args: Any, **kwargs: Any) -> Any:
+    """Await func(*args, **kwargs) run in the tool executor.
+    The call runs in a copy of the caller's context, so context variables such as the pinned metadata parsers carry over.
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        get_tool_executor(), partial(context.run, func, *args, **kwargs)
+    )
+
+
+def get_metadata_executor() -> ThreadPoolExecutor:
+    global _metadata_executor
+    with _metadata_executor_lock:
+        if _metadata_executor is None:
+            _metadata_executor = ThreadPoolExecutor(
+                max_workers=METADATA_EXECUTOR_MAX_WORKERS,
+                thread_name_prefix="chatweb3-metadata",
+            )
+        return _metadata_executor
+
+
+def map_in_metadata_executor(func: Callable, items: Iterable[Any]) -> List[Any]:
+    """Return [func(item) for item in items], calling func concurrently in the metadata executor.
+    The results are in the order of the items, and the first exception raised by a call is re-raised.
+    func must not itself wait on the metadata executor, or a saturated pool would deadlock.
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    executor = get_metadata_executor()
+    futures = [
+        executor.submit(contextvars.copy_context().run, func, item) for item in items
+    ]
+    return [future.result() for future in futures]
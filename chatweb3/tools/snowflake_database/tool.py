@@ -1,6 +1,7 @@
 import json
 import logging
 import re
+import time
 from typing import Any, Dict, List, Optional, Union
 
 from langchain.base_language import BaseLanguageModel
@@ -25,9 +26,13 @@ from langchain.tools.sql_database.tool import (
     QuerySQLDataBaseTool,
 )
 from pydantic import Field, root_validator
+from sqlalchemy.exc import SQLAlchemyError
 
+from chatweb3.query_results import preview_result_stream
 from chatweb3.snowflake_database import SnowflakeContainer
+from chatweb3.sql_validation import static_check_passes, validate_query_columns
 from chatweb3.tools.base import BaseToolInput
+from chatweb3.tools.executor import map_in_metadata_executor, run_in_tool_executor
 from chatweb3.tools.snowflake_database.prompt import SNOWFLAKE_QUERY_CHECKER
 from chatweb3.utils import parse_table_long_name_to_json_list  # parse_str_to_dict
 from config.config import agent_config
@@ -72,6 +77,20 @@ FLIPSIDE_QUERY_MAX_RETRIES = agent_config.get("flipside.query_max_retries")
 QUERY_DATABASE_TOOL_RETURN_DIRECT_IF_SUCCESSFUL = agent_config.get(
     "tool.query_database_tool_return_direct_if_successful"
 )  # noqa E501
+# the query database tool of the agent returns at most this many rows, with the total row count if there are more
+QUERY_DATABASE_TOOL_PREVIEW_ROWS = (
+    agent_config.get("tool.query_database_tool_preview_rows") or 100
+)
+# the page size used to fetch the full result of a query
+QUERY_DATABASE_TOOL_RESULT_PAGE_SIZE = 1000
+# skip the LLM query checker for the queries the static checker finds clean
+QUERY_CHECKER_STATIC_FAST_PATH = bool(
+    agent_config.get("tool.query_checker_static_fast_path")
+)
+# reject the queries referencing columns missing from the indexed tables before running them
+QUERY_DATABASE_TOOL_VALIDATE_COLUMNS = bool(
+    agent_config.get("tool.query_database_tool_validate_columns")
+)
 
 
 def handle_tool_error(error: ToolException) -> str:
@@ -222,12 +241,14 @@ class ListSnowflakeDatabaseTableNamesTool(ListSQLDatabaseTool):
 
         return ""  # this is a dummy return, just to make mypy happy
 
-    async def _arun(
+    async def _arun(  # type: ignore[override]
         self,
         tool_input: str = "",
         run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+        **kwargs,
     ) -> str:
-        raise NotImplementedError("ListSQLDatabaseNameTool does not support async")
+        """Run _run in the tool executor, off the event loop."""
+        return await run_in_tool_executor(self._run, tool_input=tool_input, **kwargs)
 
 
 class GetSnowflakeDatabaseTableMetadataTool(InfoSQLDatabaseTool):
@@ -255,7 +276,8 @@ class GetSnowflakeDatabaseTableMetadataTool(InfoSQLDatabaseTool):
                 {"database": "ethereum", "schema": "uniswapv3", "tables": ["ez_swaps", "ez_pools"]}
             ]"
 
-        Then iterate through the list and call self.db['database']['schema'].get_table_info_no_throw(tables)
+        Then get the databases of the groups, and the create table commands and sample rows of the tables of all groups,
+        concurrently in the metadata executor. The results are put back in the order of the groups and tables.
 
         Sample final output:
         "database_name.schema_name.table_name1: metadata1;\n database_name.schema_name.table_name2: metadata2;\n database_name.schema_name.table_name3: metadata3"
@@ -264,22 +286,56 @@ class GetSnowflakeDatabaseTableMetadataTool(InfoSQLDatabaseTool):
         logger.debug(
             f"Entering _get_metadata_from_snowflake with {input_table_json_list=}"
         )
+
+        def get_group_meta_tables(input_dict):
+            snowflake_database = self.db.get_database(
+                input_dict["database"], input_dict["schema"]
+            )
+            try:
+                return snowflake_database, snowflake_database.get_meta_tables(
+                    input_dict["tables"]
+                )
+            except ValueError as e:
+                # the error message replaces the metadata of the tables of the group
+                return snowflake_database, str(e)
+
+        # get the databases and reflect the tables of the groups concurrently
+        group_results = map_in_metadata_executor(
+            get_group_meta_tables, input_table_json_list
+        )
+        if not group_results:
+            # an empty batch has no metadata, and nothing to unpack below
+            return ""
+        snowflake_databases, group_meta_tables = zip(*group_results)
+        # fetch the tables of all groups in one batch, instead of one group after another
+        table_infos = iter(
+            map_in_metadata_executor(
+                lambda db_and_table: db_and_table[0].get_single_table_info(
+                    db_and_table[1]
+                ),
+                [
+                    (snowflake_database, table)
+                    for snowflake_database, meta_tables in zip(
+                        snowflake_databases, group_meta_tables
+                    )
+                    if not isinstance(meta_tables, str)
+                    for table in meta_tables
+                ],
+            )
+        )
+
         metadata_list = []
-        for input_dict in input_table_json_list:
+        for input_dict, meta_tables in zip(input_table_json_list, group_meta_tables):
             logging.debug(f"\n{input_dict=}")
             database, schema, tables = (
                 input_dict["database"],
                 input_dict["schema"],
                 input_dict["tables"],
             )
-            snowflake_database = self.db.get_database(database, schema)
-            # table_names = ", ".join(tables)
-            metadata = snowflake_database.get_table_info_no_throw(
-                table_names=tables, as_dict=True
-            )
-            assert isinstance(
-                metadata, dict
-            ), "Expected a dict from get_table_info_no_throw"  # make mypy happy
+            if isinstance(meta_tables, str):
+                metadata = {table_name: meta_tables for table_name in tables}
+            else:
+                metadata = {table.name: next(table_infos) for table in meta_tables}
 
             logger.debug(f"\n Retrieved {metadata=}")
 
@@ -350,11 +406,22 @@ class GetSnowflakeDatabaseTableMetadataTool(InfoSQLDatabaseTool):
 
         return ""  # dummy return, just to make mypy happy
 
+    async def _arun(  # type: ignore[override]
+        self,
+        table_names: str,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+        **kwargs,
+    ) -> str:
+        """Run _run in the tool executor, off the event loop."""
+        return await run_in_tool_executor(self._run, table_names=table_names, **kwargs)
+
 
 class QuerySnowflakeDatabaseTool(QuerySQLDataBaseTool):
     """Tool for querying a Snowflake database."""
 
     db: SnowflakeContainer = Field(exclude=True)  # type: ignore
+    # return at most this many rows along with the total row count, e.g., for the agent; None returns every row
+    preview_rows: Optional[int] = None
 
     name = QUERY_SNOWFLAKE_DATABASE_TOOL_NAME
     description = f"""
@@ -432,7 +499,7 @@ class QuerySnowflakeDatabaseTool(QuerySQLDataBaseTool):
         mode="default",
         run_manager: Optional[CallbackManagerForToolRun] = None,
         **kwargs,
-    ) -> Union[str, List[Any]]:
+    ) -> Union[str, List[Any], Dict[str, Any]]:
         """Execute the query, return the results or an error message."""
 
         if mode not in ["flipside", "shroomdk", "snowflake", "default"]:
@@ -452,29 +519,122 @@ class QuerySnowflakeDatabaseTool(QuerySQLDataBaseTool):
         schema = input_dict["schema"]
         query = input_dict["query"]
 
+        if QUERY_DATABASE_TOOL_VALIDATE_COLUMNS:
+            self._validate_columns(query)
+
+        query_cache = self.db.query_cache
+        # a preview and the full result of the same query are cached apart
+        cache_mode = (
+            mode
+            if self.preview_rows is None
+            else f"{mode}:preview_rows={self.preview_rows}"
+        )
+        if query_cache is not None:
+            hit, cached_result = query_cache.get(cache_mode, database, schema, query)
+            if hit:
+                if mode == "flipside":
+                    self._enable_return_direct_if_successful()
+                return cached_result
+
+        start_time = time.perf_counter()
+        result = self._execute_query(database, schema, query, mode)
+        if query_cache is not None and not (
+            isinstance(result, str) and result.startswith("Error")
+        ):
+            query_cache.set(
+                cache_mode,
+                database,
+                schema,
+                query,
+                result,
+                time.perf_counter() - start_time,
+            )
+        return result
+
+    def _validate_columns(self, query: str):
+        """Raise a ToolException listing the column references of the query missing from the local index."""
+        errors = validate_query_columns(query, self.db.metadata_parser)
+        if errors:
+            logger.debug(f"Rejected {query=} before execution: {errors}")
+            raise ToolException(
+                "The query was not run because it references columns that do not exist:\n"
+                + "\n".join(f"- {error}" for error in errors)
+                + "\nFix the column names using the table metadata and try again."
+            )
+
+    def _enable_return_direct_if_successful(self):
+        logger.debug(f"{self.return_direct=}")
+        # enable return_direct if the query was successful
+        if QUERY_DATABASE_TOOL_RETURN_DIRECT_IF_SUCCESSFUL and not self.return_direct:
+            self.return_direct = True
+            logger.debug(f"Updated {self.return_direct=}")
+
+    def _collect_rows(self, stream) -> Union[List[Any], Dict[str, Any]]:
+        """Return the rows of a result stream as a list.
+        With preview_rows set, only the first preview_rows rows are kept and the remaining ones are counted;
+        a truncated result is returned as a dict with its rows and total row count.
+        """
+        if self.preview_rows is None:
+            try:
+                return [row for page in stream.iter_pages() for row in page]
+            finally:
+                stream.close()
+        preview = preview_result_stream(stream, self.preview_rows)
+        if not preview["truncated"]:
+            return preview["rows"]
+        return {
+            "rows": preview["rows"],
+            "row_count": preview["row_count"],
+            "note": f"Showing the first {len(preview['rows'])} of {preview['row_count']} rows.",
+        }
+
+    def _flipside_rows(self, query: str, **kwargs) -> Union[List[Any], Dict[str, Any]]:
+        """Run the query on Flipside and return its rows, see _collect_rows().
+        For a preview, only the first result page is fetched.
+        """
+        stream = self.db.stream_query(
+            DEFAULT_DATABASE,
+            DEFAULT_SCHEMA,
+            query,
+            mode="flipside",
+            page_size=self.preview_rows or QUERY_DATABASE_TOOL_RESULT_PAGE_SIZE,
+            **kwargs,
+        )
+        return self._collect_rows(stream)
+
+    def _snowflake_rows(
+        self, database: str, schema: str, query: str
+    ) -> Union[str, List[Any], Dict[str, Any]]:
+        """Run the query on Snowflake and return its rows like _flipside_rows(), or the error message.
+        The rows are fetched one page at a time.
+        """
+        stream = self.db.get_database(database, schema).run_stream(
+            query, page_size=self.preview_rows or QUERY_DATABASE_TOOL_RESULT_PAGE_SIZE
+        )
+        try:
+            return self._collect_rows(stream)
+        except SQLAlchemyError as e:
+            """Format the error message"""
+            return f"Error: {e}"
+
+    def _execute_query(
+        self, database: str, schema: str, query: str, mode: str
+    ) -> Union[str, List[Any], Dict[str, Any]]:
+        """Execute the query in the given mode, bypassing the query cache."""
         if mode == "flipside":
             logger.debug(f"{mode=}, flipside {query=}")
-            result_flipside: List[Any] = []
+            result_flipside: Union[List[Any], Dict[str, Any]] = []
             for i in range(FLIPSIDE_QUERY_MAX_RETRIES):
                 try:
-                    result_set = self.db.flipside.query(
+                    result_flipside = self._flipside_rows(
                         query, timeout_minutes=FLIPSIDE_QUERY_TIMEOUT
                     )
-                    result_flipside = result_set.rows
                     logger.debug(
                         f"Flipside query attempt {i+1} successful: \
-                                  {result_set.rows=}"
+                                  {result_flipside=}"
                     )
 
-                    logger.debug(f"{self.return_direct=}")
-                    # enable return_direct if the query was successful
-
-                    if (
-                        QUERY_DATABASE_TOOL_RETURN_DIRECT_IF_SUCCESSFUL
-                        and not self.return_direct
-                    ):
-                        self.return_direct = True
-                        logger.debug(f"Updated {self.return_direct=}")
+                    self._enable_return_direct_if_successful()
 
                     break  # Exit the loop if the query was successful
 
@@ -530,9 +690,7 @@ class QuerySnowflakeDatabaseTool(QuerySQLDataBaseTool):
             return result_flipside
 
         if mode == "snowflake":
-            snowflake_database = self.db.get_database(database, schema)
-            result_snowflake = snowflake_database.run_no_throw(query)
-            assert isinstance(result_snowflake, str)
+            result_snowflake = self._snowflake_rows(database, schema, query)
             logger.debug(f"snowflake {result_snowflake=}")
             return result_snowflake
 
@@ -547,9 +705,8 @@ class QuerySnowflakeDatabaseTool(QuerySQLDataBaseTool):
             # try to use flipside first
             try:
                 logger.debug(f"{mode=}, flipside {query=}")
-                result_set = self.db.flipside.query(query)
-                logger.debug(f"flipside {result_set.rows=}")
-                result_flipside_default: List[Any] = result_set.rows
+                result_flipside_default = self._flipside_rows(query)
+                logger.debug(f"flipside {result_flipside_default=}")
                 return result_flipside_default
                 # logger.debug(f"{mode=}, shroomdk {query=}")
                 # result_set = self.db.shroomdk.query(query)
@@ -561,10 +718,7 @@ class QuerySnowflakeDatabaseTool(QuerySQLDataBaseTool):
             except Exception:
                 # if shroomdk fails, use snowflake
                 try:
-                    snowflake_database = self.db.get_database(database, schema)
-                    result_snowflake = snowflake_database.run_no_throw(query)
-                    assert isinstance(result_snowflake, str)
-                    return result_snowflake
+                    return self._snowflake_rows(database, schema, query)
                 except Exception:
                     raise Exception(
                         f"Unable to execute query {query=} on {database=}.{schema=} via either shroomdk or snowflake."
@@ -572,6 +726,15 @@ class QuerySnowflakeDatabaseTool(QuerySQLDataBaseTool):
 
         return ""  # dummy return, just to make mypy happy
 
+    async def _arun(  # type: ignore[override]
+        self,
+        *args,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+        **kwargs,
+    ) -> Union[str, List[Any], Dict[str, Any]]:
+        """Run _run in the tool executor, so a long Flipside query does not block the event loop."""
+        return await run_in_tool_executor(self._run, *args, **kwargs)
+
 
 class SnowflakeQueryCheckerTool(QuerySQLCheckerTool):
     """Use an LLM to check if a query is correct.
@@ -631,3 +794,26 @@ class SnowflakeQueryCheckerTool(QuerySQLCheckerTool):
 
 
         return values
+
+    def _run(
+        self,
+        query: str,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> str:
+        """Return a query the static checker finds clean as it is, otherwise use the LLM to check it."""
+        if QUERY_CHECKER_STATIC_FAST_PATH and static_check_passes(
+            query, self.db.metadata_parser
+        ):
+            return query
+        return super()._run(query=query, run_manager=run_manager)
+
+    async def _arun(
+        self,
+        query: str,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+    ) -> str:
+        if QUERY_CHECKER_STATIC_FAST_PATH and await run_in_tool_executor(
+            static_check_passes, query, self.db.metadata_parser
+        ):
+            return query
+        return await super()._arun(query=query, run_manager=run_manager)
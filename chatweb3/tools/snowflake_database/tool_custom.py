@@ -2,7 +2,7 @@
 tool_custom.py
 This file contains the custom tools for the snowflake_database toolkit.
 """
-from typing import Any, List, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
 from langchain.callbacks.manager import CallbackManagerForToolRun
 
@@ -84,7 +84,7 @@ class QueryDatabaseTool(QuerySnowflakeDatabaseTool):
         mode: str = QUERY_DATABASE_TOOL_MODE,
         run_manager: Optional[CallbackManagerForToolRun] = None,
         **kwargs,
-    ) -> Union[str, List[Any]]:
+    ) -> Union[str, List[Any], Dict[str, Any]]:
         return super()._run(*args, mode=mode, run_manager=run_manager, **kwargs)
 
 
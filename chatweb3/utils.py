@@ -3,6 +3,7 @@ utils.py
 This file contains the utility functions for the chatweb3 package.
 """
 import datetime
+import json
 import re
 import warnings
 from decimal import Decimal
@@ -166,21 +167,72 @@ def format_dict_to_string(d: dict) -> str:
     return ", ".join([f"{k}={v!r}" for k, v in d.items()])
 
 
+def _to_serializable(item):
+    if isinstance(item, (datetime.datetime, datetime.date)):
+        return item.isoformat()
+    if isinstance(item, Decimal):
+        return float(item)
+    # Add more type conversions here as needed
+    return item
+
+
+# converters of the columns holding a single convertible type, applied with map()
+_COLUMN_CONVERTERS = {
+    datetime.datetime: datetime.datetime.isoformat,
+    datetime.date: datetime.date.isoformat,
+    Decimal: float,
+}
+
+
+def _convert_column(column):
+    """Return the converted column, or the column itself if it holds no value to convert."""
+    types = set(map(type, column))
+    has_none = type(None) in types
+    types.discard(type(None))
+    if not any(issubclass(item_type, (datetime.date, Decimal)) for item_type in types):
+        return column
+    converter = _COLUMN_CONVERTERS.get(next(iter(types))) if len(types) == 1 else None
+    if converter is None:
+        return list(map(_to_serializable, column))
+    # query results often repeat the same timestamps or dates, e.g., every transaction of a block,
+    # convert each distinct value once
+    distinct_values = set(column)
+    if len(distinct_values) * 2 <= len(column):
+        converted = {
+            item: None if item is None else converter(item) for item in distinct_values
+        }
+        return list(map(converted.__getitem__, column))
+    if has_none:
+        return [None if item is None else converter(item) for item in column]
+    return list(map(converter, column))
+
+
 def convert_rows_to_serializable(rows):
-    converted_rows = []
-    for row in rows:
-        converted_row = []
-        for item in row:
-            if isinstance(item, datetime.datetime):
-                item = item.isoformat()
-            elif isinstance(item, datetime.date):
-                item = item.isoformat()
-            elif isinstance(item, Decimal):
-                item = float(item)
-            # Add more type conversions here as needed
-            converted_row.append(item)
-        converted_rows.append(converted_row)
-    return converted_rows
+    """Convert the datetime, date and Decimal values of the rows to JSON serializable values.
+    The rows are converted column by column: the types of a column are collected in one pass,
+    the columns without such values are passed through and the others are converted with a single map().
+    """
+    rows = rows if isinstance(rows, list) else list(rows)
+    row_widths = set(map(len, rows))
+    if len(row_widths) > 1:
+        # ragged rows, convert them one by one
+        return [[_to_serializable(item) for item in row] for row in rows]
+    if not rows or row_widths == {0}:
+        return [[] for _ in rows]
+    columns = [_convert_column(column) for column in zip(*rows)]
+    return list(map(list, zip(*columns)))
+
+
+def dumps_serializable(value) -> str:
+    """Serialize a value to JSON, converting the datetime, date and Decimal values like convert_rows_to_serializable().
+    Values of other types JSON cannot serialize are converted with str().
+    """
+
+    def default(item):
+        converted = _to_serializable(item)
+        return str(item) if converted is item else converted
+
+    return json.dumps(value, default=default)
 
 
 def parse_table_long_name_to_json_list(table_long_names: str):
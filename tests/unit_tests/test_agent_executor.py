@@ -0,0 +1,85 @@
+"""
+test_agent_executor.py
+This file contains the unit tests for the ChatWeb3AgentExecutor.
+"""
+import asyncio
+import time
+from typing import Any, List, Tuple, Union
+
+from langchain.agents.agent import BaseMultiActionAgent
+from langchain.schema import AgentAction, AgentFinish
+from langchain.tools import Tool
+
+from chatweb3.agents.agent import ChatWeb3AgentExecutor
+
+
+class TwoActionsAgent(BaseMultiActionAgent):
+    """Asks for the metadata of two tables at once, then finishes with the observations."""
+
+    @property
+    def input_keys(self) -> List[str]:
+        return ["input"]
+
+    def plan(
+        self, intermediate_steps: List[Tuple[AgentAction, str]], **kwargs: Any
+    ) -> Union[List[AgentAction], AgentFinish]:
+        if intermediate_steps:
+            return AgentFinish(
+                return_values={
+                    "output": ", ".join(
+                        observation for _, observation in intermediate_steps
+                    )
+                },
+                log="",
+            )
+        return [
+            AgentAction(tool="slow_metadata", tool_input="table_b", log=""),
+            AgentAction(tool="fast_metadata", tool_input="table_a", log=""),
+        ]
+
+    async def aplan(self, intermediate_steps, **kwargs):
+        return self.plan(intermediate_steps, **kwargs)
+
+
+def _create_agent_executor():
+    def slow_metadata(table_name):
+        time.sleep(0.3)
+        return f"slow {table_name}"
+
+    def fast_metadata(table_name):
+        time.sleep(0.2)
+        return f"fast {table_name}"
+
+    return ChatWeb3AgentExecutor.from_agent_and_tools(
+        agent=TwoActionsAgent(),
+        tools=[
+            Tool(name="slow_metadata", func=slow_metadata, description=""),
+            Tool(name="fast_metadata", func=fast_metadata, description=""),
+        ],
+        return_intermediate_steps=True,
+    )
+
+
+def _check_response(response):
+    assert response["output"] == "slow table_b, fast table_a"
+    assert [action.tool for action, _ in response["intermediate_steps"]] == [
+        "slow_metadata",
+        "fast_metadata",
+    ]
+    (step_timing,) = response["step_timings"]
+    assert step_timing["tools"] == ["slow_metadata", "fast_metadata"]
+    assert step_timing["tool_seconds"][0] >= 0.3
+    # the two actions overlap
+    assert step_timing["tools_seconds"] < 0.3 + 0.2
+
+
+def test_actions_of_a_step_run_concurrently():
+    agent_executor = _create_agent_executor()
+    response = agent_executor({"input": "compare the tables"})
+    _check_response(response)
+
+
+def test_actions_of_a_step_run_concurrently_async():
+    agent_executor = _create_agent_executor()
+    response = asyncio.run(agent_executor.acall({"input": "compare the tables"}))
+    _check_response(response)
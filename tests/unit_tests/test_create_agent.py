@@ -10,6 +10,8 @@ from chatweb3.create_agent import create_agent_executor
 @patch("chatweb3.create_agent.create_snowflake_chat_agent")
 @patch("chatweb3.create_agent.CustomSnowflakeDatabaseToolkit")
 @patch("chatweb3.create_agent.SnowflakeContainer")
+# do not leave the mock container behind as the shared container of the process
+@patch("chatweb3.create_agent._shared_snowflake_container", None)
 @patch("chatweb3.create_agent.ChatOpenAI")
 def test_create_agent_executor(
     mock_chat_openai,
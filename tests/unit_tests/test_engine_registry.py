@@ -0,0 +1,46 @@
+"""
+test_engine_registry.py
+This file contains the unit tests for the engine_registry module.
+"""
+import threading
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError
+
+from chatweb3.engine_registry import EngineRegistry
+
+
+def test_engines_are_shared_and_bounded(tmp_path):
+    registry = EngineRegistry()
+    url = f"sqlite:///{tmp_path / 'test.db'}"
+    engine = registry.get_engine(url, pool_size=1, max_overflow=0, pool_timeout=0.2)
+    assert registry.get_engine(url, pool_size=10) is engine
+
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold_connection():
+        with engine.connect():
+            held.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=hold_connection)
+    thread.start()
+    held.wait(5)
+    # the only connection is checked out, the next checkout times out
+    with pytest.raises(TimeoutError):
+        engine.connect()
+
+    threading.Timer(0.05, release.set).start()
+    start_time = time.perf_counter()
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT 1")).scalar() == 1
+    assert time.perf_counter() - start_time >= 0.04
+    thread.join()
+
+    stats = registry.stats()[url]
+    assert stats["size"] == 1 and stats["checked_out"] == 0
+    assert stats["checkouts"] == 2 and stats["timeouts"] == 1
+    assert stats["waits"] == 2 and stats["max_wait_seconds"] >= 0.04
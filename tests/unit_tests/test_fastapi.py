@@ -1,77 +1,132 @@
 # test_fastapi.py
-import pytest
+import json
+from types import SimpleNamespace
 from unittest.mock import patch
 
 from fastapi.testclient import TestClient
 
-# from api.api_endpoints import BlockchainDataError, app
-# from api.services.blockchain_data import query_blockchain_data_from_flipside
 from api.api_endpoints import (
     app,
+    BlockchainDataError,
+    db,
+    get_api_key,
     CheckTableSummaryTool,
     CheckTableMetadataTool,
     QueryDatabaseTool,
 )
 
+from chatweb3.query_results import FlipsideResultStream
+
+app.dependency_overrides[get_api_key] = lambda: "test_api_key"
 client = TestClient(app)
 
 
 def test_get_list_of_available_tables():
     with patch.object(
-        CheckTableSummaryTool, "run", return_value="mocked_return_value"
+        CheckTableSummaryTool, "arun", return_value="mocked_return_value"
     ) as mock_method:
         response = client.get("/get_list_of_available_tables")
         assert response.status_code == 200
         assert response.json() == {"result": "mocked_return_value"}
-        mock_method.assert_called_once()
+        mock_method.assert_awaited_once()
 
 
 def test_get_detailed_metadata_for_tables():
     with patch.object(
-        CheckTableMetadataTool, "run", return_value="mocked_metadata_value"
+        CheckTableMetadataTool, "arun", return_value="mocked_metadata_value"
     ) as mock_method:
         response = client.get(
             "/get_detailed_metadata_for_tables/", params={"table_names": "test_table"}
         )
         assert response.status_code == 200
         assert response.json() == {"result": "mocked_metadata_value"}
-        mock_method.assert_called_once_with("test_table")
+        mock_method.assert_awaited_once_with("test_table")
 
 
 def test_query_snowflake_sql_database():
     with patch.object(
-        QueryDatabaseTool, "run", return_value="mocked_query_result"
+        QueryDatabaseTool, "arun", return_value="mocked_query_result"
     ) as mock_method:
         response = client.post(
             "/query_snowflake_sql_database", json={"query": "SELECT * FROM test_table"}
         )
         assert response.status_code == 200
         assert response.json() == {"result": "mocked_query_result"}
-        mock_method.assert_called_once_with(tool_input="SELECT * FROM test_table")
+        mock_method.assert_awaited_once_with(tool_input="SELECT * FROM test_table")
+
 
+def test_stream_query_snowflake_sql_database():
+    rows = [[1, "a"], [2, "b"], [3, "c"]]
+    result_set = SimpleNamespace(
+        query_id="run_1", columns=["id", "name"], rows=rows, page=None
+    )
+    stream = FlipsideResultStream(
+        None, "SELECT * FROM test_table", run_query=lambda sql, **kwargs: result_set
+    )
+    with patch.object(db, "stream_query", return_value=stream):
+        response = client.post(
+            "/query_snowflake_sql_database/stream",
+            json={"query": "SELECT * FROM test_table"},
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert [json.loads(line) for line in response.text.splitlines()] == [
+            {"id": 1, "name": "a"},
+            {"id": 2, "name": "b"},
+            {"id": 3, "name": "c"},
+        ]
 
-@pytest.mark.skip(reason="No longer in use")
-@patch("api.api_endpoints.query_blockchain_data_from_flipside")
+
+@patch("api.api_endpoints.aquery_blockchain_data_from_flipside")
 def test_query_chatweb3_success(mock_query):
     mock_query.return_value = ("Answer", "Thought Process")
     response = client.post("/query_blockchain_data", json={"query": "Some Input"})
     assert response.status_code == 200
     assert response.json() == {"answer": "Answer", "thought_process": "Thought Process"}
+    mock_query.assert_awaited_once_with("Some Input")
 
 
-@pytest.mark.skip(reason="No longer in use")
-@patch("api.api_endpoints.query_blockchain_data_from_flipside")
+@patch("api.api_endpoints.aquery_blockchain_data_from_flipside")
 def test_query_chatweb3_blockchain_data_error(mock_query):
     mock_query.side_effect = BlockchainDataError("Crypto Data Error", "Some Error")
     response = client.post("/query_blockchain_data", json={"query": "Some Input"})
     assert response.status_code == 400
-    assert "error" in response.json()
+    assert response.json() == {"error": "Some Error"}
 
 
-@pytest.mark.skip(reason="No longer in use")
-@patch("api.api_endpoints.query_blockchain_data_from_flipside")
+@patch("api.api_endpoints.aquery_blockchain_data_from_flipside")
 def test_query_chatweb3_internal_error(mock_query):
     mock_query.side_effect = Exception("Unexpected Error")
-    response = client.post("/query_blockchain_data", json={"query": "Some Input"})
+    response = TestClient(app, raise_server_exceptions=False).post(
+        "/query_blockchain_data", json={"query": "Some Input"}
+    )
     assert response.status_code == 500
     assert "error" in response.json()
+
+
+def test_get_query_cache_stats():
+    response = client.get("/query_cache_stats")
+    assert response.status_code == 200
+    assert set(response.json()["query_checker"]) == {
+        "llm_calls_avoided",
+        "llm_calls",
+        "avoided_rate",
+    }
+
+
+def test_stream_query_chatweb3():
+    async def events(inp):
+        yield {"type": "token", "token": "Thought"}
+        yield {"type": "answer", "answer": "Answer", "thought_process": inp}
+
+    with patch("api.api_endpoints.astream_blockchain_data_from_flipside", events):
+        response = client.post(
+            "/query_blockchain_data/stream", json={"query": "Some Input"}
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.text == (
+            'event: token\ndata: {"type": "token", "token": "Thought"}\n\n'
+            'event: answer\ndata: {"type": "answer", "answer": "Answer", '
+            '"thought_process": "Some Input"}\n\n'
+        )
@@ -8,7 +8,7 @@ from unittest.mock import Mock
 import pytest
 
 from chatweb3.utils import format_response  # split_thought_process_text,
-from api.gradio.gradio_app import chat, set_openai_api_key
+from api.gradio.gradio_app import chat, set_openai_api_key, stream_chat
 from langchain.schema import AgentAction
 
 # from chatweb3.chat_ui import CONVERSATION_MODE
@@ -39,3 +39,56 @@ def test_chat():
         ("question", "answer"),
         ("test_input", "Please paste your OpenAI API Key to use"),
     ]
+
+
+def test_stream_chat_without_agent():
+    updates = list(stream_chat("test_input", [], None))
+    assert updates == [
+        (
+            [("test_input", "Please paste your OpenAI API Key to use")],
+            [("test_input", "Please paste your OpenAI API Key to use")],
+            "Please paste your OpenAI API Key to use",
+        )
+    ]
+
+
+def _streaming_agent(inp, callbacks):
+    """Reports the tokens and the steps of a one-query run to the streaming callback, then returns its outputs."""
+    (handler,) = callbacks
+    action = AgentAction("query_database", {"query": "select 1"}, "Thought: query")
+    for token in ("Thought", ": query"):
+        handler.on_llm_new_token(token)
+    handler.on_agent_action(action)
+    handler.on_tool_end("[[1]]")
+    return {"output": "The answer is 1", "intermediate_steps": [(action, "[[1]]")]}
+
+
+def test_stream_chat_updates_the_thought_process_progressively():
+    # the history is updated in place, take a copy at every update
+    updates = [
+        (list(history), thought_process)
+        for history, _, thought_process in stream_chat(
+            "test_input", [], _streaming_agent
+        )
+    ]
+    thought_processes = [thought_process for _, thought_process in updates]
+    assert thought_processes[:2] == ["Thought", "Thought: query"]
+    # the action replaces the streamed tokens, then the observation follows it
+    assert "query_database" in thought_processes[2]
+    assert thought_processes[3].startswith(thought_processes[2])
+    assert "[[1]]" in thought_processes[3]
+    # the answer is only shown once the run finishes
+    assert all(history[-1] == ("test_input", None) for history, _ in updates[:-1])
+    history, _ = updates[-1]
+    assert history[-1][0] == "test_input"
+    assert history[-1][1].startswith("The answer is 1")
+    assert "select 1" in history[-1][1]
+
+
+def test_stream_chat_reports_the_error_of_the_run():
+    def failing_agent(inp, callbacks):
+        raise ValueError("LLM unavailable")
+
+    history, _, thought_process = list(stream_chat("test_input", [], failing_agent))[-1]
+    assert thought_process == "Exception in receiving response: LLM unavailable"
+    assert history[-1] == ("test_input", thought_process)
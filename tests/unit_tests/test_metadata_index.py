@@ -0,0 +1,275 @@
+"""
+test_metadata_index.py
+This file contains the unit tests for the metadata_parser module.
+"""
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from chatweb3.create_agent import INDEX_ANNOTATION_FILE_PATH, LOCAL_INDEX_FILE_PATH
+from chatweb3.metadata_parser import MetadataParser, Table, parse_column_definitions
+from chatweb3.metadata_shards import write_shards
+
+
+def test_snapshot_round_trip(tmp_path):
+    snapshot_file = str(tmp_path / "index.pkl")
+    json_parser = MetadataParser(
+        file_path=LOCAL_INDEX_FILE_PATH,
+        annotation_file_path=INDEX_ANNOTATION_FILE_PATH,
+        snapshot_file_path=snapshot_file,
+    )
+    assert json_parser.is_snapshot_fresh(snapshot_file)
+
+    snapshot_parser = MetadataParser(
+        file_path=LOCAL_INDEX_FILE_PATH,
+        annotation_file_path=INDEX_ANNOTATION_FILE_PATH,
+        snapshot_file_path=snapshot_file,
+    )
+    assert snapshot_parser.root_schema_obj == json_parser.root_schema_obj
+
+    table_long_names = "ethereum.core.ez_token_transfers, ethereum.defi.ez_dex_swaps"
+    assert snapshot_parser.get_metadata_by_table_long_names(
+        table_long_names
+    ) == json_parser.get_metadata_by_table_long_names(table_long_names)
+
+
+def test_snapshot_rebuilt_when_annotation_changes(tmp_path):
+    snapshot_file = str(tmp_path / "index.pkl")
+    annotation_file = tmp_path / "annotation.json"
+    annotation_file.write_text(
+        json.dumps({"table_summary": {"ethereum.core.dim_labels": "old summary"}})
+    )
+    MetadataParser(
+        file_path=LOCAL_INDEX_FILE_PATH,
+        annotation_file_path=str(annotation_file),
+        snapshot_file_path=snapshot_file,
+    )
+
+    annotation_file.write_text(
+        json.dumps({"table_summary": {"ethereum.core.dim_labels": "new summary"}})
+    )
+    parser = MetadataParser(
+        file_path=LOCAL_INDEX_FILE_PATH,
+        annotation_file_path=str(annotation_file),
+        snapshot_file_path=snapshot_file,
+    )
+    table = (
+        parser.root_schema_obj.databases["ethereum"]
+        .schemas["core"]
+        .tables["dim_labels"]
+    )
+    assert table.summary == "new summary"
+    assert parser.is_snapshot_fresh(snapshot_file)
+
+
+def test_parse_column_definitions():
+    ddl = (
+        'create or replace view T cluster by (block_timestamp::DATE, "X,Y")(\n'
+        "\tETHEREUM.CORE.BLOCK_NUMBER NUMBER(38,0) COMMENT 'Block number, see block''s header',\n"
+        "\t\"a+b\" VARCHAR(16777216) COMMENT 'it\\'s a \\\\ path',\n"
+        "\tFROM_ADDRESS VARCHAR(16777216),\n"
+        "\tORIGIN_FROM_ADDRESS VARCHAR(16777216) COMMENT 'The origin's sender'\n"
+        ") as (select 1);"
+    )
+    assert parse_column_definitions(ddl) == {
+        "block_number": ("NUMBER(38,0)", "Block number, see block's header"),
+        "a+b": ("VARCHAR(16777216)", "it's a \\ path"),
+        "from_address": ("VARCHAR(16777216)", None),
+        "origin_from_address": ("VARCHAR(16777216)", "The origin's sender"),
+    }
+
+
+def test_column_data_types_populated():
+    parser = MetadataParser(file_path=LOCAL_INDEX_FILE_PATH)
+    for database in parser.root_schema_obj.databases.values():
+        for schema in database.schemas.values():
+            for table in schema.tables.values():
+                if not table.create_table_stmt:
+                    continue
+                for column in table.columns.values():
+                    assert column.data_type, f"{table.long_name}.{column.name}"
+
+
+def test_column_sample_values_transposed_from_sample_rows():
+    parser = MetadataParser(file_path=LOCAL_INDEX_FILE_PATH)
+    for database in parser.root_schema_obj.databases.values():
+        for schema in database.schemas.values():
+            for table in schema.tables.values():
+                if not table.sample_rows:
+                    continue
+                for column in table.columns.values():
+                    index = table.sample_row_column_names.index(column.name)
+                    assert list(column.sample_values_list) == [
+                        row[index] for row in table.sample_rows
+                    ]
+
+
+def test_drop_raw_metadata_keeps_derived_metadata():
+    full_parser = MetadataParser(
+        file_path=LOCAL_INDEX_FILE_PATH,
+        annotation_file_path=INDEX_ANNOTATION_FILE_PATH,
+    )
+    lean_parser = MetadataParser(
+        file_path=LOCAL_INDEX_FILE_PATH,
+        annotation_file_path=INDEX_ANNOTATION_FILE_PATH,
+        drop_raw_metadata=True,
+    )
+    table_long_names = "ethereum.core.fact_traces, ethereum.nft.ez_nft_sales"
+    assert lean_parser.get_metadata_by_table_long_names(
+        table_long_names
+    ) == full_parser.get_metadata_by_table_long_names(table_long_names)
+
+    assert full_parser.create_table_stmt["ethereum"]["core"]["fact_traces"]
+    assert lean_parser.create_table_stmt["ethereum"]["core"]["fact_traces"] is None
+
+
+def test_rendered_metadata_cache():
+    parser = MetadataParser(file_path=LOCAL_INDEX_FILE_PATH)
+    table_long_names = "ethereum.core.fact_blocks, ethereum.core.dim_labels"
+    first = parser.get_metadata_by_table_long_names(table_long_names)
+    assert parser.metadata_cache_stats() == {"hits": 0, "misses": 2, "size": 2}
+
+    assert parser.get_metadata_by_table_long_names(table_long_names) == first
+    assert parser.metadata_cache_stats() == {"hits": 2, "misses": 2, "size": 2}
+
+    parser.get_metadata_by_table_long_names(table_long_names, include_column_info=False)
+    assert parser.metadata_cache_stats()["size"] == 4
+
+    parser.add_table_summary(
+        table_summary_json={"ethereum.core.dim_labels": "new summary"}
+    )
+    assert parser.metadata_cache_stats()["size"] == 0
+    assert "new summary" in parser.get_metadata_by_table_long_names(
+        "ethereum.core.dim_labels", include_column_info=False
+    )
+
+
+def test_table_index_lookups(metadata_parser_with_sample_data):
+    parser = metadata_parser_with_sample_data
+    table = parser.get_table_by_long_name("ethereum.core.ez_nft_sales")
+    assert (
+        table
+        is parser.root_schema_obj.databases["ethereum"]
+        .schemas["core"]
+        .tables["ez_nft_sales"]
+    )
+    assert parser.get_table_by_long_name("ethereum.core.missing") is None
+    assert {t.long_name for t in parser.get_tables_by_column_name("block_number")} == {
+        "ethereum.core.ez_nft_sales",
+        "ethereum.aave.ez_proposals",
+    }
+
+    new_table = Table("ez_dex_swaps", "defi", "ethereum")
+    new_table.column_names = ["block_number"]
+    new_table._create_columns()
+    parser.add_table(new_table)
+    assert parser.get_table_by_long_name("ethereum.defi.ez_dex_swaps") is new_table
+    assert parser.get_tables_from_database_schema_table_names("ethereum", "defi") == [
+        new_table
+    ]
+    assert len(parser.get_tables_by_column_name("block_number")) == 3
+
+    assert parser.remove_table("ethereum.core.ez_nft_sales") is table
+    assert parser.get_table_by_long_name("ethereum.core.ez_nft_sales") is None
+    assert (
+        "ez_nft_sales"
+        not in parser.root_schema_obj.databases["ethereum"].schemas["core"].tables
+    )
+    assert len(parser.get_tables_by_column_name("block_number")) == 2
+
+
+def test_table_index_published_once_complete(metadata_parser_with_sample_data):
+    parser = metadata_parser_with_sample_data
+    parser.invalidate_table_index()
+    index_table = parser._index_table
+
+    def checking_index_table(*args):
+        # a concurrent lookup must not find the half-built index
+        assert parser._tables_by_long_name is None
+        index_table(*args)
+
+    parser._index_table = checking_index_table
+    parser._ensure_table_index()
+    assert parser.get_table_by_long_name("ethereum.core.ez_nft_sales") is not None
+
+
+def test_sharded_index_loads_shards_lazily(tmp_path):
+    full_parser = MetadataParser(
+        file_path=LOCAL_INDEX_FILE_PATH,
+        annotation_file_path=INDEX_ANNOTATION_FILE_PATH,
+    )
+    write_shards(full_parser.load_metadata_from_json(), str(tmp_path), by="schema")
+    parser = MetadataParser(
+        annotation_file_path=INDEX_ANNOTATION_FILE_PATH,
+        shard_dir_path=str(tmp_path),
+        max_resident_shards=1,
+    )
+    assert parser.shard_stats()["resident"] == 0
+
+    table_long_names = "ethereum.core.fact_blocks, ethereum.defi.ez_dex_swaps"
+    assert parser.get_metadata_by_table_long_names(
+        table_long_names
+    ) == full_parser.get_metadata_by_table_long_names(table_long_names)
+    assert parser.shard_stats()["loads"] == 2
+    assert parser.shard_stats()["resident"] == 1
+    assert parser.get_table_by_long_name("ethereum.core.fact_blocks") is not None
+    assert parser.shard_stats()["evictions"] == 2
+
+    all_tables = parser.get_tables_from_database_schema_table_names("ethereum")
+    assert {table.long_name for table in all_tables} == {
+        table.long_name
+        for table in full_parser.get_tables_from_database_schema_table_names("ethereum")
+    }
+
+
+def test_sharded_index_concurrent_loads_and_evictions(tmp_path):
+    full_parser = MetadataParser(
+        file_path=LOCAL_INDEX_FILE_PATH,
+        annotation_file_path=INDEX_ANNOTATION_FILE_PATH,
+    )
+    write_shards(full_parser.load_metadata_from_json(), str(tmp_path), by="schema")
+    # a single resident shard: every lookup of another schema evicts the loaded one
+    parser = MetadataParser(
+        annotation_file_path=INDEX_ANNOTATION_FILE_PATH,
+        shard_dir_path=str(tmp_path),
+        max_resident_shards=1,
+    )
+    expected_long_names = {
+        table.long_name
+        for table in full_parser.get_tables_from_database_schema_table_names("ethereum")
+    }
+    table_long_names = ["ethereum.core.fact_blocks", "ethereum.defi.ez_dex_swaps"]
+
+    def lookup(i):
+        if i % 2:
+            tables = parser.get_tables_from_database_schema_table_names("ethereum")
+            return {table.long_name for table in tables} == expected_long_names
+        return parser.get_table_by_long_name(table_long_names[i // 2 % 2]) is not None
+
+    # switch threads often, so the lookups interleave with the loads and evictions
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            assert all(executor.map(lookup, range(64)))
+    finally:
+        sys.setswitchinterval(switch_interval)
+    assert parser.shard_stats()["resident"] == 1
+
+
+def test_jsonl_index_matches_json_index(tmp_path):
+    json_parser = MetadataParser(
+        file_path=LOCAL_INDEX_FILE_PATH,
+        annotation_file_path=INDEX_ANNOTATION_FILE_PATH,
+    )
+    jsonl_file = str(tmp_path / "index.jsonl")
+    json_parser.save_metadata_to_jsonl(jsonl_file)
+
+    jsonl_parser = MetadataParser(
+        file_path=jsonl_file, annotation_file_path=INDEX_ANNOTATION_FILE_PATH
+    )
+    assert jsonl_parser.root_schema_obj == json_parser.root_schema_obj
+    table_long_names = "ethereum.core.fact_traces, ethereum.nft.ez_nft_sales"
+    assert jsonl_parser.get_metadata_by_table_long_names(
+        table_long_names
+    ) == json_parser.get_metadata_by_table_long_names(table_long_names)
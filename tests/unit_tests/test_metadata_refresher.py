@@ -0,0 +1,85 @@
+"""
+test_metadata_refresher.py
+This file contains the unit tests for the metadata_refresher module.
+"""
+from chatweb3.create_agent import INDEX_ANNOTATION_FILE_PATH, LOCAL_INDEX_FILE_PATH
+from chatweb3.metadata_parser import MetadataParser
+from chatweb3.metadata_refresher import MetadataRefresher
+
+LAST_ALTERED = "2024-01-01T00:00:00"
+
+
+class FakeSnowflake:
+    """Answers the refresher statements from the tables of a metadata index, with one altered table."""
+
+    def __init__(self, metadata_parser, altered_table_long_name):
+        self.tables = {
+            table.long_name: table
+            for table in metadata_parser.get_tables_from_database_schema_table_names()
+        }
+        self.altered = self.tables[altered_table_long_name]
+        self.commands = []
+
+    def run_query(self, command, database, schema):
+        self.commands.append(command)
+        if "INFORMATION_SCHEMA.TABLES" in command:
+            return ["TABLE_SCHEMA", "TABLE_NAME", "LAST_ALTERED"], [
+                (
+                    table.schema_name.upper(),
+                    table.name.upper(),
+                    "2024-02-01T00:00:00" if table is self.altered else LAST_ALTERED,
+                )
+                for table in self.tables.values()
+                if table.database_name == database
+            ]
+        if command == self.altered.select_information_schema_columns_stmt:
+            names = self.altered.information_schema_columns_names
+            comment_index = names.index("comment")
+            rows = [list(row) for row in self.altered.information_schema_columns_values]
+            for row in rows:
+                row[comment_index] = f"{row[comment_index]} (updated)"
+            return [name.upper() for name in names], rows
+        if command == self.altered.select_get_ddl_table_stmt:
+            return ["DDL"], [(self.altered.get_ddl_create_table,)]
+        if command == self.altered.select_sample_rows_stmt:
+            return self.altered.sample_row_column_names, self.altered.sample_rows
+        raise AssertionError(f"Unexpected statement: {command}")
+
+
+def test_refresh_only_altered_tables(tmp_path):
+    parser = MetadataParser(
+        file_path=LOCAL_INDEX_FILE_PATH,
+        annotation_file_path=INDEX_ANNOTATION_FILE_PATH,
+    )
+    for table in parser.get_tables_from_database_schema_table_names():
+        table.last_altered = LAST_ALTERED
+    snowflake = FakeSnowflake(parser, "ethereum.core.dim_labels")
+    old_table = parser.get_table_by_long_name("ethereum.core.dim_labels")
+
+    result = MetadataRefresher(parser, snowflake.run_query).refresh()
+
+    assert result == {
+        "refreshed": ["ethereum.core.dim_labels"],
+        "failed": [],
+        "missing": [],
+    }
+    # one LAST_ALTERED query per database plus the three stored statements of the altered table
+    assert len(snowflake.commands) == 4
+    table = parser.get_table_by_long_name("ethereum.core.dim_labels")
+    assert table is not old_table
+    assert table.last_altered == "2024-02-01T00:00:00"
+    assert table.summary == old_table.summary
+    assert set(table.column_names) == set(old_table.column_names)
+    assert table.columns["label"].data_type == "VARCHAR(16777216)"
+    assert table.columns["label"].comment == old_table.columns["label"].comment
+
+    output_file = str(tmp_path / "context.json")
+    parser.save_metadata_to_json(output_file)
+    reloaded = MetadataParser(file_path=output_file)
+    reloaded_table = reloaded.get_table_by_long_name("ethereum.core.dim_labels")
+    assert reloaded_table.last_altered == "2024-02-01T00:00:00"
+    comment_index = reloaded_table.information_schema_columns_names.index("comment")
+    assert all(
+        row[comment_index].endswith("(updated)")
+        for row in reloaded_table.information_schema_columns_values
+    )
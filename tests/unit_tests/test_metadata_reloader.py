@@ -0,0 +1,76 @@
+"""
+test_metadata_reloader.py
+This file contains the unit tests for the metadata_reloader module.
+"""
+import json
+import os
+import shutil
+
+from chatweb3.create_agent import LOCAL_INDEX_FILE_PATH
+from chatweb3.metadata_reloader import MetadataReloader
+from chatweb3.snowflake_database import SnowflakeContainer, pinned_metadata_parsers
+
+
+def _write_annotation(path, summary):
+    path.write_text(
+        json.dumps({"table_summary": {"ethereum.core.dim_labels": summary}})
+    )
+    # make sure the change is visible even on file systems with a coarse mtime
+    os.utime(path, ns=(0, len(summary)))
+
+
+def test_reloader_swaps_metadata_parser(tmp_path):
+    context_file = tmp_path / "context.json"
+    shutil.copy(LOCAL_INDEX_FILE_PATH, context_file)
+    annotation_file = tmp_path / "annotation.json"
+    _write_annotation(annotation_file, "old summary")
+
+    container = SnowflakeContainer(
+        flipside_api_key=None,
+        user="user",
+        password="password",
+        account_identifier="account",
+        local_index_file_path=str(context_file),
+        index_annotation_file_path=str(annotation_file),
+    )
+    reloader = MetadataReloader(
+        container, container.metadata_file_paths(), interval_seconds=60
+    )
+    old_parser = container.metadata_parser
+    assert not reloader.check()
+
+    with pinned_metadata_parsers():
+        assert container.metadata_parser is old_parser
+        _write_annotation(annotation_file, "new summary, reloaded")
+        assert reloader.check()
+        # the in-flight run keeps the parser it started with
+        assert container.metadata_parser is old_parser
+
+    new_parser = container.metadata_parser
+    assert new_parser is not old_parser
+    assert "new summary, reloaded" in new_parser.get_metadata_by_table_long_names(
+        "ethereum.core.dim_labels", include_column_info=False
+    )
+    assert reloader.stats()["reload_count"] == 1
+    assert reloader.stats()["last_reload_duration_seconds"] > 0
+
+
+def test_reloader_keeps_parser_when_rebuild_fails(tmp_path):
+    context_file = tmp_path / "context.json"
+    shutil.copy(LOCAL_INDEX_FILE_PATH, context_file)
+    container = SnowflakeContainer(
+        flipside_api_key=None,
+        user="user",
+        password="password",
+        account_identifier="account",
+        local_index_file_path=str(context_file),
+    )
+    reloader = MetadataReloader(
+        container, container.metadata_file_paths(), interval_seconds=60
+    )
+    old_parser = container.metadata_parser
+
+    context_file.write_text("{ partially written")
+    assert not reloader.check()
+    assert container.metadata_parser is old_parser
+    assert reloader.stats()["failure_count"] == 1
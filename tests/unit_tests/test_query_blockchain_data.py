@@ -1,17 +1,20 @@
 # test_blockchain_data_service.py
-from unittest.mock import patch
+import asyncio
+from unittest.mock import AsyncMock, Mock, patch
 import pytest
+from langchain.schema import AgentAction
 
 from api.services.blockchain_data import (
     BlockchainDataError,
+    aquery_blockchain_data_from_flipside,
     query_blockchain_data_from_flipside,
 )
 
 
 @pytest.mark.skip(reason="This test needs to be updated")
-@patch("api.services.blockchain_data.agent")
-def test_query_blockchain_data_success(mock_agent):
-    mock_agent.return_value = {
+@patch("api.services.blockchain_data.new_agent_executor")
+def test_query_blockchain_data_success(mock_new_agent_executor):
+    mock_new_agent_executor.return_value.return_value = {
         "output": "Answer",
         "intermediate_steps": "Thought Process",
     }
@@ -24,10 +27,58 @@ def test_query_blockchain_data_success(mock_agent):
     )
 
 
-@patch("api.services.blockchain_data.agent")
-def test_query_blockchain_data_failure(mock_agent):
-    mock_agent.side_effect = Exception("Some Error")
+@patch("api.services.blockchain_data.new_agent_executor")
+def test_query_blockchain_data_failure(mock_new_agent_executor):
+    mock_new_agent_executor.return_value.side_effect = Exception("Some Error")
     try:
         query_blockchain_data_from_flipside("Some Input")
     except BlockchainDataError as e:
         assert str(e) == "Some Error"
+
+
+@patch("api.services.blockchain_data.new_agent_executor")
+def test_aquery_blockchain_data_failure(mock_new_agent_executor):
+    mock_new_agent_executor.return_value.acall = AsyncMock(
+        side_effect=Exception("Some Error")
+    )
+    with pytest.raises(BlockchainDataError, match="Some Error"):
+        asyncio.run(aquery_blockchain_data_from_flipside("Some Input"))
+
+
+@patch("api.services.blockchain_data.new_agent_executor")
+def test_concurrent_questions_get_their_own_agent_executor(mock_new_agent_executor):
+    executors = []
+
+    def new_agent_executor():
+        executor = Mock()
+
+        async def acall(inp):
+            # the other question runs meanwhile
+            await asyncio.sleep(0.01)
+            executor.questions.append(inp)
+            action = AgentAction("query_database", {"query": inp}, "")
+            return {
+                "output": f"answer to {inp}",
+                "intermediate_steps": [(action, "result")],
+            }
+
+        executor.questions = []
+        executor.acall = acall
+        executors.append(executor)
+        return executor
+
+    mock_new_agent_executor.side_effect = new_agent_executor
+
+    async def ask_both():
+        return await asyncio.gather(
+            aquery_blockchain_data_from_flipside("question 1"),
+            aquery_blockchain_data_from_flipside("question 2"),
+        )
+
+    answers = asyncio.run(ask_both())
+    assert answers[0][0].startswith("answer to question 1")
+    assert answers[1][0].startswith("answer to question 2")
+    assert [executor.questions for executor in executors] == [
+        ["question 1"],
+        ["question 2"],
+    ]
@@ -0,0 +1,151 @@
+"""
+test_query_cache.py
+This file contains the unit tests for the query_cache module and its use by QuerySnowflakeDatabaseTool.
+"""
+import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from chatweb3.query_cache import (
+    MemoryLRUCacheBackend,
+    QueryResultCache,
+    RedisCacheBackend,
+    SQLiteCacheBackend,
+    canonicalize_sql,
+    query_ttl_seconds,
+)
+from chatweb3.query_results import FlipsideResultStream
+from chatweb3.tools.snowflake_database.tool import QuerySnowflakeDatabaseTool
+from chatweb3.utils import convert_rows_to_serializable
+
+
+def test_canonicalize_sql():
+    query = """
+    -- daily volume
+    SELECT  Block_Timestamp::date AS day, /* total */ SUM(amount)
+    FROM ethereum.core.ez_dex_swaps
+    WHERE platform = 'Uniswap-V3' AND "Mixed" > 0;
+    """
+    assert canonicalize_sql(query) == (
+        "select block_timestamp::date as day, sum(amount) "
+        "from ethereum.core.ez_dex_swaps "
+        "where platform = 'Uniswap-V3' and \"Mixed\" > 0"
+    )
+    assert canonicalize_sql("select 1 - 2") == canonicalize_sql("SELECT 1   -   2;")
+    assert canonicalize_sql("select 'a  b'") != canonicalize_sql("select 'a b'")
+
+
+def test_query_ttl_seconds():
+    assert query_ttl_seconds("select 1", 600, 60) == 600
+    assert query_ttl_seconds("select * from t where d = current_date", 600, 60) == 60
+    assert query_ttl_seconds("select * from t where d > getdate() - 1", 600, 60) == 60
+    # the date functions only count outside string literals
+    assert query_ttl_seconds("select 'current_date'", 600, 60) == 600
+    assert query_ttl_seconds("insert into t values (1)", 600, 60) == 0
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryLRUCacheBackend(max_entries=2)
+    backend.set("a", {"result": 1}, 60)
+    backend.set("b", {"result": 2}, 60)
+    assert backend.get("a") == {"result": 1}
+    backend.set("c", {"result": 3}, 60)
+    assert backend.get("b") is None
+    assert backend.get("a") is not None and backend.get("c") is not None
+    backend.set("d", {"result": 4}, -1)
+    assert backend.get("d") is None
+
+
+def test_sqlite_backend_is_shared_across_instances(tmp_path):
+    file_path = str(tmp_path / "cache" / "query_cache.sqlite")
+    SQLiteCacheBackend(file_path).set("a", {"result": [[1, "x"]]}, 60)
+    backend = SQLiteCacheBackend(file_path)
+    assert backend.get("a") == {"result": [[1, "x"]]}
+    backend.set("b", {"result": []}, -1)
+    assert backend.get("b") is None
+    assert len(backend) == 1
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, px):
+        self.values[key] = value.encode("utf-8")
+
+
+def _redis_backend():
+    backend = RedisCacheBackend.__new__(RedisCacheBackend)
+    backend.key_prefix = "test:"
+    backend._client = FakeRedis()
+    return backend
+
+
+@pytest.mark.parametrize("backend_name", ["memory", "sqlite", "redis"])
+def test_cache_hit_equals_fresh_result(backend_name, tmp_path):
+    backend = {
+        "memory": lambda: MemoryLRUCacheBackend(),
+        "sqlite": lambda: SQLiteCacheBackend(str(tmp_path / "cache.db")),
+        "redis": _redis_backend,
+    }[backend_name]()
+    cache = QueryResultCache(backend)
+    rows = [
+        (1, datetime.datetime(2023, 5, 1, 12, 30), Decimal("1.5"), "a", None),
+        (2, None, Decimal("2"), "b", datetime.date(2023, 5, 2)),
+    ]
+    # the query tool returns the rows converted to JSON serializable values
+    fresh_result = convert_rows_to_serializable(rows)
+    cache.set("snowflake", "ethereum", "core", "select 1", rows, 1.0)
+    assert cache.get("snowflake", "ethereum", "core", "select 1") == (
+        True,
+        fresh_result,
+    )
+
+    # a hit is a copy: modifying it does not change the cached result
+    _, result = cache.get("snowflake", "ethereum", "core", "select 1")
+    result[0][0] = 100
+    assert cache.get("snowflake", "ethereum", "core", "select 1")[1] == fresh_result
+
+
+def test_query_tool_uses_query_cache():
+    calls = []
+
+    def run_query(sql, **kwargs):
+        calls.append(sql)
+        return SimpleNamespace(
+            query_id=None, columns=["count"], rows=[[len(calls)]], page=None
+        )
+
+    def stream_query(database, schema, query, mode, page_size, **kwargs):
+        return FlipsideResultStream(
+            None, query, page_size=page_size, run_query=run_query, **kwargs
+        )
+
+    cache = QueryResultCache()
+    db = SimpleNamespace(
+        stream_query=stream_query, query_cache=cache, metadata_parser=None
+    )
+    tool = QuerySnowflakeDatabaseTool.construct(db=db, return_direct=False)
+
+    tool_input = "database: ethereum, schema: core, query: SELECT count(*) FROM t"
+    assert tool._run(tool_input, mode="flipside") == [[1]]
+    assert tool._run(
+        "database: ethereum, schema: core, query: select COUNT(*)   from t;",
+        mode="flipside",
+    ) == [[1]]
+    assert len(calls) == 1
+    # a different schema is a different cache entry
+    tool._run(
+        "database: ethereum, schema: defi, query: select count(*) from t",
+        mode="flipside",
+    )
+    assert len(calls) == 2
+
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 2
+    assert stats["saved_latency_seconds"] >= 0
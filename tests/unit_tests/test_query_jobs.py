@@ -0,0 +1,100 @@
+# test_query_jobs.py
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.api_endpoints import QueryDatabaseTool, app, get_api_key
+from api.services.query_jobs import (
+    JOB_FAILED,
+    JOB_SUCCEEDED,
+    JobLimitExceededError,
+    QueryJobManager,
+    SQLiteJobStore,
+    get_result_page,
+)
+
+
+def test_job_manager_runs_jobs_and_limits_each_api_key(tmp_path):
+    release = asyncio.Event()
+
+    async def run_query(query):
+        await release.wait()
+        if query == "bad":
+            raise ValueError("syntax error")
+        return [[i] for i in range(5)]
+
+    async def main():
+        manager = QueryJobManager(
+            run_query,
+            store=SQLiteJobStore(str(tmp_path / "jobs.sqlite")),
+            max_jobs_per_owner=2,
+        )
+        good = manager.submit("key_a", "good")
+        bad = manager.submit("key_a", "bad")
+        with pytest.raises(JobLimitExceededError):
+            manager.submit("key_a", "third")
+        # the limit is per API key and session id
+        other = manager.submit("key_b", "good")
+        assert manager.get("key_b", good.job_id) is None
+        session_job = manager.submit("key_a", "good", session_id="session_1")
+        assert manager.get("key_a", session_job.job_id) is None
+        assert manager.get("key_a", session_job.job_id, session_id="session_2") is None
+        assert manager.get("key_a", good.job_id, session_id="session_1") is None
+        assert manager.stats() == {"active_jobs": 4, "active_owners": 3}
+
+        release.set()
+        await asyncio.gather(*manager._tasks)
+        assert manager.stats()["active_jobs"] == 0
+        return manager, good, bad, other, session_job
+
+    manager, good, bad, other, session_job = asyncio.run(main())
+    # the jobs are read back from the SQLite store
+    job = manager.get("key_a", good.job_id)
+    assert job.status == JOB_SUCCEEDED and job.result == [[i] for i in range(5)]
+    assert manager.get("key_a", bad.job_id).status == JOB_FAILED
+    assert manager.get("key_a", bad.job_id).error == "syntax error"
+    assert manager.get("key_b", other.job_id).status == JOB_SUCCEEDED
+    job = manager.get("key_a", session_job.job_id, session_id="session_1")
+    assert job.status == JOB_SUCCEEDED
+
+    page = get_result_page(job, page_number=2, page_size=2)
+    assert page["result"] == [[2], [3]]
+    assert page["total_rows"] == 5 and page["total_pages"] == 3
+
+
+def test_query_job_endpoints():
+    app.dependency_overrides[get_api_key] = lambda: "test_api_key"
+    with patch.object(
+        QueryDatabaseTool, "arun", return_value=[[1], [2], [3]]
+    ), TestClient(app) as client:
+        session = {"X-Session-Id": "session_1"}
+        response = client.post(
+            "/query_jobs", json={"query": "SELECT 1"}, headers=session
+        )
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            response = client.get(
+                f"/query_jobs/{job_id}",
+                params={"page_number": 2, "page_size": 2},
+                headers=session,
+            )
+            if response.json()["status"] == JOB_SUCCEEDED:
+                break
+            time.sleep(0.01)
+        assert response.status_code == 200
+        assert response.json()["result"] == [[3]]
+        assert response.json()["total_pages"] == 2
+
+        assert client.get("/query_jobs/unknown").status_code == 404
+        # another front-end sharing the API key cannot poll the job
+        assert client.get(f"/query_jobs/{job_id}").status_code == 404
+        response = client.get(
+            f"/query_jobs/{job_id}", headers={"X-Session-Id": "session_2"}
+        )
+        assert response.status_code == 404
@@ -0,0 +1,148 @@
+"""
+test_query_results.py
+This file contains the unit tests for the query_results module.
+"""
+import json
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from chatweb3.query_results import (
+    FlipsideResultStream,
+    SQLAlchemyResultStream,
+    arrow_table_to_bytes,
+    iter_ndjson,
+    preview_result_stream,
+    result_stream_to_arrow,
+)
+from chatweb3.tools.snowflake_database.tool import QuerySnowflakeDatabaseTool
+
+
+class FakeFlipside:
+    def __init__(self, num_rows):
+        self.rows = [[i, f"0x{i}"] for i in range(num_rows)]
+        self.fetched_pages = []
+
+    def _page(self, page_number, page_size):
+        self.fetched_pages.append(page_number)
+        start = (page_number - 1) * page_size
+        return SimpleNamespace(
+            query_id="run_1",
+            columns=["block_number", "tx_hash"],
+            rows=self.rows[start : start + page_size],
+            page=SimpleNamespace(
+                totalRows=len(self.rows),
+                totalPages=-(-len(self.rows) // page_size),
+            ),
+        )
+
+    def query(self, sql, page_size, page_number, **kwargs):
+        return self._page(page_number, page_size)
+
+    def get_query_results(self, query_run_id, page_number, page_size):
+        return self._page(page_number, page_size)
+
+
+def _sqlite_database(num_rows):
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE blocks (block_number INTEGER)"))
+        for i in range(num_rows):
+            connection.execute(text(f"INSERT INTO blocks VALUES ({i})"))
+    return SimpleNamespace(
+        _engine=engine,
+        _set_schema=lambda connection: None,
+        _track_schema_change=lambda connection, command: None,
+    )
+
+
+def test_flipside_stream_pages_through_results():
+    flipside = FakeFlipside(25)
+    stream = FlipsideResultStream(flipside, "select 1", page_size=10)
+    assert list(stream) == flipside.rows
+    assert flipside.fetched_pages == [1, 2, 3]
+
+
+def test_flipside_preview_only_fetches_the_first_page():
+    flipside = FakeFlipside(25)
+    stream = FlipsideResultStream(flipside, "select 1", page_size=10)
+    preview = preview_result_stream(stream, max_rows=10)
+    assert preview["rows"] == flipside.rows[:10]
+    assert preview["row_count"] == 25 and preview["truncated"]
+    assert flipside.fetched_pages == [1]
+
+
+def test_sqlalchemy_stream_fetches_in_pages():
+    database = _sqlite_database(25)
+    stream = SQLAlchemyResultStream(
+        database, "SELECT block_number FROM blocks ORDER BY 1", page_size=10
+    )
+    assert [len(page) for page in stream.iter_pages()] == [10, 10, 5]
+    assert stream.total_rows == 25
+
+    stream = SQLAlchemyResultStream(
+        database, "SELECT block_number FROM blocks ORDER BY 1", page_size=10
+    )
+    preview = preview_result_stream(stream, max_rows=3)
+    assert preview["columns"] == ["block_number"]
+    assert preview["rows"] == [[0], [1], [2]]
+    assert preview["row_count"] == 25 and preview["truncated"]
+
+
+def test_iter_ndjson():
+    stream = FlipsideResultStream(FakeFlipside(3), "select 1", page_size=2)
+    lines = "".join(iter_ndjson(stream)).splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"block_number": i, "tx_hash": f"0x{i}"} for i in range(3)
+    ]
+
+
+def test_result_stream_to_arrow_and_parquet():
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    database = _sqlite_database(25)
+    stream = SQLAlchemyResultStream(
+        database, "SELECT block_number FROM blocks ORDER BY 1", page_size=10
+    )
+    table = result_stream_to_arrow(stream)
+    assert table.column_names == ["block_number"]
+    assert table.column("block_number").to_pylist() == list(range(25))
+
+    content = arrow_table_to_bytes(table, "arrow")
+    assert pa.ipc.open_stream(content).read_all().equals(table)
+    content = arrow_table_to_bytes(table, "parquet")
+    assert pq.read_table(pa.BufferReader(content)).equals(table)
+
+
+@pytest.mark.parametrize("mode", ["flipside", "snowflake"])
+def test_query_tool_previews_only_when_asked(mode):
+    flipside = FakeFlipside(25)
+    sqlite_database = _sqlite_database(25)
+    sqlite_database.run_stream = lambda query, page_size: SQLAlchemyResultStream(
+        sqlite_database, query, page_size=page_size
+    )
+    db = SimpleNamespace(
+        stream_query=lambda database, schema, query, mode, page_size, **kwargs: (
+            FlipsideResultStream(flipside, query, page_size=page_size, **kwargs)
+        ),
+        get_database=lambda database, schema: sqlite_database,
+        query_cache=None,
+        metadata_parser=None,
+    )
+    tool_input = (
+        "database: ethereum, schema: core, query: SELECT block_number FROM blocks"
+    )
+
+    # the API and the query jobs get every row
+    tool = QuerySnowflakeDatabaseTool.construct(db=db, return_direct=False)
+    result = tool._run(tool_input, mode=mode)
+    assert isinstance(result, list) and len(result) == 25
+
+    # the agent gets a preview with the total row count
+    tool = QuerySnowflakeDatabaseTool.construct(
+        db=db, return_direct=False, preview_rows=10
+    )
+    result = tool._run(tool_input, mode=mode)
+    assert len(result["rows"]) == 10 and result["row_count"] == 25
@@ -0,0 +1,78 @@
+"""
+test_single_flight.py
+This file contains the unit tests for the single_flight module.
+"""
+import threading
+import time
+
+import pytest
+
+from chatweb3.single_flight import SingleFlight
+
+
+def _run_concurrently(single_flight, key, fn, num_callers):
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(single_flight.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(num_callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def _wait_for_followers(single_flight, num_followers):
+    deadline = time.monotonic() + 5
+    while single_flight.shared < num_followers and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def test_concurrent_callers_share_one_execution():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    executions = []
+
+    def query():
+        executions.append(1)
+        release.wait(5)
+        return ["rows"]
+
+    threads, results, errors = _run_concurrently(single_flight, "q", query, 5)
+    _wait_for_followers(single_flight, 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(executions) == 1
+    assert results == [["rows"]] * 5 and not errors
+    assert single_flight.stats() == {"executions": 1, "shared": 4, "in_flight": 0}
+
+    # once the call completed, the next caller executes again
+    single_flight.do("q", query)
+    assert len(executions) == 2
+
+
+def test_error_is_raised_to_every_caller():
+    single_flight = SingleFlight()
+    release = threading.Event()
+
+    def query():
+        release.wait(5)
+        raise RuntimeError("query failed")
+
+    threads, results, errors = _run_concurrently(single_flight, "q", query, 3)
+    _wait_for_followers(single_flight, 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert not results
+    assert len(errors) == 3
+    assert all(str(e) == "query failed" for e in errors)
+    with pytest.raises(ValueError):
+        single_flight.do("other", lambda: int("x"))
+    assert single_flight.in_flight() == 0
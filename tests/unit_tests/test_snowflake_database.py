@@ -0,0 +1,158 @@
+"""
+test_snowflake_database.py
+This file contains the unit tests for the snowflake_database module.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, event, text
+
+from chatweb3.snowflake_database import SnowflakeContainer, SnowflakeDatabase
+from chatweb3.tools.snowflake_database.tool import (
+    GetSnowflakeDatabaseTableMetadataTool,
+)
+
+
+class StandInSnowflakeDatabase(SnowflakeDatabase):
+    @property
+    def dialect(self) -> str:
+        return "snowflake"
+
+
+def test_use_schema_sent_once_per_connection(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'test.db'}", pool_size=1, max_overflow=0
+    )
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        statements.append(statement)
+        # SQLite has no USE SCHEMA
+        if statement.upper().startswith("USE "):
+            statement = "SELECT 1"
+        return statement, parameters
+
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE blocks (block_number INTEGER)"))
+    db = StandInSnowflakeDatabase(engine=engine, schema="main")
+    other_schema_db = StandInSnowflakeDatabase(engine=engine, schema="temp")
+
+    statements.clear()
+    db.run("SELECT count(*) FROM blocks")
+    db.run("SELECT count(*) FROM blocks")
+    assert statements == ["USE SCHEMA main"] + ["SELECT count(*) FROM blocks"] * 2
+
+    # the pooled connection is shared by the schemas of the database
+    statements.clear()
+    other_schema_db.run("SELECT 2")
+    db.run("SELECT 3")
+    assert statements == ["USE SCHEMA temp", "SELECT 2", "USE SCHEMA main", "SELECT 3"]
+
+    # a query changing the schema itself makes the next query set it again
+    statements.clear()
+    db.run("use schema temp")
+    db.run("SELECT 4")
+    assert statements == ["use schema temp", "USE SCHEMA main", "SELECT 4"]
+
+
+def test_metadata_of_all_groups_fetched_concurrently(tmp_path):
+    databases = {}
+    for database, table_names in (("db_a", ["t1", "t2"]), ("db_b", ["t3"])):
+        engine = create_engine(f"sqlite:///{tmp_path / database}.db")
+        with engine.begin() as connection:
+            for table_name in table_names:
+                connection.execute(text(f"CREATE TABLE {table_name} (x INTEGER)"))
+                connection.execute(text(f"INSERT INTO {table_name} VALUES (1)"))
+        databases[database] = SnowflakeDatabase(engine=engine, schema="main")
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, *args):
+            # the sample rows query of each table takes a round trip
+            time.sleep(0.2)
+
+    container = SimpleNamespace(
+        get_database=lambda database, schema: databases[database]
+    )
+    tool = GetSnowflakeDatabaseTableMetadataTool.construct(db=container)
+
+    start_time = time.perf_counter()
+    result = tool._get_metadata_from_snowflake(
+        "db_b.main.t3, db_a.main.t2, db_a.main.t1"
+    )
+    assert time.perf_counter() - start_time < 0.2 * 3
+
+    table_long_names = [part.split(":")[0] for part in result.split(";\n\n\n")]
+    assert table_long_names == ["db_a.main.t1", "db_a.main.t2", "db_b.main.t3"]
+    assert all("CREATE TABLE" in part for part in result.split(";\n\n\n"))
+
+    # a missing table fails its group only
+    result = tool._get_metadata_from_snowflake(
+        "db_a.main.t1, db_a.main.missing, db_b.main.t3"
+    )
+    assert result.count("not found in database") == 2
+    assert "db_b.main.t3: \nCREATE TABLE" in result
+
+
+def test_metadata_of_an_empty_batch(monkeypatch):
+    monkeypatch.setattr(
+        "chatweb3.tools.snowflake_database.tool.parse_table_long_name_to_json_list",
+        lambda tool_input: [],
+    )
+    tool = GetSnowflakeDatabaseTableMetadataTool.construct(db=SimpleNamespace())
+    assert tool._get_metadata_from_snowflake("") == ""
+
+
+def test_get_database_creates_a_database_once_across_threads():
+    engines = []
+
+    def create_engine_slowly(database):
+        # the threads all miss the database while the first one creates it
+        time.sleep(0.05)
+        engines.append(create_engine("sqlite://"))
+        return engines[-1]
+
+    container = SnowflakeContainer.__new__(SnowflakeContainer)
+    container._databases = {}
+    container._databases_lock = threading.Lock()
+    container._lazy_reflection = True
+    container._create_engine = create_engine_slowly
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        databases = list(
+            executor.map(lambda _: container.get_database("db", "main"), range(8))
+        )
+    assert len(engines) == 1
+    assert all(database is databases[0] for database in databases)
+
+
+def test_lazy_reflection_reflects_tables_on_first_use(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    with engine.begin() as connection:
+        for table_name in ("t1", "t2", "not_indexed"):
+            connection.execute(text(f"CREATE TABLE {table_name} (x INTEGER)"))
+    indexed_table_names = ["t1", "t2", "dropped"]
+    db = SnowflakeDatabase(
+        engine=engine,
+        schema="main",
+        lazy_reflection=True,
+        usable_table_names=lambda: indexed_table_names,
+    )
+    assert not db._metadata.tables
+    assert db.get_usable_table_names() == ["dropped", "t1", "t2"]
+
+    table_info = db.get_table_info_no_throw(["t2"], as_dict=True)
+    assert "CREATE TABLE main.t2" in table_info["t2"]
+    assert list(db._metadata.tables) == ["main.t2"]
+    db.get_table_info_no_throw(["t1", "t2"])
+    assert sorted(db._metadata.tables) == ["main.t1", "main.t2"]
+
+    # tables missing from the index or from the database
+    assert "not found in database" in db.get_table_info_no_throw(["not_indexed"])
+    assert "Error reflecting tables" in db.get_table_info_no_throw(["dropped"])
+
+    # without index the tables are listed from the database
+    indexed_table_names = []
+    assert db.get_usable_table_names() == ["not_indexed", "t1", "t2"]
@@ -0,0 +1,179 @@
+"""
+test_sql_validation.py
+This file contains the unit tests for the sql_validation module.
+"""
+from types import SimpleNamespace
+
+import pytest
+from langchain.chat_models.fake import FakeListChatModel
+from langchain.tools.base import ToolException
+
+from chatweb3.create_agent import LOCAL_INDEX_FILE_PATH
+from chatweb3.snowflake_database import SnowflakeContainer
+from chatweb3.sql_validation import (
+    check_query_statically,
+    query_checker_stats,
+    validate_query_columns,
+)
+from chatweb3.tools.snowflake_database.tool_custom import (
+    CheckQuerySyntaxTool,
+    QueryDatabaseTool,
+)
+
+pytest.importorskip("sqlglot")
+
+
+@pytest.fixture(scope="module")
+def snowflake_container():
+    return SnowflakeContainer(
+        flipside_api_key=None,
+        user="user",
+        password="password",
+        account_identifier="account",
+        local_index_file_path=LOCAL_INDEX_FILE_PATH,
+    )
+
+
+@pytest.fixture(scope="module")
+def metadata_parser(snowflake_container):
+    return snowflake_container.metadata_parser
+
+
+def test_clean_queries(metadata_parser):
+    for query in (
+        "SELECT COUNT(*) FROM ethereum.core.ez_token_transfers",
+        "WITH t AS (SELECT * FROM ETHEREUM.CORE.EZ_TOKEN_TRANSFERS LIMIT 10) SELECT * FROM t",
+        "SELECT 1 UNION ALL SELECT 2",
+        "SELECT symbol, SUM(amount_usd) AS volume FROM ethereum.core.ez_token_transfers "
+        "GROUP BY symbol ORDER BY volume",
+    ):
+        assert check_query_statically(query, metadata_parser) == [], query
+
+
+def test_flagged_queries(metadata_parser):
+    for query, issue in (
+        ("SELEC 1", "Syntax error"),
+        ("SELECT * FROM", "Syntax error"),
+        ("SELECT 1; SELECT 2", "Expected exactly one statement"),
+        ("DELETE FROM ethereum.core.ez_token_transfers", "Not a SELECT query"),
+        ("SELECT * FROM ez_token_transfers", "is not qualified"),
+        ("SELECT * FROM ethereum.core.no_such_table", "not found in the index"),
+        ("SELECT 1 UNION SELECT 2", "UNION"),
+        ("SELECT CURRENT_DATE - INTERVAL '1 DAY'", "INTERVAL"),
+        ("SELECT 1 WHERE 1 NOT IN (SELECT 2)", "NOT IN"),
+        ("SELECT NO_SUCH_FUNCTION(1)", "Unknown function"),
+        (
+            "SELECT bogus_col FROM ethereum.core.fact_transactions",
+            "Column 'bogus_col' does not exist in ethereum.core.fact_transactions",
+        ),
+        # the columns of a subquery selecting * are not known
+        (
+            "SELECT anything FROM (SELECT * FROM ethereum.core.fact_transactions) t",
+            "could not be resolved",
+        ),
+    ):
+        issues = check_query_statically(query, metadata_parser)
+        assert any(issue in found for found in issues), (query, issues)
+
+
+def test_checker_tool_skips_llm_for_clean_queries(snowflake_container):
+    llm = FakeListChatModel(
+        responses=[
+            "SELECT 1 UNION ALL SELECT 2",
+            "SELECT tx_hash FROM ethereum.core.fact_transactions",
+            "unused",
+        ]
+    )
+    tool = CheckQuerySyntaxTool(llm=llm, db=snowflake_container)
+    stats = query_checker_stats.stats()
+
+    query = "SELECT COUNT(*) FROM ethereum.core.ez_token_transfers"
+    assert tool.run(query) == query
+    assert tool.run("SELECT 1 UNION SELECT 2") == "SELECT 1 UNION ALL SELECT 2"
+    assert llm.i == 1
+    # an unknown column goes through the LLM checker
+    assert (
+        tool.run("SELECT bogus_col FROM ethereum.core.fact_transactions")
+        == "SELECT tx_hash FROM ethereum.core.fact_transactions"
+    )
+    assert llm.i == 2
+
+    new_stats = query_checker_stats.stats()
+    assert new_stats["llm_calls_avoided"] == stats["llm_calls_avoided"] + 1
+    assert new_stats["llm_calls"] == stats["llm_calls"] + 2
+
+
+def test_validate_query_columns(metadata_parser):
+    for query in (
+        "SELECT symbol, COUNT(*) AS n FROM ethereum.core.ez_token_transfers GROUP BY symbol ORDER BY n",
+        "WITH s AS (SELECT tx_hash AS h FROM ethereum.core.ez_token_transfers) SELECT h FROM s",
+        # correlated subquery
+        "SELECT symbol FROM ethereum.core.ez_token_transfers t WHERE EXISTS "
+        "(SELECT 1 FROM ethereum.core.fact_blocks b WHERE b.block_number = t.block_number AND symbol = 'x')",
+        # subqueries filtering on columns of their own tables only
+        "SELECT * FROM ethereum.core.fact_transactions WHERE block_number IN "
+        "(SELECT block_number FROM ethereum.core.fact_blocks WHERE tx_count > 100)",
+        "SELECT tx_hash FROM ethereum.core.fact_transactions t WHERE EXISTS "
+        "(SELECT 1 FROM ethereum.core.fact_blocks b WHERE b.block_number = t.block_number AND miner = '0x')",
+        "SELECT tx_hash, (SELECT MAX(tx_count) FROM ethereum.core.fact_blocks) AS max_tx_count "
+        "FROM ethereum.core.fact_transactions",
+        # columns of tables missing from the index are left to the database
+        "SELECT anything FROM ethereum.core.not_indexed",
+        # the column list of the alias names the columns of a subquery or a CTE
+        "SELECT cnt FROM (SELECT COUNT(*) FROM ethereum.core.fact_transactions) sub(cnt)",
+        "WITH c(d, n) AS (SELECT block_timestamp::date, COUNT(*) FROM ethereum.core.fact_transactions "
+        "GROUP BY 1) SELECT d, n FROM c",
+        # expressions without an alias leave the columns of the subquery unknown
+        "SELECT s.tx_count FROM (SELECT COUNT(*), MAX(block_number) FROM ethereum.core.fact_blocks) s",
+    ):
+        assert validate_query_columns(query, metadata_parser) == [], query
+
+    errors = validate_query_columns(
+        "SELECT t.amount_usdd FROM ethereum.core.ez_token_transfers t", metadata_parser
+    )
+    assert len(errors) == 1
+    assert errors[0].startswith(
+        "Column 'amount_usdd' does not exist in ethereum.core.ez_token_transfers (alias t). "
+        "Did you mean 'amount_usd'"
+    )
+    # the columns of a subquery are checked against the tables of the subquery
+    errors = validate_query_columns(
+        "SELECT * FROM ethereum.core.fact_transactions WHERE block_number IN "
+        "(SELECT block_number FROM ethereum.core.fact_blocks WHERE tx_counts > 100)",
+        metadata_parser,
+    )
+    assert len(errors) == 1
+    assert errors[0].startswith(
+        "Column 'tx_counts' does not exist in ethereum.core.fact_blocks."
+    )
+    errors = validate_query_columns(
+        "WITH s AS (SELECT tx_hash AS h FROM ethereum.core.ez_token_transfers) SELECT tx_hash FROM s",
+        metadata_parser,
+    )
+    assert errors == [
+        "Column 'tx_hash' does not exist in subquery s. Available columns: h."
+    ]
+    errors = validate_query_columns(
+        "SELECT cnt FROM (SELECT COUNT(*) AS n FROM ethereum.core.fact_transactions) sub(total)",
+        metadata_parser,
+    )
+    assert errors == [
+        "Column 'cnt' does not exist in subquery sub. Available columns: total."
+    ]
+
+
+def test_query_tool_rejects_unknown_columns_before_running(metadata_parser):
+    def stream_query(*args, **kwargs):
+        raise AssertionError("the query should not be run")
+
+    tool = QueryDatabaseTool.construct(
+        db=SimpleNamespace(
+            metadata_parser=metadata_parser, stream_query=stream_query, query_cache=None
+        ),
+        return_direct=False,
+    )
+    with pytest.raises(ToolException, match="Column 'amount_usdd' does not exist"):
+        tool._run(
+            '{"query": "SELECT amount_usdd FROM ethereum.core.ez_token_transfers"}',
+            mode="flipside",
+        )
@@ -0,0 +1,209 @@
+"""
+test_streaming_callback.py
+This file contains the unit tests for the streaming of the agent runs.
+"""
+import asyncio
+import time
+from typing import Any, List, Optional, Tuple, Union
+
+import pytest
+from langchain.agents.agent import BaseSingleActionAgent
+from langchain.chains import LLMChain
+from langchain.llms.base import LLM
+from langchain.prompts import PromptTemplate
+from langchain.schema import AgentAction, AgentFinish
+from langchain.tools import Tool
+
+from chatweb3.agents.agent import ChatWeb3AgentExecutor
+from chatweb3.callbacks.streaming_callback import (
+    EVENT_TOKEN,
+    QueueCallbackHandler,
+    StreamingCallbackHandler,
+    aiter_agent_events,
+    iter_agent_events,
+)
+
+
+class OneQueryAgent(BaseSingleActionAgent):
+    """Runs one query, then finishes with its result."""
+
+    @property
+    def input_keys(self) -> List[str]:
+        return ["input"]
+
+    def plan(
+        self, intermediate_steps: List[Tuple[AgentAction, str]], **kwargs: Any
+    ) -> Union[AgentAction, AgentFinish]:
+        if intermediate_steps:
+            return AgentFinish(
+                return_values={"output": intermediate_steps[-1][1]}, log=""
+            )
+        return AgentAction(
+            tool="query_database",
+            tool_input="select 1",
+            log="Thought: I need to query the database\nAction:\n```{}```",
+        )
+
+    async def aplan(self, intermediate_steps, **kwargs):
+        return self.plan(intermediate_steps, **kwargs)
+
+
+class StreamingLLM(LLM):
+    """Streams the words of its response, one every token_seconds."""
+
+    response: str
+    token_seconds: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "streaming-llm"
+
+    def _call(self, prompt: str, stop=None, run_manager=None, **kwargs: Any) -> str:
+        for token in self.response.split(" "):
+            time.sleep(self.token_seconds)
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+        return self.response
+
+    async def _acall(
+        self, prompt: str, stop=None, run_manager=None, **kwargs: Any
+    ) -> str:
+        for token in self.response.split(" "):
+            await asyncio.sleep(self.token_seconds)
+            if run_manager:
+                await run_manager.on_llm_new_token(token)
+        return self.response
+
+
+def _llm_chain(response: str, token_seconds: float = 0.0) -> LLMChain:
+    return LLMChain(
+        llm=StreamingLLM(response=response, token_seconds=token_seconds),
+        prompt=PromptTemplate.from_template("{input}"),
+    )
+
+
+class ThinkingAgent(OneQueryAgent):
+    """Like OneQueryAgent, but thinks with a streaming LLM first, like an LLM agent."""
+
+    llm_chain: LLMChain
+
+    def plan(self, intermediate_steps, callbacks=None, **kwargs):
+        self.llm_chain.predict(input="think", callbacks=callbacks)
+        return super().plan(intermediate_steps, **kwargs)
+
+    async def aplan(self, intermediate_steps, callbacks=None, **kwargs):
+        await self.llm_chain.apredict(input="think", callbacks=callbacks)
+        return super().plan(intermediate_steps, **kwargs)
+
+
+def _create_agent_executor(
+    func=lambda query: f"result of {query}", agent: Optional[OneQueryAgent] = None
+):
+    return ChatWeb3AgentExecutor.from_agent_and_tools(
+        agent=agent or OneQueryAgent(),
+        tools=[Tool(name="query_database", func=func, description="")],
+        return_intermediate_steps=True,
+    )
+
+
+EXPECTED_EVENTS = [
+    {
+        "type": "action",
+        "thought": "I need to query the database",
+        "tool": "query_database",
+        "tool_input": "select 1",
+    },
+    {"type": "observation", "observation": "result of select 1"},
+    {"type": "finish", "output": "result of select 1"},
+]
+
+
+def test_iter_agent_events():
+    events = list(iter_agent_events(_create_agent_executor(), "run a query"))
+    assert events[:-1] == EXPECTED_EVENTS
+    assert events[-1]["type"] == "response"
+    assert events[-1]["response"]["output"] == "result of select 1"
+
+
+def test_aiter_agent_events():
+    async def collect():
+        return [
+            event
+            async for event in aiter_agent_events(
+                _create_agent_executor(), "run a query"
+            )
+        ]
+
+    events = asyncio.run(collect())
+    assert events[:-1] == EXPECTED_EVENTS
+    assert events[-1]["response"]["output"] == "result of select 1"
+
+
+def test_iter_agent_events_raises_the_error_of_the_run():
+    def failing_agent_executor(inp, callbacks=None):
+        raise ValueError("LLM unavailable")
+
+    with pytest.raises(ValueError, match="LLM unavailable"):
+        list(iter_agent_events(failing_agent_executor, "run a query"))
+
+
+def test_token_events():
+    handler = QueueCallbackHandler()
+    for token in ("Thought", ":"):
+        handler.on_llm_new_token(token)
+    assert [handler.queue.get_nowait() for _ in range(2)] == [
+        {"type": EVENT_TOKEN, "token": "Thought"},
+        {"type": EVENT_TOKEN, "token": ":"},
+    ]
+
+
+def test_streaming_callback_handler_requires_put():
+    with pytest.raises(TypeError):
+        StreamingCallbackHandler()
+
+
+def _create_checking_agent_executor(token_seconds: float = 0.0):
+    """An agent thinking "agent thought", whose tool calls a query checker LLM thinking "checker thought"."""
+    checker_chain = _llm_chain("checker thought", token_seconds)
+
+    def check_and_query(query, callbacks=None):
+        checker_chain.predict(input=query, callbacks=callbacks)
+        return f"result of {query}"
+
+    return _create_agent_executor(
+        func=check_and_query,
+        agent=ThinkingAgent(llm_chain=_llm_chain("agent thought", token_seconds)),
+    )
+
+
+def test_only_the_agent_tokens_are_streamed():
+    events = list(iter_agent_events(_create_checking_agent_executor(), "run a query"))
+    tokens = [event["token"] for event in events if event["type"] == EVENT_TOKEN]
+    # the agent thinks before its action and before finishing
+    assert tokens == ["agent", "thought"] * 2
+
+    async def collect():
+        return [
+            event
+            async for event in aiter_agent_events(
+                _create_checking_agent_executor(), "run a query"
+            )
+        ]
+
+    events = asyncio.run(collect())
+    tokens = [event["token"] for event in events if event["type"] == EVENT_TOKEN]
+    assert tokens == ["agent", "thought"] * 2
+
+
+def test_time_to_first_event():
+    # every LLM call takes 0.6s, the whole run over 1.8s
+    agent_executor = _create_checking_agent_executor(token_seconds=0.3)
+    start_time = time.perf_counter()
+    events = iter_agent_events(agent_executor, "run a query")
+    first_event = next(events)
+    time_to_first_event = time.perf_counter() - start_time
+    assert first_event == {"type": EVENT_TOKEN, "token": "agent"}
+    list(events)
+    duration = time.perf_counter() - start_time
+    assert time_to_first_event < 1.0
+    assert time_to_first_event < duration / 3
@@ -0,0 +1,52 @@
+"""
+test_tool_executor.py
+This file contains the unit tests for running the tools off the event loop.
+"""
+import asyncio
+import contextvars
+import time
+from types import SimpleNamespace
+
+from chatweb3.query_results import FlipsideResultStream
+from chatweb3.tools.executor import run_in_tool_executor
+from chatweb3.tools.snowflake_database.tool_custom import QueryDatabaseTool
+
+
+def test_run_in_tool_executor_copies_context():
+    request_id = contextvars.ContextVar("request_id", default=None)
+
+    async def main():
+        request_id.set("abc")
+        return await run_in_tool_executor(request_id.get)
+
+    assert asyncio.run(main()) == "abc"
+
+
+def test_query_tool_arun_does_not_block_event_loop():
+    def run_query(sql, **kwargs):
+        time.sleep(0.2)
+        return SimpleNamespace(query_id=None, columns=["sql"], rows=[[sql]], page=None)
+
+    def stream_query(database, schema, query, mode, page_size, **kwargs):
+        return FlipsideResultStream(
+            None, query, page_size=page_size, run_query=run_query, **kwargs
+        )
+
+    db = SimpleNamespace(
+        stream_query=stream_query, query_cache=None, metadata_parser=None
+    )
+    tool = QueryDatabaseTool.construct(db=db, return_direct=False)
+
+    async def main():
+        return await asyncio.gather(
+            *(
+                tool._arun(f'{{"query": "select {i}"}}', mode="flipside")
+                for i in range(5)
+            )
+        )
+
+    start_time = time.perf_counter()
+    results = asyncio.run(main())
+    assert results == [[[f"select {i}"]] for i in range(5)]
+    # the five queries overlap instead of running one after another
+    assert time.perf_counter() - start_time < 0.2 * 5
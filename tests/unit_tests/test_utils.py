@@ -3,11 +3,16 @@
 test_gradio_app.py
 This file contains the tests for the main chat module.
 """
+import datetime
 import os
+from decimal import Decimal
 from unittest.mock import Mock
 import pytest
 
-from chatweb3.utils import format_response  # split_thought_process_text,
+from chatweb3.utils import (  # split_thought_process_text,
+    convert_rows_to_serializable,
+    format_response,
+)
 from api.gradio.gradio_app import chat, set_openai_api_key
 from langchain.schema import AgentAction
 
@@ -100,3 +105,20 @@ def test_format_response_non_conversation_chat_mode():
 
     formatted_response_markdown = format_response(response, mode="markdown")
     assert formatted_response_markdown == expected_response_markdown
+
+
+def test_convert_rows_to_serializable():
+    rows = [
+        (1, datetime.datetime(2023, 5, 1, 12, 30), Decimal("1.5"), "a", None),
+        (2, None, Decimal("2"), "b", datetime.date(2023, 5, 2)),
+    ]
+    assert convert_rows_to_serializable(rows) == [
+        [1, "2023-05-01T12:30:00", 1.5, "a", None],
+        [2, None, 2.0, "b", "2023-05-02"],
+    ]
+    # ragged rows are converted one by one
+    assert convert_rows_to_serializable([(Decimal("1"),), ()]) == [[1.0], []]
+    assert convert_rows_to_serializable([]) == []
+    # an empty first row does not drop the other rows
+    assert convert_rows_to_serializable([(), (Decimal("1"),)]) == [[], [1.0]]
+    assert convert_rows_to_serializable([(), ()]) == [[], []]